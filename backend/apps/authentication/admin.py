@@ -1,4 +1,15 @@
+"""
+認証管理画面
+"""
 from django.contrib import admin
+from .models import SocialIdentity
 
-# Register your models here.
 
+@admin.register(SocialIdentity)
+class SocialIdentityAdmin(admin.ModelAdmin):
+    """ソーシャルアカウント連携管理"""
+    list_display = ('provider', 'subject', 'user', 'created_at')
+    list_filter = ('provider',)
+    search_fields = ('subject', 'user__email')
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at',)
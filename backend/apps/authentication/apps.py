@@ -1,8 +1,38 @@
+from allauth.account.apps import AccountConfig as BaseAccountConfig
 from django.apps import AppConfig
+from django.conf import settings
+
+ACCOUNT_MIDDLEWARE = 'apps.authentication.middleware.AccountMiddleware'
+ALLAUTH_ACCOUNT_MIDDLEWARE = 'allauth.account.middleware.AccountMiddleware'
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.authentication'
     verbose_name = '認証'
+    # 同じモジュールにallauth.accountの設定があるため、既定の設定を明示する
+    default = True
+
+    def ready(self):
+        # シグナルの登録
+        from . import signals  # noqa: F401
+
+
+class AccountConfig(BaseAccountConfig):
+    """allauth.accountの設定
+
+    allauthはMIDDLEWAREに自身のAccountMiddlewareがあることを文字列で確認するため、
+    非同期対応版（apps.authentication.middleware.AccountMiddleware）を元のパスとして
+    扱った設定でallauthの初期化（確認を含む）を実行する。
+    """
 
+    def ready(self):
+        middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = [
+            ALLAUTH_ACCOUNT_MIDDLEWARE if path == ACCOUNT_MIDDLEWARE else path
+            for path in middleware
+        ]
+        try:
+            super().ready()
+        finally:
+            settings.MIDDLEWARE = middleware
@@ -0,0 +1,221 @@
+"""
+認証関連の非同期ビュー（ASGI用）
+
+プロバイダーへの問い合わせは非同期HTTPクライアント、ユーザーの取得・作成は
+Djangoの非同期ORMで行い、待ち時間中にワーカーをブロックしない。
+DRFのAPIViewは非同期に対応していないため、DjangoのViewを使用する。
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+
+from apps.monitoring.metrics import auth_login_total
+from apps.users.activity import activity_recorder
+
+from .google_keys import google_cert_store
+from .models import SocialIdentity
+from .providers import (
+    ProviderUnavailable,
+    SocialAuthError,
+    get_async_provider_client,
+)
+from .singleflight import aget_result_user, verification_cache
+from .throttling import SocialIPThrottle, SocialProviderThrottle, check_throttles
+from .serializers import (
+    CustomTokenObtainPairSerializer,
+    GoogleAuthSerializer,
+    SocialAuthSerializer,
+)
+
+
+@sync_to_async
+def _issue_tokens(user):
+    """トークンを生成（トークンブラックリスト利用時はDBに書き込むため同期実行）"""
+    refresh = CustomTokenObtainPairSerializer.get_token(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+class AsyncSocialAuthView(View):
+    """非同期ソーシャル認証ビューの基底クラス"""
+    http_method_names = ['post', 'options']
+    serializer_class = SocialAuthSerializer
+    throttle_classes = (SocialIPThrottle, SocialProviderThrottle)
+    provider = ''
+    provider_label = ''
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # DRFのAPIViewと同様にCSRFチェックを除外（JWTで認証するため）
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request):
+        # プロバイダーへの問い合わせの前にレート制限を判定
+        wait = await sync_to_async(check_throttles, thread_sensitive=False)(
+            request, self, self.throttle_classes
+        )
+        if wait is not None:
+            response = JsonResponse(
+                {'error': 'リクエストが多すぎます。しばらくしてから再度お試しください。'},
+                status=429
+            )
+            response['Retry-After'] = str(int(wait) + 1)
+            return response
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse(
+                {'error': 'リクエストの形式が不正です。'},
+                status=400
+            )
+
+        serializer = self.serializer_class(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        access_token = serializer.validated_data['access_token']
+        resolved = {}
+
+        async def authenticate():
+            user, created = await self.authenticate(access_token)
+            resolved['user'] = user
+            return {'user_id': user.pk, 'created': created}
+
+        try:
+            result = await verification_cache.aget_or_compute(
+                self.provider, access_token, authenticate
+            )
+            # 他のリクエストの検証結果を共有した場合は主キーで取得
+            user = resolved.get('user') or await aget_result_user(result)
+        except ProviderUnavailable:
+            auth_login_total.inc(provider=self.provider, result='unavailable')
+            return JsonResponse(
+                {'error': f'{self.provider_label}に接続できません。しばらくしてから再度お試しください。'},
+                status=503
+            )
+        except SocialAuthError as e:
+            auth_login_total.inc(provider=self.provider, result='failure')
+            return JsonResponse({'error': str(e)}, status=400)
+
+        auth_login_total.inc(provider=self.provider, result='success')
+        # Redisがない場合はDBを直接更新するため、ORMと同じスレッドで実行する
+        await sync_to_async(activity_recorder.record_login)(user.pk)
+
+        return JsonResponse({
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'display_name': user.get_display_name(),
+            },
+            'tokens': await _issue_tokens(user),
+            'is_new_user': result['created'],
+        }, status=200)
+
+    async def authenticate(self, access_token):
+        """アクセストークンからユーザーを取得または作成して (user, created) を返す"""
+        raise NotImplementedError
+
+
+class AsyncGoogleAuthView(AsyncSocialAuthView):
+    """Google OAuth認証ビュー（非同期）"""
+    serializer_class = GoogleAuthSerializer
+    provider = 'google'
+    provider_label = 'Google'
+
+    async def authenticate(self, access_token):
+        try:
+            # 証明書は通常キャッシュ済みのため、スレッドプールで検証する
+            idinfo = await sync_to_async(google_cert_store.verify, thread_sensitive=False)(
+                access_token,
+                settings.SOCIALACCOUNT_PROVIDERS['google']['APP']['client_id']
+            )
+        except ValueError:
+            raise SocialAuthError('トークンが無効です。')
+
+        google_id = idinfo.get('sub')
+        return await SocialIdentity.objects.aget_or_create_user(
+            SocialIdentity.PROVIDER_GOOGLE,
+            google_id,
+            idinfo.get('email'),
+            defaults={
+                'google_id': google_id,
+                'first_name': idinfo.get('given_name', ''),
+                'last_name': idinfo.get('family_name', ''),
+                'is_active': True,
+            }
+        )
+
+
+class AsyncTwitterAuthView(AsyncSocialAuthView):
+    """Twitter OAuth2認証ビュー（非同期）"""
+    provider = 'twitter'
+    provider_label = 'Twitter'
+
+    async def authenticate(self, access_token):
+        client = get_async_provider_client('twitter')
+        response = await client.get(
+            '/2/users/me',
+            params={'user.fields': 'profile_image_url'},
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+
+        if response.status_code != 200:
+            raise SocialAuthError('Twitter認証に失敗しました。')
+
+        twitter_user = response.json().get('data', {})
+        twitter_id = twitter_user.get('id')
+
+        if not twitter_id:
+            raise SocialAuthError('Twitterユーザー情報が取得できませんでした。')
+
+        # 同期版と同様、twitter_idをベースにメールアドレスを生成
+        return await SocialIdentity.objects.aget_or_create_user(
+            SocialIdentity.PROVIDER_TWITTER,
+            twitter_id,
+            f'{twitter_id}@twitter.temp',
+            defaults={
+                'display_name': twitter_user.get('name') or twitter_user.get('username'),
+                'is_active': True,
+            }
+        )
+
+
+class AsyncDiscordAuthView(AsyncSocialAuthView):
+    """Discord OAuth認証ビュー（非同期）"""
+    provider = 'discord'
+    provider_label = 'Discord'
+
+    async def authenticate(self, access_token):
+        client = get_async_provider_client('discord')
+        response = await client.get(
+            '/api/users/@me',
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+
+        if response.status_code != 200:
+            raise SocialAuthError('Discord認証に失敗しました。')
+
+        discord_user = response.json()
+        discord_id = discord_user.get('id')
+        email = discord_user.get('email')
+
+        if not discord_id or not email:
+            raise SocialAuthError('メールアドレスが取得できませんでした。')
+
+        return await SocialIdentity.objects.aget_or_create_user(
+            SocialIdentity.PROVIDER_DISCORD,
+            discord_id,
+            email,
+            defaults={
+                'display_name': discord_user.get('username'),
+                'is_active': True,
+            }
+        )
@@ -0,0 +1,162 @@
+"""
+JWT認証クラス
+
+StatelessJWTAuthenticationはトークンのクレームから軽量なユーザーを生成し、
+リクエストごとのユーザー取得クエリを行わない。
+無効化はユーザーごとのトークンバージョンと有効かどうか（is_active）で判定し、
+どちらもキャッシュから参照する（ユーザーの保存時に更新、無効化したユーザーのトークンは失効させる）。
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.users.activity import activity_recorder
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+# ステートレス認証に必要なクレーム（古いトークンにない場合はDBから取得する）
+REQUIRED_CLAIMS = ('email', 'display_name', TOKEN_VERSION_CLAIM)
+
+
+# トークンの状態（バージョン・有効かどうか）のキャッシュ期間（秒）。
+# 通常はユーザーの保存時（apps.authentication.signals）に更新されるが、
+# QuerySet.update()での変更はシグナルが発生しないため、一定時間で再取得する
+TOKEN_STATE_TIMEOUT = 300
+
+
+def _token_state_cache_key(user_id):
+    return f'auth:token_state:{user_id}'
+
+
+def cache_token_state(user):
+    """ユーザーの (トークンバージョン, 有効かどうか) をキャッシュに保存"""
+    cache.set(
+        _token_state_cache_key(user.pk),
+        (user.token_version, user.is_active),
+        TOKEN_STATE_TIMEOUT,
+    )
+
+
+def cache_token_state_on_commit(user):
+    """トランザクションのコミット後にcache_token_stateを実行
+
+    ロールバックされた場合に古い状態をキャッシュに残さないため。
+    """
+    transaction.on_commit(lambda: cache_token_state(user))
+
+
+def get_token_state(user_id):
+    """(トークンバージョン, 有効かどうか) を取得（キャッシュにない場合のみDBを参照）
+
+    ユーザーが存在しない場合はNoneを返す。
+    """
+    key = _token_state_cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = get_user_model().objects.filter(
+            pk=user_id
+        ).values_list('token_version', 'is_active').first()
+        if state is None:
+            return None
+        state = tuple(state)
+        cache.set(key, state, TOKEN_STATE_TIMEOUT)
+    return state
+
+
+def revoke_user_tokens(user):
+    """ユーザーの発行済みトークンをすべて無効化"""
+    User = get_user_model()
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    user.token_version = User.objects.filter(
+        pk=user.pk
+    ).values_list('token_version', flat=True).get()
+    cache_token_state_on_commit(user)
+
+
+def check_token_version(validated_token, token_version):
+    """トークンのバージョンが現在のバージョンと一致しない場合（無効化済み）はAuthenticationFailed
+
+    バージョンのクレームがない（導入前に発行された）トークンはバージョン0として扱う。
+    """
+    if validated_token.get(TOKEN_VERSION_CLAIM, 0) != token_version:
+        raise AuthenticationFailed(
+            _('トークンは無効化されています。'),
+            code='token_revoked',
+        )
+
+
+class TokenClaimsUser(TokenUser):
+    """トークンのクレームから生成する軽量ユーザー"""
+
+    @property
+    def email(self):
+        return self.token.get('email', '')
+
+    @property
+    def display_name(self):
+        return self.token.get('display_name', '')
+
+    def get_display_name(self):
+        """表示名を取得（User.get_display_nameと同じ規則）"""
+        if self.display_name:
+            return self.display_name
+        return self.email.split('@')[0]
+
+
+class ActivityTrackingMixin:
+    """認証に成功したユーザーの最終アクセス日時を記録する（apps.users.activity）"""
+    
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            activity_recorder.record_seen(result[0].pk)
+        return result
+
+
+class ActivityJWTAuthentication(ActivityTrackingMixin, JWTAuthentication):
+    """最終アクセス日時を記録するJWT認証（デフォルトの認証クラス）
+
+    取得したユーザーのトークンバージョンで無効化済みのトークンを拒否する。
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        check_token_version(validated_token, user.token_version)
+        return user
+
+
+class StatelessJWTAuthentication(ActivityTrackingMixin, JWTAuthentication):
+    """DBにアクセスしないJWT認証（オプトイン）
+
+    ビューのauthentication_classesに指定して使用する。
+    request.userはTokenClaimsUserになるため、モデルのフィールドが必要なビューでは使用しない。
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in REQUIRED_CLAIMS):
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed(
+                _('Token contained no recognizable user identification'),
+                code='token_not_valid',
+            )
+
+        state = get_token_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        token_version, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        check_token_version(validated_token, token_version)
+
+        return TokenClaimsUser(validated_token)
@@ -0,0 +1,216 @@
+"""
+リフレッシュトークンのブラックリスト
+
+判定は次の順に行い、通常のリフレッシュではDBにアクセスしない。
+1. プロセス内のブルームフィルター（含まれなければ無効化されていない）
+2. キャッシュ（無効化済みのjtiを保持）
+3. DB（永続化先。BlacklistedRefreshToken）
+
+無効化するたびにキャッシュ上の世代番号を進め、その世代番号をキーとしてjtiをキャッシュに書き込む。
+各ワーカーは世代番号の変化を検知すると、差分のjtiをキャッシュから取り込む（DBにはアクセスしない）。
+差分がキャッシュから消えていた場合のみDBから取り込み、
+期限切れエントリの削除後はエポックを進め、各ワーカーでフィルターをDBから再構築する。
+"""
+import hashlib
+import math
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.monitoring.metrics import auth_blacklist_checks_total, auth_token_blacklisted_total
+
+from .models import BlacklistedRefreshToken
+
+
+class BloomFilter:
+    """ブルームフィルター（偽陽性はあるが偽陰性はない）"""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class TokenBlacklist:
+    """ブルームフィルター・キャッシュ・DBの3段構成のブラックリスト"""
+    cache_prefix = 'auth:blacklist'
+    # 同時に書き込まれたトランザクションの取りこぼしを防ぐための重複取り込み幅
+    sync_overlap = timedelta(seconds=60)
+    # 差分（世代番号ごとのjti）をキャッシュに保持する時間（秒）
+    delta_timeout = 600
+    # 1回に取り込む差分の上限（超えた場合はDBから取り込む）
+    max_deltas = 1000
+
+    def __init__(self, capacity=None, error_rate=0.001):
+        self._capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._generation = None
+        self._epoch = None
+        self._synced_at = None
+
+    @property
+    def capacity(self):
+        if self._capacity is not None:
+            return self._capacity
+        return getattr(settings, 'TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000)
+
+    @property
+    def generation_key(self):
+        return f'{self.cache_prefix}:generation'
+
+    @property
+    def epoch_key(self):
+        return f'{self.cache_prefix}:epoch'
+
+    def _entry_key(self, jti):
+        return f'{self.cache_prefix}:jti:{jti}'
+
+    def _delta_key(self, generation):
+        return f'{self.cache_prefix}:delta:{generation}'
+
+    def is_blacklisted(self, jti):
+        """jtiが無効化済みかどうか"""
+        blacklisted = self._is_blacklisted(jti)
+        auth_blacklist_checks_total.inc(result='blacklisted' if blacklisted else 'allowed')
+        return blacklisted
+
+    def _is_blacklisted(self, jti):
+        self._sync()
+
+        if jti not in self._bloom:
+            return False
+
+        if cache.get(self._entry_key(jti)) is not None:
+            return True
+
+        # ブルームフィルターの偽陽性、またはキャッシュから消えたエントリ
+        entry = BlacklistedRefreshToken.objects.filter(
+            jti=jti
+        ).values_list('expires_at', flat=True).first()
+        if entry is None:
+            return False
+        self._cache_entry(jti, entry)
+        return True
+
+    def blacklist(self, token):
+        """リフレッシュトークンを無効化"""
+        jti = token[api_settings.JTI_CLAIM]
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+        try:
+            with transaction.atomic():
+                BlacklistedRefreshToken.objects.create(
+                    jti=jti,
+                    user_id=token.payload.get(api_settings.USER_ID_CLAIM),
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            # 既に無効化済み
+            pass
+
+        auth_token_blacklisted_total.inc()
+        self._cache_entry(jti, expires_at)
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+        self._publish(jti)
+
+    def rebuild(self):
+        """全ワーカーにブルームフィルターをDBから再構築させる（期限切れの削除後など）"""
+        # 連番ではキャッシュから消えた後に以前と同じ値になり得るため、ランダムな値にする
+        cache.set(self.epoch_key, secrets.token_hex(8), timeout=None)
+
+    def _cache_entry(self, jti, expires_at):
+        timeout = int((expires_at - timezone.now()).total_seconds())
+        if timeout > 0:
+            cache.set(self._entry_key(jti), 1, timeout)
+
+    def _publish(self, jti):
+        """世代番号を進め、その世代の差分としてjtiをキャッシュに書き込む"""
+        cache.add(self.generation_key, 0, timeout=None)
+        try:
+            generation = cache.incr(self.generation_key)
+        except ValueError:
+            generation = 1
+            cache.set(self.generation_key, generation, timeout=None)
+        cache.set(self._delta_key(generation), jti, self.delta_timeout)
+
+    def _sync(self):
+        """世代番号が変わっていれば差分を取り込む（エポックが変わっていれば再構築）"""
+        values = cache.get_many([self.generation_key, self.epoch_key])
+        generation = values.get(self.generation_key, 0)
+        epoch = values.get(self.epoch_key)
+        if epoch is None:
+            # 初回、またはキャッシュから消えた（世代番号が巻き戻って以前と同じ番号になり得るため、
+            # 新しいエポックにして各ワーカーでDBから再構築する）
+            cache.add(self.epoch_key, secrets.token_hex(8), timeout=None)
+            epoch = cache.get(self.epoch_key)
+        if self._bloom is not None and \
+                generation == self._generation and epoch == self._epoch:
+            return
+
+        with self._lock:
+            if self._bloom is not None and \
+                    generation == self._generation and epoch == self._epoch:
+                return
+
+            now = timezone.now()
+            if self._bloom is None or epoch != self._epoch or generation < self._generation:
+                self._load_from_db()
+            elif not self._apply_deltas(generation):
+                # 差分が期限切れ・書き込み前、または多すぎる
+                self._load_from_db(since=self._synced_at - self.sync_overlap)
+
+            self._generation = generation
+            self._epoch = epoch
+            self._synced_at = now
+
+    def _apply_deltas(self, generation):
+        """前回から指定の世代番号までの差分をキャッシュから取り込む（揃わない場合はFalse）"""
+        if generation - self._generation > self.max_deltas:
+            return False
+        keys = [self._delta_key(g) for g in range(self._generation + 1, generation + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) < len(keys):
+            return False
+        for jti in deltas.values():
+            self._bloom.add(jti)
+        return True
+
+    def _load_from_db(self, since=None):
+        """DBから取り込む（sinceを指定しない場合はフィルターを作り直す）"""
+        queryset = BlacklistedRefreshToken.objects.filter(expires_at__gt=timezone.now())
+        if since is None:
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+        else:
+            queryset = queryset.filter(blacklisted_at__gte=since)
+
+        for jti in queryset.values_list('jti', flat=True).iterator():
+            self._bloom.add(jti)
+
+
+token_blacklist = TokenBlacklist()
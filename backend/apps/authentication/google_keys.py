@@ -0,0 +1,174 @@
+"""
+Google署名鍵（証明書）のキャッシュ
+
+IDトークンの検証ごとにGoogleの証明書セットをHTTPで取得しないよう、
+プロセス内メモリとDjangoキャッシュ（ワーカー間で共有）に保持する。
+"""
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from google.auth import jwt
+
+from .providers import get_provider_client
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_OAUTH2_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleCertStore:
+    """Google証明書ストア
+
+    - Cache-Controlのmax-ageに従って有効期限を設定
+    - 期限切れ前にバックグラウンドで再取得
+    - 未知のkidを受け取った場合は一度だけ再取得
+    """
+    cache_key = 'auth:google_certs'
+
+    def __init__(self, certs_url=None, default_max_age=300, refresh_margin=60,
+                 min_refetch_interval=10):
+        self.certs_url = certs_url
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.min_refetch_interval = min_refetch_interval
+        self._lock = threading.Lock()
+        self._certs = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._refreshing = False
+
+    def get_certs(self):
+        """有効な証明書セットを返す"""
+        now = time.time()
+        if self._certs and now < self._expires_at:
+            if now >= self._expires_at - self.refresh_margin:
+                self._refresh_in_background()
+            return self._certs
+
+        with self._lock:
+            # 他スレッドが取得済みの場合はそれを使う
+            if self._certs and time.time() < self._expires_at:
+                return self._certs
+            if self._load_shared():
+                return self._certs
+            return self._fetch()
+
+    def verify(self, token, audience):
+        """IDトークンを検証してクレームを返す（失敗時はValueError）"""
+        kid = jwt.decode_header(token).get('kid')
+        certs = self.get_certs()
+
+        if kid not in certs:
+            certs = self._refetch_for_unknown_kid()
+
+        idinfo = jwt.decode(token, certs=certs, audience=audience)
+
+        if idinfo.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+
+        return idinfo
+
+    def clear(self):
+        """メモリ上の証明書を破棄"""
+        with self._lock:
+            self._certs = {}
+            self._expires_at = 0.0
+            self._fetched_at = 0.0
+
+    def _get_url(self):
+        return self.certs_url or getattr(
+            settings, 'GOOGLE_OAUTH2_CERTS_URL', GOOGLE_OAUTH2_CERTS_URL
+        )
+
+    def _load_shared(self):
+        """Djangoキャッシュから証明書を読み込む"""
+        cached = cache.get(self.cache_key)
+        if not cached or cached['expires_at'] <= time.time():
+            return False
+        self._certs = cached['certs']
+        self._expires_at = cached['expires_at']
+        self._fetched_at = cached['fetched_at']
+        return True
+
+    def _fetch(self):
+        """証明書を取得してメモリとDjangoキャッシュに保存"""
+        return self._store(*self._download())
+
+    def _download(self):
+        """証明書を取得し、(証明書セット, max-age) を返す（ロックの外で呼び出せる）"""
+        response = get_provider_client('google').get(self._get_url())
+        if response.status_code != 200:
+            raise ValueError(
+                f'Could not fetch certificates at {self._get_url()}'
+            )
+        max_age = self._parse_max_age(response.headers.get('Cache-Control', ''))
+        return response.json(), max_age
+
+    def _store(self, certs, max_age):
+        """取得した証明書をメモリとDjangoキャッシュに保存"""
+        now = time.time()
+        self._certs = certs
+        self._expires_at = now + max_age
+        self._fetched_at = now
+
+        cache.set(self.cache_key, {
+            'certs': self._certs,
+            'expires_at': self._expires_at,
+            'fetched_at': self._fetched_at,
+        }, timeout=max_age)
+
+        return self._certs
+
+    def _parse_max_age(self, cache_control):
+        match = _MAX_AGE_RE.search(cache_control)
+        if match:
+            return int(match.group(1))
+        return self.default_max_age
+
+    def _refetch_for_unknown_kid(self):
+        """未知のkid用に一度だけ再取得（短時間での連続取得は抑制）"""
+        with self._lock:
+            if time.time() - self._fetched_at < self.min_refetch_interval:
+                return self._certs
+            # 他ワーカーが既に新しい鍵を取得している可能性がある
+            cached = cache.get(self.cache_key)
+            if cached and cached['fetched_at'] > self._fetched_at:
+                self._load_shared()
+                return self._certs
+            return self._fetch()
+
+    def _refresh_in_background(self):
+        """期限切れ前にバックグラウンドで再取得"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        thread = threading.Thread(target=self._background_refresh, daemon=True)
+        thread.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                # 他のワーカーが更新済みであればそれを使う
+                if self._load_shared() and \
+                        time.time() < self._expires_at - self.refresh_margin:
+                    return
+            # 取得中も検証できるよう、HTTPの往復はロックの外で行い、結果だけロック内で反映する
+            certs, max_age = self._download()
+            with self._lock:
+                self._store(certs, max_age)
+        except Exception:
+            logger.warning('Google証明書のバックグラウンド更新に失敗しました', exc_info=True)
+        finally:
+            self._refreshing = False
+
+
+google_cert_store = GoogleCertStore()
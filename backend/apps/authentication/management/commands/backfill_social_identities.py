@@ -0,0 +1,55 @@
+"""
+既存ユーザーのgoogle_idからソーシャルアカウント連携を作成するコマンド
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.authentication.models import SocialIdentity
+
+
+class Command(BaseCommand):
+    help = '既存ユーザーのgoogle_idからSocialIdentityを作成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='1回に処理するユーザー数',
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        batch_size = options['batch_size']
+
+        users = User.objects.exclude(google_id__isnull=True).exclude(google_id='')
+        last_pk = 0
+        processed = 0
+
+        # 主キー順にバッチで処理（作成済みの連携は無視される）
+        while True:
+            batch = list(
+                users.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'google_id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            SocialIdentity.objects.bulk_create(
+                [
+                    SocialIdentity(
+                        provider=SocialIdentity.PROVIDER_GOOGLE,
+                        subject=google_id,
+                        user_id=pk,
+                    )
+                    for pk, google_id in batch
+                ],
+                ignore_conflicts=True,
+            )
+
+            last_pk = batch[-1][0]
+            processed += len(batch)
+            self.stdout.write(f'{processed}件処理しました')
+
+        self.stdout.write(self.style.SUCCESS(f'完了: {processed}件のユーザーを処理しました'))
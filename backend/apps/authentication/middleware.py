@@ -0,0 +1,33 @@
+"""
+認証関連のミドルウェア
+"""
+from allauth.account.middleware import AccountMiddleware as BaseAccountMiddleware
+from allauth.core import context
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+
+class AccountMiddleware(BaseAccountMiddleware):
+    """非同期にも対応したallauthのAccountMiddleware
+
+    allauthのミドルウェアは同期のみのため、ASGIでは非同期ビューの呼び出しが
+    1つのスレッドに直列化され、非同期ビュー（async_views）が並行して処理されない。
+    処理内容は同じで、セッションの読み込みのみスレッドで行う。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        with context.request_context(request):
+            response = await self.get_response(request)
+            await sync_to_async(self._remove_dangling_login)(request, response)
+            return response
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlacklistedRefreshToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=255, unique=True, verbose_name='JTI')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='有効期限')),
+                ('blacklisted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='無効化日時')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='blacklisted_refresh_tokens', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '無効化済みリフレッシュトークン',
+                'verbose_name_plural': '無効化済みリフレッシュトークン',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SocialIdentity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('google', 'Google'), ('twitter', 'Twitter'), ('discord', 'Discord')], max_length=20, verbose_name='プロバイダー')),
+                ('subject', models.CharField(max_length=255, verbose_name='プロバイダーのユーザーID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='social_identities', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'ソーシャルアカウント連携',
+                'verbose_name_plural': 'ソーシャルアカウント連携',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='socialidentity',
+            constraint=models.UniqueConstraint(fields=('provider', 'subject'), name='unique_social_identity'),
+        ),
+    ]
@@ -1,4 +1,123 @@
-from django.db import models
+"""
+認証関連のモデル
+"""
+from django.conf import settings
+from django.db import models, transaction
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
 
+class BlacklistedRefreshToken(models.Model):
+    """無効化済みリフレッシュトークン（ブラックリストの永続化先）"""
+    
+    jti = models.CharField(_('JTI'), max_length=255, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='blacklisted_refresh_tokens',
+        verbose_name=_('ユーザー'),
+    )
+    expires_at = models.DateTimeField(_('有効期限'), db_index=True)
+    blacklisted_at = models.DateTimeField(_('無効化日時'), auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = _('無効化済みリフレッシュトークン')
+        verbose_name_plural = _('無効化済みリフレッシュトークン')
+    
+    def __str__(self):
+        return self.jti
+
+
+class SocialIdentityManager(models.Manager):
+    """ソーシャルアカウント連携マネージャー"""
+    
+    def get_or_create_user(self, provider, subject, email, defaults=None):
+        """連携済みならユーザーを返し、初回ログイン時はユーザーと連携を作成する
+        
+        連携済みの場合は (provider, subject) の一意インデックスによる1回の検索で済む。
+        """
+        identity = self.select_related('user').filter(
+            provider=provider, subject=subject
+        ).first()
+        if identity is not None:
+            return identity.user, False
+        
+        return self._create_user_identity(provider, subject, email, defaults)
+    
+    async def aget_or_create_user(self, provider, subject, email, defaults=None):
+        """get_or_create_userの非同期版"""
+        from asgiref.sync import sync_to_async
+        
+        identity = await self.select_related('user').filter(
+            provider=provider, subject=subject
+        ).afirst()
+        if identity is not None:
+            return identity.user, False
+        
+        return await sync_to_async(self._create_user_identity)(
+            provider, subject, email, defaults
+        )
+    
+    def _create_user_identity(self, provider, subject, email, defaults):
+        from django.contrib.auth import get_user_model
+        from apps.users.outbox import enqueue_welcome_email
+        
+        User = get_user_model()
+        
+        with transaction.atomic():
+            user, created = User.objects.get_or_create(email=email, defaults=defaults or {})
+            # Twitterは生成したダミーのメールアドレスのため送信しない
+            if created and provider != self.model.PROVIDER_TWITTER:
+                enqueue_welcome_email(user.email, user.get_display_name())
+            # 同時ログインで競合しても失敗しないよう、1文の INSERT IGNORE で作成
+            self.bulk_create(
+                [self.model(provider=provider, subject=subject, user=user)],
+                ignore_conflicts=True,
+            )
+        
+        # 競合した場合は先に作成された連携のユーザーを使う
+        user_id = self.filter(
+            provider=provider, subject=subject
+        ).values_list('user_id', flat=True).get()
+        if user_id != user.pk:
+            return User.objects.get(pk=user_id), False
+        return user, created
+
+
+class SocialIdentity(models.Model):
+    """ソーシャルアカウント連携（プロバイダーのユーザーIDとユーザーの対応）"""
+    
+    PROVIDER_GOOGLE = 'google'
+    PROVIDER_TWITTER = 'twitter'
+    PROVIDER_DISCORD = 'discord'
+    PROVIDER_CHOICES = (
+        (PROVIDER_GOOGLE, 'Google'),
+        (PROVIDER_TWITTER, 'Twitter'),
+        (PROVIDER_DISCORD, 'Discord'),
+    )
+    
+    provider = models.CharField(_('プロバイダー'), max_length=20, choices=PROVIDER_CHOICES)
+    subject = models.CharField(_('プロバイダーのユーザーID'), max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='social_identities',
+        verbose_name=_('ユーザー'),
+    )
+    created_at = models.DateTimeField(_('作成日時'), auto_now_add=True)
+    
+    objects = SocialIdentityManager()
+    
+    class Meta:
+        verbose_name = _('ソーシャルアカウント連携')
+        verbose_name_plural = _('ソーシャルアカウント連携')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'subject'],
+                name='unique_social_identity',
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.provider}:{self.subject}'
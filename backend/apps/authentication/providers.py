@@ -0,0 +1,291 @@
+"""
+ソーシャル認証プロバイダー用のHTTPクライアント
+
+プロバイダーごとに接続プール付きのセッションを共有し、
+タイムアウト・ジッター付きリトライ・サーキットブレーカーを適用する。
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from apps.monitoring import perf
+
+logger = logging.getLogger(__name__)
+
+# プロバイダーごとのベースURL
+PROVIDER_BASE_URLS = {
+    'google': 'https://www.googleapis.com',
+    'twitter': 'https://api.twitter.com',
+    'discord': 'https://discord.com',
+}
+
+DEFAULT_PROVIDER_HTTP = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    'MAX_RETRIES': 2,
+    'BACKOFF': 0.2,
+    'POOL_MAXSIZE': 20,
+    'ASYNC_POOL_MAXSIZE': 200,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+}
+
+# リトライ対象のステータスコード
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class ProviderUnavailable(Exception):
+    """プロバイダーが利用できない（サーキットオープン、またはリトライ上限到達）"""
+
+    def __init__(self, provider, message=''):
+        self.provider = provider
+        super().__init__(message or f'{provider} is unavailable')
+
+
+class SocialAuthError(Exception):
+    """プロバイダーからユーザー情報を取得できない（トークン不正など）"""
+
+
+class CircuitBreaker:
+    """サーキットブレーカー
+
+    連続失敗がしきい値に達するとオープンになり、reset_timeoutの間は
+    リクエストを即座に拒否する。経過後は1リクエストだけ試行（ハーフオープン）する。
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        """リクエストを許可するかどうか"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and \
+                    time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or \
+                    self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ProviderClient:
+    """プロバイダーごとのHTTPクライアント"""
+
+    def __init__(self, name, base_url, breaker, connect_timeout=3.05,
+                 read_timeout=5, max_retries=2, backoff=0.2, pool_maxsize=20):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker
+
+        self.session = requests.Session()
+        # リトライは自前で行うため、アダプター側のリトライは無効化
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=0,
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        """リクエストを送信（4xxはそのまま返し、接続エラー・5xxはリトライ）"""
+        if not self.breaker.allow():
+            raise ProviderUnavailable(self.name, f'{self.name} circuit is open')
+
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        kwargs.setdefault('timeout', self.timeout)
+
+        succeeded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.RequestException as e:
+                    logger.warning('%s request failed (attempt %d): %s', self.name, attempt + 1, e)
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        succeeded = True
+                        return response
+                    logger.warning(
+                        '%s returned %d (attempt %d)', self.name, response.status_code, attempt + 1
+                    )
+                finally:
+                    perf.record_http(time.perf_counter() - started)
+
+                if attempt < self.max_retries:
+                    # フルジッター付き指数バックオフ
+                    time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+            raise ProviderUnavailable(self.name)
+        finally:
+            # 想定外の例外で中断した場合も失敗として記録する（ハーフオープンのまま残さない）
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+
+class AsyncProviderClient:
+    """プロバイダーごとの非同期HTTPクライアント（ASGIビュー用）
+
+    サーキットブレーカーは同期クライアントと共有する。
+    """
+
+    def __init__(self, name, base_url, breaker, connect_timeout=3.05,
+                 read_timeout=5, max_retries=2, backoff=0.2, pool_maxsize=200):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_maxsize,
+                max_keepalive_connections=pool_maxsize,
+            ),
+        )
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def request(self, method, path, **kwargs):
+        """リクエストを送信（リトライ・ブレーカーの扱いは同期版と同じ）"""
+        if not self.breaker.allow():
+            raise ProviderUnavailable(self.name, f'{self.name} circuit is open')
+
+        succeeded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    response = await self.client.request(method, path, **kwargs)
+                except httpx.HTTPError as e:
+                    logger.warning('%s request failed (attempt %d): %s', self.name, attempt + 1, e)
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        succeeded = True
+                        return response
+                    logger.warning(
+                        '%s returned %d (attempt %d)', self.name, response.status_code, attempt + 1
+                    )
+                finally:
+                    perf.record_http(time.perf_counter() - started)
+
+                if attempt < self.max_retries:
+                    await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+            raise ProviderUnavailable(self.name)
+        finally:
+            # キャンセルされた場合も失敗として記録する
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+
+_breakers = {}
+_clients = {}
+_clients_lock = threading.Lock()
+
+# httpx.AsyncClientはイベントループに紐づくため、ループごとに保持する
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_options():
+    return {
+        **DEFAULT_PROVIDER_HTTP,
+        **getattr(settings, 'SOCIAL_PROVIDER_HTTP', {}),
+    }
+
+
+def _get_breaker(name, options):
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(
+            failure_threshold=options['FAILURE_THRESHOLD'],
+            reset_timeout=options['RESET_TIMEOUT'],
+        )
+    return _breakers[name]
+
+
+def get_provider_client(name):
+    """プロバイダーのクライアントを取得（プロセス内で共有）"""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if name not in _clients:
+            options = _get_options()
+            _clients[name] = ProviderClient(
+                name,
+                PROVIDER_BASE_URLS[name],
+                _get_breaker(name, options),
+                connect_timeout=options['CONNECT_TIMEOUT'],
+                read_timeout=options['READ_TIMEOUT'],
+                max_retries=options['MAX_RETRIES'],
+                backoff=options['BACKOFF'],
+                pool_maxsize=options['POOL_MAXSIZE'],
+            )
+        return _clients[name]
+
+
+def get_async_provider_client(name):
+    """プロバイダーの非同期クライアントを取得（イベントループ内で共有）"""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    if name not in clients:
+        options = _get_options()
+        with _clients_lock:
+            breaker = _get_breaker(name, options)
+        clients[name] = AsyncProviderClient(
+            name,
+            PROVIDER_BASE_URLS[name],
+            breaker,
+            connect_timeout=options['CONNECT_TIMEOUT'],
+            read_timeout=options['READ_TIMEOUT'],
+            max_retries=options['MAX_RETRIES'],
+            backoff=options['BACKOFF'],
+            pool_maxsize=options['ASYNC_POOL_MAXSIZE'],
+        )
+    return clients[name]
@@ -3,7 +3,17 @@
 """
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.database.router import set_request_user
+
+from .authentication import TOKEN_VERSION_CLAIM, get_token_state
+from .blacklist import token_blacklist
 
 User = get_user_model()
 
@@ -14,14 +24,52 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
+        # ログイン・登録したユーザーを読み取りレプリカの固定対象にする（apps.database.router）
+        set_request_user(user.pk)
         
         # カスタムクレームを追加
         token['email'] = user.email
         token['display_name'] = user.get_display_name()
+        # 無効化の判定用（apps.authentication.authentication）
+        token[TOKEN_VERSION_CLAIM] = user.token_version
         
         return token
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """トークン更新シリアライザー
+
+    ブラックリストはtoken_blacklistで判定し、無効化されたユーザー・トークンバージョンの
+    リフレッシュトークンからはアクセストークンを発行しない。
+    """
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        
+        if token_blacklist.is_blacklisted(refresh[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+        
+        state = get_token_state(refresh.get(api_settings.USER_ID_CLAIM))
+        if state is None or not state[1]:
+            raise TokenError('User is inactive or does not exist')
+        if refresh.get(TOKEN_VERSION_CLAIM, 0) != state[0]:
+            raise TokenError('Token is revoked')
+        
+        data = {'access': str(refresh.access_token)}
+        
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                token_blacklist.blacklist(refresh)
+            
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            
+            data['refresh'] = str(refresh)
+        
+        return data
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     """ユーザー登録シリアライザー"""
     password = serializers.CharField(
@@ -0,0 +1,31 @@
+"""
+認証関連のシグナル
+"""
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from apps.users.models import User
+
+from .authentication import cache_token_state_on_commit, revoke_user_tokens
+
+TOKEN_STATE_FIELDS = frozenset({'token_version', 'is_active'})
+
+
+@receiver(post_init, sender=User)
+def remember_is_active(sender, instance, **kwargs):
+    """読み込み時のis_activeを保持（遅延読み込みのフィールドは参照しない）"""
+    instance._loaded_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=User)
+def refresh_token_state(sender, instance, created, update_fields=None, **kwargs):
+    """ステートレス認証が参照するトークンの状態を更新し、無効化されたユーザーのトークンを失効させる"""
+    if update_fields is not None and not TOKEN_STATE_FIELDS & set(update_fields):
+        return
+
+    deactivated = not created and instance._loaded_is_active and not instance.is_active
+    instance._loaded_is_active = instance.is_active
+    if deactivated:
+        revoke_user_tokens(instance)
+    else:
+        cache_token_state_on_commit(instance)
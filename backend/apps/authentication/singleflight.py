@@ -0,0 +1,183 @@
+"""
+ソーシャル認証トークン検証のシングルフライトキャッシュ
+
+同じアクセストークンの検証が短時間に重なった場合、プロバイダーへの問い合わせと
+ユーザーの取得・作成を1回にまとめ、その結果を全ての呼び出し元で共有する。
+- プロセス内: 実行中の呼び出しに相乗りする
+- ワーカー間: キャッシュのロックキーで実行者を1つに絞り、結果をキャッシュで共有する
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+class _Call:
+    """プロセス内で実行中の検証"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class VerificationCache:
+    """トークン検証結果の短期キャッシュ
+
+    結果はキャッシュに保存するためJSONシリアライズ可能な値である必要がある。
+    失敗（例外）はキャッシュしない。
+    """
+    prefix = 'auth:verify'
+
+    def __init__(self, ttl=None, lock_timeout=10, poll_interval=0.05):
+        self._ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # asyncio.Futureはイベントループに紐づくため、ループごとに保持する
+        self._async_inflight = weakref.WeakKeyDictionary()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'SOCIAL_AUTH_VERIFICATION_TTL', 30)
+
+    def make_key(self, provider, token):
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        return f'{self.prefix}:{provider}:{digest}'
+
+    def get_or_compute(self, provider, token, compute):
+        """キャッシュ済みの結果を返す。なければcompute()を1回だけ実行する"""
+        key = self.make_key(provider, token)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+        with self._lock:
+            call = self._inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._inflight[key] = _Call()
+
+        if not is_leader:
+            if call.event.wait(self.lock_timeout):
+                if call.error is not None:
+                    raise call.error
+                if call.result is not None:
+                    return call.result
+            # 待機がタイムアウトした、または実行者が中断された（Exception以外の例外）
+            return compute()
+
+        try:
+            call.result = self._compute_shared(key, compute)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def _compute_shared(self, key, compute):
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                result = compute()
+                cache.set(key, result, self.ttl)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        # 他ワーカーが検証中のため結果を待つ
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            if cache.get(lock_key) is None:
+                # 実行中のワーカーが失敗した
+                break
+        return compute()
+
+    async def aget_or_compute(self, provider, token, compute):
+        """get_or_computeの非同期版（computeはコルーチン関数）"""
+        key = self.make_key(provider, token)
+        result = await cache.aget(key)
+        if result is not None:
+            return result
+
+        loop = asyncio.get_running_loop()
+        inflight = self._async_inflight.setdefault(loop, {})
+        future = inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    # 待機していた自分自身がキャンセルされた
+                    raise
+            # 実行者がキャンセルされたため、改めて検証する
+            return await self.aget_or_compute(provider, token, compute)
+
+        future = inflight[key] = loop.create_future()
+        try:
+            result = await self._acompute_shared(key, compute)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # 待機者がいない場合の未取得例外の警告を抑制
+            future.exception()
+            raise
+        finally:
+            # キャンセルなどException以外で中断された場合も待機者を解放する
+            if not future.done():
+                future.cancel()
+            if inflight.get(key) is future:
+                del inflight[key]
+
+    async def _acompute_shared(self, key, compute):
+        lock_key = f'{key}:lock'
+        if await cache.aadd(lock_key, 1, self.lock_timeout):
+            try:
+                result = await compute()
+                await cache.aset(key, result, self.ttl)
+                return result
+            finally:
+                await cache.adelete(lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await cache.aget(key)
+            if result is not None:
+                return result
+            if await cache.aget(lock_key) is None:
+                break
+        return await compute()
+
+
+verification_cache = VerificationCache()
+
+
+def get_result_user(result):
+    """共有された検証結果（{'user_id': ...}）のユーザーを取得
+
+    作成直後のユーザーがレプリカに未反映の場合があるため、プライマリから読む。
+    """
+    return get_user_model().objects.using(DEFAULT_DB_ALIAS).get(pk=result['user_id'])
+
+
+async def aget_result_user(result):
+    """get_result_userの非同期版"""
+    return await get_user_model().objects.using(DEFAULT_DB_ALIAS).aget(pk=result['user_id'])
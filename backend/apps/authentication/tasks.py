@@ -0,0 +1,24 @@
+"""
+認証関連のCeleryタスク
+"""
+from celery import shared_task
+
+
+@shared_task
+def purge_expired_blacklisted_tokens():
+    """
+    有効期限切れの無効化済みリフレッシュトークンを削除（定期実行）
+    """
+    from django.utils import timezone
+    from .blacklist import token_blacklist
+    from .models import BlacklistedRefreshToken
+    
+    count, _ = BlacklistedRefreshToken.objects.filter(
+        expires_at__lt=timezone.now()
+    ).delete()
+    
+    if count:
+        # 削除したjtiをブルームフィルターから除くため再構築させる
+        token_blacklist.rebuild()
+    
+    return f'Deleted {count} expired blacklisted tokens'
@@ -0,0 +1,331 @@
+"""
+非同期ソーシャル認証ビューのテスト
+
+プロバイダーへの問い合わせはhttpx.MockTransportで置き換える。
+"""
+import asyncio
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from apps.authentication.models import SocialIdentity
+from apps.authentication.providers import AsyncProviderClient, CircuitBreaker, ProviderClient
+from apps.authentication.throttling import SlidingWindowThrottle
+from apps.users.models import User
+
+
+def discord_handler(request):
+    token = request.headers['Authorization'].removeprefix('Bearer ')
+    if token == 'invalid':
+        return httpx.Response(401, json={'message': '401: Unauthorized'})
+    if token == 'no-email':
+        return httpx.Response(200, json={'id': '900', 'username': 'noemail'})
+    return httpx.Response(200, json={
+        'id': f'discord-{token}',
+        'username': f'user-{token}',
+        'email': f'{token}@discord.example.com',
+    })
+
+
+class AsyncSocialAuthTestMixin:
+    provider = 'discord'
+    url_name = 'authentication:async_discord_auth'
+
+    def setUp(self):
+        cache.clear()
+        self.requests = []
+        self.handler = discord_handler
+        self.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        patcher = mock.patch(
+            'apps.authentication.async_views.get_async_provider_client', self.get_client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_client(self, name):
+        async def handler(request):
+            self.requests.append(request)
+            response = self.handler(request)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        client = AsyncProviderClient(name, 'https://provider.test', self.breaker, backoff=0)
+        client.client = httpx.AsyncClient(
+            base_url='https://provider.test', transport=httpx.MockTransport(handler)
+        )
+        return client
+
+    async def post(self, data):
+        return await self.async_client.post(
+            reverse(self.url_name), {'provider': self.provider, **data},
+            content_type='application/json'
+        )
+
+
+class AsyncSocialAuthTestCase(AsyncSocialAuthTestMixin, TestCase):
+    pass
+
+
+class AsyncDiscordAuthViewTests(AsyncSocialAuthTestCase):
+    """AsyncDiscordAuthView"""
+
+    async def test_creates_user_and_issues_tokens(self):
+        response = await self.post({'access_token': 'alice'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body['is_new_user'])
+        self.assertEqual(body['user']['email'], 'alice@discord.example.com')
+        self.assertEqual(set(body['tokens']), {'access', 'refresh'})
+        self.assertEqual(self.requests[0].url.path, '/api/users/@me')
+        self.assertTrue(await SocialIdentity.objects.filter(
+            provider=SocialIdentity.PROVIDER_DISCORD, subject='discord-alice',
+            user_id=body['user']['id'],
+        ).aexists())
+
+    async def test_existing_identity_is_reused(self):
+        first = (await self.post({'access_token': 'bob'})).json()
+        # 同じアカウントの別のアクセストークン
+        self.handler = lambda request: httpx.Response(200, json={
+            'id': 'discord-bob', 'username': 'bob', 'email': 'bob@discord.example.com',
+        })
+        second = (await self.post({'access_token': 'bob-2'})).json()
+        self.assertFalse(second['is_new_user'])
+        self.assertEqual(second['user']['id'], first['user']['id'])
+        self.assertEqual(await User.objects.filter(email='bob@discord.example.com').acount(), 1)
+
+    async def test_concurrent_requests_share_verification(self):
+        async def slow_handler(request):
+            await asyncio.sleep(0.05)
+            return discord_handler(request)
+
+        self.handler = slow_handler
+        responses = await asyncio.gather(*[
+            self.post({'access_token': 'carol'}) for _ in range(5)
+        ])
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(len({response.json()['user']['id'] for response in responses}), 1)
+        # プロバイダーへの問い合わせは1回だけ
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_rejected_token(self):
+        response = await self.post({'access_token': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Discord認証に失敗しました。'})
+
+    async def test_missing_email(self):
+        response = await self.post({'access_token': 'no-email'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await User.objects.aexists())
+
+    async def test_provider_unavailable(self):
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        self.handler = lambda request: httpx.Response(503)
+        with self.assertLogs('apps.authentication.providers', 'WARNING'):
+            response = await self.post({'access_token': 'dave'})
+        self.assertEqual(response.status_code, 503)
+        # リトライ後も失敗した場合はブレーカーに記録される
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    async def test_connection_error(self):
+        def handler(request):
+            raise httpx.ConnectError('connection refused', request=request)
+
+        self.handler = handler
+        with self.assertLogs('apps.authentication.providers', 'WARNING'):
+            response = await self.post({'access_token': 'erin'})
+        self.assertEqual(response.status_code, 503)
+
+    async def test_invalid_body(self):
+        response = await self.async_client.post(
+            reverse(self.url_name), 'not json', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.post({'access_token': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('access_token', response.json())
+        self.assertEqual(self.requests, [])
+
+    @mock.patch.object(
+        SlidingWindowThrottle, 'THROTTLE_RATES', {'social_ip': '1/min', 'social_provider': None}
+    )
+    async def test_throttled_before_provider_request(self):
+        self.assertEqual((await self.post({'access_token': 'frank'})).status_code, 200)
+        response = await self.post({'access_token': 'frank-2'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(len(self.requests), 1)
+
+
+class AsyncTwitterAuthViewTests(AsyncSocialAuthTestCase):
+    """AsyncTwitterAuthView"""
+    provider = 'twitter'
+    url_name = 'authentication:async_twitter_auth'
+
+    def setUp(self):
+        super().setUp()
+        self.handler = lambda request: httpx.Response(200, json={
+            'data': {'id': '1234', 'name': 'Twitter User', 'username': 'tw'},
+        })
+
+    async def test_creates_user_with_generated_email(self):
+        response = await self.post({'access_token': 'token'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['user']['email'], '1234@twitter.temp')
+        self.assertEqual(body['user']['display_name'], 'Twitter User')
+        self.assertEqual(self.requests[0].url.params['user.fields'], 'profile_image_url')
+
+
+class AsyncGoogleAuthViewTests(AsyncSocialAuthTestCase):
+    """AsyncGoogleAuthView"""
+    provider = 'google'
+    url_name = 'authentication:async_google_auth'
+
+    @mock.patch('apps.authentication.async_views.google_cert_store.verify')
+    async def test_verified_id_token(self, verify):
+        verify.return_value = {
+            'sub': 'google-1', 'email': 'google@example.com',
+            'given_name': 'Given', 'family_name': 'Family',
+        }
+        response = await self.post({'access_token': 'id-token'})
+        self.assertEqual(response.status_code, 200)
+        user = await User.objects.aget(email='google@example.com')
+        self.assertEqual((user.google_id, user.first_name), ('google-1', 'Given'))
+
+    @mock.patch('apps.authentication.async_views.google_cert_store.verify', side_effect=ValueError)
+    async def test_invalid_id_token(self, verify):
+        response = await self.post({'access_token': 'id-token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'トークンが無効です。'})
+
+
+def discord_response(access_token):
+    """同期クライアント（requests）用のdiscord_handlerと同じ応答"""
+    request = httpx.Request('GET', 'https://provider.test/api/users/@me', headers={
+        'Authorization': f'Bearer {access_token}',
+    })
+    response = requests.Response()
+    handled = discord_handler(request)
+    response.status_code = handled.status_code
+    response._content = handled.content
+    return response
+
+
+@unittest.skipUnless(os.environ.get('ASYNC_VIEWS_LOAD_TEST'), 'ASYNC_VIEWS_LOAD_TEST=1 で実行')
+class SocialAuthLoadTest(AsyncSocialAuthTestMixin, TransactionTestCase):
+    """同期ビュー（WSGI）と非同期ビュー（ASGI）のスループットの比較
+
+    ASYNC_VIEWS_LOAD_TEST=1 python manage.py test apps.authentication.tests.test_async_views --settings=config.settings_test
+
+    プロバイダーの応答にprovider_delayかかる場合に、concurrency件のログインを処理する時間を計測する。
+    WSGIはwsgi_threads個のスレッド（gunicornのワーカー・スレッド数に相当）で同期ビューを、
+    ASGIは1つのイベントループで非同期ビューを処理する。
+    """
+    concurrency = 200
+    provider_delay = float(os.environ.get('ASYNC_VIEWS_LOAD_TEST_PROVIDER_MS', 200)) / 1000
+    wsgi_threads = int(os.environ.get('ASYNC_VIEWS_LOAD_TEST_WSGI_THREADS', 8))
+
+    def setUp(self):
+        super().setUp()
+        rates = {'social_ip': None, 'social_provider': None}
+        patcher = mock.patch.object(SlidingWindowThrottle, 'THROTTLE_RATES', rates)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_wsgi(self):
+        """同期ビューをスレッドで処理し、(処理時間, ステータスコード) を返す"""
+        provider_client = ProviderClient(
+            'discord', 'https://provider.test', CircuitBreaker(), backoff=0
+        )
+
+        # テスト用のSQLite（共有キャッシュのインメモリDB）は複数の接続からの同時書き込みで
+        # ロックを待たずに失敗するため、ASGI側（DB操作は1つのスレッドで実行）と同様に
+        # DB操作は直列化し、プロバイダーの応答待ちの間だけロックを外す
+        db_lock = threading.Lock()
+
+        def send(method, url, headers=None, **kwargs):
+            db_lock.release()
+            try:
+                time.sleep(self.provider_delay)
+            finally:
+                db_lock.acquire()
+            return discord_response(headers['Authorization'].removeprefix('Bearer '))
+
+        def login(index):
+            with db_lock:
+                response = Client().post(
+                    reverse('authentication:discord_auth'),
+                    {'provider': 'discord', 'access_token': f'wsgi{index}'},
+                    content_type='application/json',
+                )
+            return response.status_code
+
+        with mock.patch('apps.authentication.views.get_provider_client', return_value=provider_client), \
+                mock.patch.object(provider_client.session, 'request', side_effect=send):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.wsgi_threads) as executor:
+                statuses = list(executor.map(login, range(self.concurrency)))
+            return time.perf_counter() - started, statuses
+
+    def run_asgi(self):
+        """非同期ビューを1つのイベントループで処理し、(処理時間, ステータスコード, 同時問い合わせ数の最大) を返す"""
+        in_flight = peak = 0
+
+        async def slow_handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(self.provider_delay)
+            finally:
+                in_flight -= 1
+            return discord_handler(request)
+
+        self.handler = slow_handler
+
+        async def main():
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[
+                self.post({'access_token': f'asgi{i}'}) for i in range(self.concurrency)
+            ])
+            return time.perf_counter() - started, [response.status_code for response in responses]
+
+        elapsed, statuses = async_to_sync(main)()
+        return elapsed, statuses, peak
+
+    def report(self, name, elapsed):
+        print(f'\n{name}: {self.concurrency} logins in {elapsed:.2f}s ({self.concurrency / elapsed:.0f} req/s)')
+
+    def test_throughput(self):
+        wsgi_elapsed, wsgi_statuses = self.run_wsgi()
+        asgi_elapsed, asgi_statuses, peak = self.run_asgi()
+
+        self.assertEqual(wsgi_statuses, [200] * self.concurrency)
+        self.assertEqual(asgi_statuses, [200] * self.concurrency)
+        print(f'\nprovider latency {self.provider_delay * 1000:.0f}ms')
+        self.report(f'WSGI ({self.wsgi_threads} threads, sync views)', wsgi_elapsed)
+        self.report(f'ASGI (1 event loop, async views, peak in-flight {peak})', asgi_elapsed)
+
+        # WSGIはスレッド数までしか並行して待てない
+        self.assertGreaterEqual(
+            wsgi_elapsed, self.concurrency / self.wsgi_threads * self.provider_delay
+        )
+        # ASGIはプロバイダーの応答待ちを直列化しない
+        self.assertGreater(peak, self.concurrency // 2)
+        self.assertLess(asgi_elapsed, wsgi_elapsed)
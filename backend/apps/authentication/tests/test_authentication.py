@@ -0,0 +1,198 @@
+"""
+JWT認証クラスのテスト
+"""
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from apps.authentication.authentication import (
+    TOKEN_VERSION_CLAIM,
+    ActivityJWTAuthentication,
+    StatelessJWTAuthentication,
+    TokenClaimsUser,
+    get_token_state,
+    revoke_user_tokens,
+)
+from apps.authentication.serializers import CustomTokenObtainPairSerializer
+from apps.users.models import User
+
+
+class StatelessAuthenticationTestMixin:
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user('stateless@example.com', 'password')
+
+    def tearDown(self):
+        cache.clear()
+
+    def make_request(self, user=None):
+        token = CustomTokenObtainPairSerializer.get_token(user or self.user).access_token
+        return self.factory.get('/api/users/profile/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def authenticate(self, authentication_class, request):
+        return authentication_class().authenticate(request)
+
+
+class StatelessJWTAuthenticationTests(StatelessAuthenticationTestMixin, TestCase):
+    """トークンの状態（バージョン・is_active）による判定"""
+
+    def test_returns_claims_user(self):
+        user, _ = self.authenticate(StatelessJWTAuthentication, self.make_request())
+        self.assertIsInstance(user, TokenClaimsUser)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'stateless@example.com')
+
+    def test_deactivated_user_is_rejected(self):
+        request = self.make_request()
+        self.authenticate(StatelessJWTAuthentication, request)
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(StatelessJWTAuthentication, request)
+        # 無効化したユーザーの発行済みトークンは失効する（再び有効化しても使えない）
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(StatelessJWTAuthentication, request)
+        self.authenticate(StatelessJWTAuthentication, self.make_request())
+
+    def test_deactivation_with_update_fields_is_detected(self):
+        request = self.make_request()
+        self.authenticate(StatelessJWTAuthentication, request)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['is_active'])
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(StatelessJWTAuthentication, request)
+
+    def test_unrelated_save_keeps_tokens_valid(self):
+        request = self.make_request()
+        self.user.bio = 'updated'
+        self.user.save(update_fields=['bio', 'updated_at'])
+        self.user.save()
+        self.authenticate(StatelessJWTAuthentication, request)
+        self.assertEqual(get_token_state(self.user.pk), (0, True))
+
+    def test_cached_state_is_refreshed_on_save(self):
+        self.assertEqual(get_token_state(self.user.pk), (0, True))
+        self.user.token_version = 5
+        # 状態はコミット後にキャッシュへ反映される
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_token_state(self.user.pk), (5, True))
+
+    def test_deleted_user_is_rejected(self):
+        request = self.make_request()
+        self.user.delete()
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(StatelessJWTAuthentication, request)
+
+
+
+class ActivityJWTAuthenticationTests(StatelessAuthenticationTestMixin, TestCase):
+    """デフォルトの認証クラスでのトークンバージョンの判定"""
+
+    def test_current_token_is_accepted(self):
+        user, _ = self.authenticate(ActivityJWTAuthentication, self.make_request())
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_revoked_token_is_rejected(self):
+        request = self.make_request()
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_user_tokens(self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(ActivityJWTAuthentication, request)
+        # 無効化後に発行したトークンは使える
+        self.authenticate(ActivityJWTAuthentication, self.make_request())
+
+    def test_token_without_version_claim(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        del token[TOKEN_VERSION_CLAIM]
+        request = self.factory.get('/api/users/profile/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.authenticate(ActivityJWTAuthentication, request)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_user_tokens(self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(ActivityJWTAuthentication, request)
+
+
+class TokenRefreshTests(TestCase):
+    """無効化されたリフレッシュトークンの更新"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('refresh@example.com', 'password')
+        self.refresh = str(CustomTokenObtainPairSerializer.get_token(self.user))
+        self.client = APIClient()
+        self.url = reverse('authentication:token_refresh')
+
+    def tearDown(self):
+        cache.clear()
+
+    def post(self):
+        return self.client.post(self.url, {'refresh': self.refresh}, format='json')
+
+    def test_refresh(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_user_tokens(self.user)
+        self.assertEqual(self.post().status_code, 401)
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.post().status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        cache.clear()
+        self.assertEqual(self.post().status_code, 401)
+
+class AuthenticationQueryCountTests(StatelessAuthenticationTestMixin, TestCase):
+    """認証1回あたりのクエリ数（DBでユーザーを取得する場合とステートレスの比較）"""
+    requests = 50
+
+    def test_database_authentication_queries_per_request(self):
+        request = self.make_request()
+        # 最終アクセス日時の記録（一定間隔ごとに1回）を済ませておく
+        self.authenticate(ActivityJWTAuthentication, request)
+        with self.assertNumQueries(self.requests):
+            for _ in range(self.requests):
+                self.authenticate(ActivityJWTAuthentication, request)
+
+    def test_stateless_authentication_queries_per_request(self):
+        request = self.make_request()
+        self.authenticate(StatelessJWTAuthentication, request)
+        with self.assertNumQueries(0):
+            for _ in range(self.requests):
+                self.authenticate(StatelessJWTAuthentication, request)
+
+    def test_stateless_authentication_cold_cache(self):
+        request = self.make_request()
+        self.authenticate(StatelessJWTAuthentication, request)
+        cache.clear()
+        # キャッシュにない場合のみ、状態を1回のクエリで取得する
+        with self.assertNumQueries(1):
+            self.authenticate(StatelessJWTAuthentication, request)
+            self.authenticate(StatelessJWTAuthentication, request)
@@ -0,0 +1,89 @@
+"""
+リフレッシュトークンのブラックリストのテスト
+
+TokenBlacklistのインスタンスをワーカーごとのプロセスに見立て、キャッシュを共有させる。
+"""
+from django.core.cache import cache
+from django.test import TestCase
+
+from apps.authentication.blacklist import TokenBlacklist
+from apps.authentication.serializers import CustomTokenObtainPairSerializer
+from apps.users.models import User
+
+
+class TokenBlacklistTests(TestCase):
+    """ワーカー間での無効化の伝達"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('blacklist@example.com', 'password')
+        self.worker_a = TokenBlacklist(capacity=1000)
+        self.worker_b = TokenBlacklist(capacity=1000)
+        # 起動時の読み込みを済ませておく
+        self.worker_a.is_blacklisted('warmup')
+        self.worker_b.is_blacklisted('warmup')
+
+    def tearDown(self):
+        cache.clear()
+
+    def make_token(self):
+        return CustomTokenObtainPairSerializer.get_token(self.user)
+
+    def test_revocation_reaches_other_worker_without_db_query(self):
+        token = self.make_token()
+        self.worker_a.blacklist(token)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
+            self.assertFalse(self.worker_b.is_blacklisted(self.make_token()['jti']))
+
+    def test_refresh_checks_do_not_query_db_while_others_revoke(self):
+        unrelated = [self.make_token()['jti'] for _ in range(20)]
+        for _ in range(20):
+            self.worker_a.blacklist(self.make_token())
+            with self.assertNumQueries(0):
+                for jti in unrelated:
+                    self.assertFalse(self.worker_b.is_blacklisted(jti))
+
+    def test_evicted_entry_falls_back_to_db(self):
+        token = self.make_token()
+        self.worker_a.blacklist(token)
+        self.worker_b.is_blacklisted('sync')
+        cache.delete(self.worker_b._entry_key(token['jti']))
+
+        # ブルームフィルターに含まれ、キャッシュにない場合のみDBを参照する
+        with self.assertNumQueries(1):
+            self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
+
+    def test_missing_delta_is_loaded_from_db(self):
+        token = self.make_token()
+        self.worker_a.blacklist(token)
+        cache.delete(self.worker_a._delta_key(cache.get(self.worker_a.generation_key)))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
+
+    def test_rebuild_reloads_filter_from_db(self):
+        token = self.make_token()
+        self.worker_a.blacklist(token)
+        self.worker_a.rebuild()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
+
+    def test_generation_reset_reloads_filter_from_db(self):
+        token = self.make_token()
+        self.worker_a.blacklist(token)
+        self.worker_b.is_blacklisted('sync')
+        # キャッシュの再起動などで世代番号が消えた場合
+        cache.clear()
+        other = self.make_token()
+        self.worker_a.blacklist(other)
+        cache.set(self.worker_a._entry_key(token['jti']), 1)
+
+        self.assertTrue(self.worker_b.is_blacklisted(other['jti']))
+        self.assertTrue(self.worker_b.is_blacklisted(token['jti']))
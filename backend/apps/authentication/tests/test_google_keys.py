@@ -0,0 +1,192 @@
+"""
+Google証明書ストアのテスト
+
+証明書はローカルのHTTPサーバー（Googleの証明書エンドポイントの代わり）から取得する。
+"""
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from google.auth import crypt, jwt
+
+from apps.authentication.google_keys import GoogleCertStore
+
+AUDIENCE = 'client-id.apps.googleusercontent.com'
+
+
+def make_key_pair():
+    """(秘密鍵のPEM, 自己署名証明書のPEM)"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'test')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    return private_pem, certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+KEYS = {kid: make_key_pair() for kid in ('kid-1', 'kid-2')}
+
+
+def make_id_token(kid, issuer='https://accounts.google.com'):
+    now = int(time.time())
+    signer = crypt.RSASigner.from_string(KEYS[kid][0], key_id=kid)
+    return jwt.encode(signer, {
+        'iss': issuer,
+        'aud': AUDIENCE,
+        'sub': 'google-user',
+        'email': 'google@example.com',
+        'iat': now,
+        'exp': now + 300,
+    }).decode()
+
+
+class CertServer:
+    """証明書を返すローカルのHTTPサーバー"""
+
+    def __init__(self):
+        self.kids = ['kid-1']
+        self.cache_control = 'public, max-age=1234, must-revalidate, no-transform'
+        self.requests = 0
+        # セットされるまで応答を保留する（バックグラウンド更新のテスト用）
+        self.release = threading.Event()
+        self.release.set()
+        self.received = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                server.received.set()
+                server.release.wait(5)
+                body = json.dumps({kid: KEYS[kid][1] for kid in server.kids}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if server.cache_control:
+                    self.send_header('Cache-Control', server.cache_control)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/oauth2/v1/certs'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.release.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class GoogleCertStoreTests(SimpleTestCase):
+    """取得・キャッシュ・再取得"""
+
+    def setUp(self):
+        cache.clear()
+        self.server = CertServer()
+        self.addCleanup(self.server.close)
+        self.addCleanup(cache.clear)
+
+    def make_store(self, **kwargs):
+        return GoogleCertStore(certs_url=self.server.url, **kwargs)
+
+    def test_expiry_follows_cache_control_max_age(self):
+        store = self.make_store()
+        started = time.time()
+        self.assertEqual(set(store.get_certs()), {'kid-1'})
+        self.assertAlmostEqual(store._expires_at - started, 1234, delta=5)
+
+    def test_default_max_age_without_cache_control(self):
+        self.server.cache_control = None
+        store = self.make_store(default_max_age=42)
+        started = time.time()
+        store.get_certs()
+        self.assertAlmostEqual(store._expires_at - started, 42, delta=5)
+
+    def test_certs_are_reused_until_expiry(self):
+        store = self.make_store()
+        for _ in range(3):
+            store.verify(make_id_token('kid-1'), AUDIENCE)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_certs_are_loaded_from_shared_cache(self):
+        self.make_store().get_certs()
+        # 別のワーカー（プロセス）は共有キャッシュから読み込み、取得しない
+        idinfo = self.make_store().verify(make_id_token('kid-1'), AUDIENCE)
+        self.assertEqual(idinfo['sub'], 'google-user')
+        self.assertEqual(self.server.requests, 1)
+
+    def test_unknown_kid_triggers_refetch(self):
+        store = self.make_store(min_refetch_interval=0)
+        store.get_certs()
+        # Googleが鍵をローテーションした
+        self.server.kids = ['kid-1', 'kid-2']
+        idinfo = store.verify(make_id_token('kid-2'), AUDIENCE)
+        self.assertEqual(idinfo['email'], 'google@example.com')
+        self.assertEqual(self.server.requests, 2)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        store = self.make_store(min_refetch_interval=60)
+        store.get_certs()
+        self.server.kids = ['kid-1', 'kid-2']
+        with self.assertRaises(ValueError):
+            store.verify(make_id_token('kid-2'), AUDIENCE)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_wrong_issuer_is_rejected(self):
+        store = self.make_store()
+        with self.assertRaises(ValueError):
+            store.verify(make_id_token('kid-1', issuer='https://evil.example.com'), AUDIENCE)
+
+    def test_background_refresh_does_not_block_verification(self):
+        store = self.make_store(refresh_margin=60)
+        store.get_certs()
+        # 期限切れ間近
+        store._expires_at = time.time() + 30
+        cache.clear()
+        self.server.kids = ['kid-1', 'kid-2']
+        self.server.release.clear()
+        self.server.received.clear()
+
+        # 期限内の証明書をすぐに返し、再取得はバックグラウンドで行う
+        self.assertEqual(set(store.get_certs()), {'kid-1'})
+        self.assertTrue(self.server.received.wait(5))
+
+        # 取得の応答待ちの間もロックは保持されず、検証できる
+        started = time.perf_counter()
+        store.verify(make_id_token('kid-1'), AUDIENCE)
+        with store._lock:
+            pass
+        self.assertLess(time.perf_counter() - started, 1)
+
+        self.server.release.set()
+        deadline = time.monotonic() + 5
+        while store._refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(set(store.get_certs()), {'kid-1', 'kid-2'})
+        self.assertEqual(self.server.requests, 2)
+        self.assertAlmostEqual(store._expires_at - time.time(), 1234, delta=5)
@@ -0,0 +1,55 @@
+"""
+ログインビューのテスト
+"""
+from unittest import mock
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+
+
+class LoginViewTests(TestCase):
+    """CustomTokenObtainPairView"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('login@example.com', 'aP4ssw0rd!x')
+
+    def tearDown(self):
+        cache.clear()
+
+    def login(self, password='aP4ssw0rd!x'):
+        return self.client.post(reverse('authentication:token_obtain_pair'), {
+            'email': 'login@example.com',
+            'password': password,
+        }, format='json')
+
+    def patch_encode(self):
+        return mock.patch.object(
+            PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=PBKDF2PasswordHasher.encode
+        )
+
+    def test_successful_login_hashes_password_once(self):
+        with self.patch_encode() as encode:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['id'], self.user.pk)
+        self.assertIn('access', response.data['tokens'])
+        self.assertIn('refresh', response.data['tokens'])
+        # 認証（パスワードハッシュ計算）は1回だけ行われる
+        self.assertEqual(encode.call_count, 1)
+
+    def test_each_login_hashes_password_once(self):
+        with self.patch_encode() as encode:
+            for _ in range(3):
+                self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(encode.call_count, 3)
+
+    def test_wrong_password_is_rejected(self):
+        response = self.login(password='wrong-password')
+        self.assertEqual(response.status_code, 401)
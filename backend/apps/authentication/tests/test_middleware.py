@@ -0,0 +1,71 @@
+"""
+allauthのAccountMiddleware（非同期対応版）のテスト
+"""
+from allauth.core import context
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from apps.authentication.apps import ACCOUNT_MIDDLEWARE, ALLAUTH_ACCOUNT_MIDDLEWARE
+from apps.authentication.middleware import AccountMiddleware
+
+
+def _middleware_without(path):
+    return [entry for entry in settings.MIDDLEWARE if entry != path]
+
+
+class AccountConfigTests(SimpleTestCase):
+    """allauthのミドルウェアの確認"""
+
+    def ready(self):
+        apps.get_app_config('account').ready()
+
+    def test_async_middleware_passes_check(self):
+        self.assertIn(ACCOUNT_MIDDLEWARE, settings.MIDDLEWARE)
+        self.ready()
+        # 確認後は元の設定に戻る
+        self.assertIn(ACCOUNT_MIDDLEWARE, settings.MIDDLEWARE)
+        self.assertNotIn(ALLAUTH_ACCOUNT_MIDDLEWARE, settings.MIDDLEWARE)
+
+    def test_missing_middleware_is_reported(self):
+        with override_settings(MIDDLEWARE=_middleware_without(ACCOUNT_MIDDLEWARE)):
+            with self.assertRaises(ImproperlyConfigured):
+                self.ready()
+
+    def test_allauth_middleware_still_accepted(self):
+        middleware = [
+            ALLAUTH_ACCOUNT_MIDDLEWARE if entry == ACCOUNT_MIDDLEWARE else entry
+            for entry in settings.MIDDLEWARE
+        ]
+        with override_settings(MIDDLEWARE=middleware):
+            self.ready()
+
+
+class AccountMiddlewareTests(SimpleTestCase):
+    """同期・非同期の両方でallauthのリクエストコンテキストを設定する"""
+
+    def setUp(self):
+        self.request = RequestFactory().get('/api/auth/async/discord/')
+        self.request.session = {}
+
+    def test_sync(self):
+        def get_response(request):
+            self.assertIs(context.request, request)
+            return HttpResponse()
+
+        middleware = AccountMiddleware(get_response)
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(self.request).status_code, 200)
+        self.assertIsNone(context.request)
+
+    def test_async(self):
+        async def get_response(request):
+            self.assertIs(context.request, request)
+            return HttpResponse()
+
+        middleware = AccountMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(async_to_sync(middleware)(self.request).status_code, 200)
@@ -0,0 +1,124 @@
+"""
+プロバイダー用HTTPクライアントのテスト
+"""
+import asyncio
+from unittest import mock
+
+import httpx
+import requests
+from django.test import SimpleTestCase
+
+from apps.authentication.providers import (
+    AsyncProviderClient,
+    CircuitBreaker,
+    ProviderClient,
+    ProviderUnavailable,
+)
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+
+class ProviderClientBreakerTests(SimpleTestCase):
+    """同期クライアントのサーキットブレーカー"""
+
+    def make_client(self, breaker):
+        return ProviderClient('google', 'https://provider.test', breaker, max_retries=1, backoff=0)
+
+    def test_request_exception_is_retried_and_recorded(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        client = self.make_client(breaker)
+        error = requests.exceptions.ChunkedEncodingError('broken')
+        with mock.patch.object(client.session, 'request', side_effect=error) as request, \
+                self.assertLogs('apps.authentication.providers', 'WARNING'):
+            with self.assertRaises(ProviderUnavailable):
+                client.get('/userinfo')
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_unexpected_error_in_half_open_probe_reopens_circuit(self):
+        breaker = _half_open_breaker()
+        client = self.make_client(breaker)
+        with mock.patch.object(client.session, 'request', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.get('/userinfo')
+        # 試行の失敗が記録され、ハーフオープンのまま残らない
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_success_closes_circuit(self):
+        breaker = _half_open_breaker()
+        client = self.make_client(breaker)
+        response = requests.Response()
+        response.status_code = 200
+        with mock.patch.object(client.session, 'request', return_value=response):
+            self.assertIs(client.get('/userinfo'), response)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class AsyncProviderClientBreakerTests(SimpleTestCase):
+    """非同期クライアントのサーキットブレーカー"""
+
+    def request(self, breaker, handler):
+        async def main():
+            client = AsyncProviderClient(
+                'google', 'https://provider.test', breaker, max_retries=1, backoff=0
+            )
+            client.client = httpx.AsyncClient(
+                base_url='https://provider.test', transport=httpx.MockTransport(handler)
+            )
+            async with client.client:
+                return await client.get('/userinfo')
+
+        return asyncio.run(main())
+
+    def test_http_error_is_retried_and_recorded(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            # TransportError以外のHTTPError
+            raise httpx.DecodingError('invalid body', request=request)
+
+        with self.assertLogs('apps.authentication.providers', 'WARNING'):
+            with self.assertRaises(ProviderUnavailable):
+                self.request(breaker, handler)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_unexpected_error_in_half_open_probe_reopens_circuit(self):
+        breaker = _half_open_breaker()
+
+        def handler(request):
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            self.request(breaker, handler)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_cancelled_probe_reopens_circuit(self):
+        breaker = _half_open_breaker()
+
+        async def main():
+            started = asyncio.Event()
+
+            async def handler(request):
+                started.set()
+                await asyncio.sleep(10)
+
+            client = AsyncProviderClient('google', 'https://provider.test', breaker)
+            client.client = httpx.AsyncClient(
+                base_url='https://provider.test', transport=httpx.MockTransport(handler)
+            )
+            async with client.client:
+                task = asyncio.create_task(client.get('/userinfo'))
+                await started.wait()
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(main())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
@@ -0,0 +1,93 @@
+"""
+シングルフライトキャッシュのテスト
+"""
+import asyncio
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from apps.authentication.singleflight import VerificationCache
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    """aget_or_computeの相乗りとキャンセル"""
+
+    def setUp(self):
+        cache.clear()
+        self.verification_cache = VerificationCache(ttl=30, lock_timeout=1, poll_interval=0.01)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_followers_share_leader_result(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'user_id': 1}
+
+        async def main():
+            return await asyncio.gather(*[
+                self.verification_cache.aget_or_compute('google', 'token', compute)
+                for _ in range(5)
+            ])
+
+        results = asyncio.run(main())
+        self.assertEqual(results, [{'user_id': 1}] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_followers_recompute_when_leader_is_cancelled(self):
+        calls = []
+
+        async def main():
+            leader_started = asyncio.Event()
+
+            async def compute():
+                calls.append(1)
+                if len(calls) == 1:
+                    leader_started.set()
+                    await asyncio.sleep(10)
+                return {'user_id': 2}
+
+            leader = asyncio.create_task(
+                self.verification_cache.aget_or_compute('google', 'token', compute)
+            )
+            await leader_started.wait()
+            follower = asyncio.create_task(
+                self.verification_cache.aget_or_compute('google', 'token', compute)
+            )
+            await asyncio.sleep(0)
+            leader.cancel()
+            # 実行者のキャンセル後も待機者が待ち続けないこと
+            result = await asyncio.wait_for(follower, timeout=1)
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return result
+
+        self.assertEqual(asyncio.run(main()), {'user_id': 2})
+        self.assertEqual(len(calls), 2)
+
+    def test_cancelled_follower_does_not_cancel_leader(self):
+        async def main():
+            leader_started = asyncio.Event()
+
+            async def compute():
+                leader_started.set()
+                await asyncio.sleep(0.05)
+                return {'user_id': 3}
+
+            leader = asyncio.create_task(
+                self.verification_cache.aget_or_compute('google', 'token', compute)
+            )
+            await leader_started.wait()
+            follower = asyncio.create_task(
+                self.verification_cache.aget_or_compute('google', 'token', compute)
+            )
+            await asyncio.sleep(0)
+            follower.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await follower
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), {'user_id': 3})
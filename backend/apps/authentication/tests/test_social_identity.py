@@ -0,0 +1,110 @@
+"""
+ソーシャルアカウント連携（SocialIdentity）のテスト
+"""
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.authentication.models import SocialIdentity
+from apps.users.models import EmailOutbox, User
+
+
+class SocialIdentityTests(TestCase):
+    """連携の検索・作成"""
+
+    def get_or_create(self, provider='google', subject='g-1', email='social@example.com'):
+        return SocialIdentity.objects.get_or_create_user(
+            provider, subject, email, defaults={'display_name': 'Social'}
+        )
+
+    def test_first_login_creates_user_and_identity(self):
+        user, created = self.get_or_create()
+
+        self.assertTrue(created)
+        self.assertEqual(user.email, 'social@example.com')
+        self.assertEqual(user.display_name, 'Social')
+        self.assertTrue(
+            SocialIdentity.objects.filter(provider='google', subject='g-1', user=user).exists()
+        )
+        self.assertEqual(EmailOutbox.objects.get().to_email, 'social@example.com')
+
+    def test_linked_login_is_single_lookup(self):
+        first, _ = self.get_or_create()
+
+        with self.assertNumQueries(1):
+            user, created = self.get_or_create(email='changed@example.com')
+
+        self.assertFalse(created)
+        self.assertEqual(user, first)
+
+    def test_links_existing_user_with_same_email(self):
+        existing = User.objects.create_user('social@example.com', 'password')
+
+        user, created = self.get_or_create()
+
+        self.assertFalse(created)
+        self.assertEqual(user, existing)
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_same_subject_of_other_provider_is_separate(self):
+        google, _ = self.get_or_create(provider='google', subject='1')
+        discord, created = self.get_or_create(
+            provider='discord', subject='1', email='discord@example.com'
+        )
+
+        self.assertTrue(created)
+        self.assertNotEqual(google, discord)
+
+    def test_twitter_does_not_send_welcome_email(self):
+        self.get_or_create(provider='twitter', subject='t-1', email='t-1@twitter.temp')
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_concurrent_first_login_uses_existing_identity(self):
+        winner = User.objects.create_user('winner@example.com', 'password')
+        # 検索後・作成前に別のリクエストが連携を作成した状態
+        SocialIdentity.objects.create(provider='google', subject='g-1', user=winner)
+
+        user, created = SocialIdentity.objects._create_user_identity(
+            'google', 'g-1', 'social@example.com', {}
+        )
+
+        self.assertFalse(created)
+        self.assertEqual(user, winner)
+        self.assertEqual(SocialIdentity.objects.count(), 1)
+
+    def test_async_lookup(self):
+        first, _ = self.get_or_create()
+
+        user, created = async_to_sync(SocialIdentity.objects.aget_or_create_user)(
+            'google', 'g-1', 'social@example.com'
+        )
+
+        self.assertFalse(created)
+        self.assertEqual(user, first)
+
+
+class BackfillSocialIdentitiesTests(TestCase):
+    """backfill_social_identitiesコマンド"""
+
+    def backfill(self):
+        call_command('backfill_social_identities', batch_size=2, stdout=StringIO())
+
+    def test_creates_identities_from_google_id(self):
+        users = [
+            User.objects.create_user(f'google{i}@example.com', 'password', google_id=f'g-{i}')
+            for i in range(3)
+        ]
+        User.objects.create_user('blank@example.com', 'password', google_id='')
+        User.objects.create_user('none@example.com', 'password')
+
+        self.backfill()
+        # 再実行しても重複しない
+        self.backfill()
+
+        self.assertEqual(
+            set(SocialIdentity.objects.values_list('provider', 'subject', 'user_id')),
+            {('google', f'g-{i}', user.pk) for i, user in enumerate(users)},
+        )
@@ -0,0 +1,86 @@
+"""
+レート制限のテスト
+"""
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from apps.authentication.throttling import LoginIPThrottle, SlidingWindowLimiter
+
+
+def _rest_framework(**options):
+    return {**settings.REST_FRAMEWORK, **options}
+
+
+class IPThrottleTests(SimpleTestCase):
+    """IPアドレスの判定"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def tearDown(self):
+        cache.clear()
+
+    def make_request(self, forwarded_for):
+        return self.factory.post(
+            '/api/auth/login/',
+            REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR=forwarded_for,
+        )
+
+    @override_settings(REST_FRAMEWORK=_rest_framework(NUM_PROXIES=0))
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        throttle = LoginIPThrottle()
+        key = throttle.get_cache_key(self.make_request('203.0.113.9'), None)
+        self.assertEqual(key, 'login_ip:10.0.0.1')
+
+    @override_settings(REST_FRAMEWORK=_rest_framework(NUM_PROXIES=1))
+    def test_only_proxy_appended_address_is_trusted(self):
+        throttle = LoginIPThrottle()
+        # 左側はクライアントが送った値、右端が前段のプロキシが付加した値
+        key = throttle.get_cache_key(self.make_request('203.0.113.9, 198.51.100.7'), None)
+        self.assertEqual(key, 'login_ip:198.51.100.7')
+
+    @override_settings(REST_FRAMEWORK=_rest_framework(NUM_PROXIES=0))
+    @mock.patch.object(LoginIPThrottle, 'THROTTLE_RATES', {'login_ip': '2/min'})
+    def test_spoofed_forwarded_for_does_not_reset_limit(self):
+        results = []
+        for index in range(3):
+            request = self.make_request(f'203.0.113.{index}')
+            results.append(LoginIPThrottle().allow_request(request, None))
+        self.assertEqual(results, [True, True, False])
+
+
+class SlidingWindowLimiterTests(SimpleTestCase):
+    """共有キャッシュの種類ごとのカウント"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_counts_with_cache_api_without_redis(self):
+        limiter = SlidingWindowLimiter()
+        results = [limiter.hit('locmem', 2, 3600)[0] for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+
+    def test_counts_with_redis_pipeline(self):
+        client = mock.Mock()
+        pipe = client.pipeline.return_value
+        pipe.execute.return_value = [3, True, None]
+
+        with mock.patch('apps.authentication.throttling.get_redis_client', return_value=client), \
+                mock.patch('apps.authentication.throttling.time.time', return_value=7200.0):
+            allowed, wait = SlidingWindowLimiter().hit('redis', 2, 3600)
+
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 3600)
+        pipe.incr.assert_called_once_with(cache.make_key('throttle:redis:2'))
+        pipe.get.assert_called_once_with(cache.make_key('throttle:redis:1'))
+        # キャッシュAPIでは数えない
+        self.assertIsNone(cache.get('throttle:redis:2'))
@@ -0,0 +1,138 @@
+"""
+ログイン・登録・ソーシャル認証のレート制限
+
+スライディングウィンドウ（直前と現在の固定ウィンドウの件数を経過時間で重み付け）で判定する。
+共有キャッシュがRedisの場合は INCR・EXPIRE・GET を1回のパイプラインで実行し、
+1回の往復で不可分にカウントと判定を行う。それ以外のキャッシュではadd/incr/getで代替する。
+スロットルはビューの処理前（DRFのinitial）に判定されるため、拒否したリクエストでは
+パスワードのハッシュ計算やプロバイダーへの問い合わせは行われない。
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from apps.database.redis_client import get_redis_client
+from apps.monitoring.metrics import auth_throttled_total
+
+
+class SlidingWindowLimiter:
+    """スライディングウィンドウのカウンター"""
+    prefix = 'throttle'
+
+    def hit(self, key, limit, window):
+        """1回分を加算し、(許可するか, 許可されるまでの秒数) を返す"""
+        now = time.time()
+        index, offset = divmod(now, window)
+        index = int(index)
+        current_key = f'{self.prefix}:{key}:{index}'
+        previous_key = f'{self.prefix}:{key}:{index - 1}'
+
+        client = get_redis_client()
+        if client is not None:
+            pipe = client.pipeline(transaction=True)
+            pipe.incr(cache.make_key(current_key))
+            pipe.expire(cache.make_key(current_key), int(window * 2))
+            pipe.get(cache.make_key(previous_key))
+            current, _, previous = pipe.execute()
+        else:
+            cache.add(current_key, 0, int(window * 2))
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                # add後に期限切れになった
+                cache.set(current_key, 1, int(window * 2))
+                current = 1
+            previous = cache.get(previous_key)
+
+        # 直前のウィンドウの件数は、現在のウィンドウの経過に応じて減らす
+        estimated = int(previous or 0) * (1 - offset / window) + int(current)
+        if estimated <= limit:
+            return True, 0
+        return False, window - offset
+
+
+limiter = SlidingWindowLimiter()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """スライディングウィンドウで判定するスロットル（レートはDEFAULT_THROTTLE_RATESのscope）"""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        allowed, self.wait_seconds = limiter.hit(key, self.num_requests, self.duration)
+        if not allowed:
+            auth_throttled_total.inc(scope=self.scope)
+        return allowed
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+def _digest(value):
+    # 個人情報をキーに含めず、長さも一定にする
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+class IPThrottle(SlidingWindowThrottle):
+    """IPアドレスごとの制限
+
+    IPアドレスはREST_FRAMEWORKのNUM_PROXIES（前段のプロキシの数）に従って決まるため、
+    クライアントが偽装したX-Forwarded-Forでは制限を回避できない。
+    """
+
+    def get_cache_key(self, request, view):
+        return f'{self.scope}:{self.get_ident(request)}'
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class SocialIPThrottle(IPThrottle):
+    scope = 'social_ip'
+
+
+class LoginEmailThrottle(SlidingWindowThrottle):
+    """メールアドレスごとの制限（複数のIPからの同一アカウントへの試行を防ぐ）"""
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email or not isinstance(email, str):
+            return None
+        return f'{self.scope}:{_digest(email.strip().lower())}'
+
+
+class SocialProviderThrottle(SlidingWindowThrottle):
+    """プロバイダーごとの全体の制限（プロバイダーへの問い合わせ数を抑える）"""
+    scope = 'social_provider'
+
+    def get_cache_key(self, request, view):
+        provider = getattr(view, 'provider', '')
+        if not provider:
+            return None
+        return f'{self.scope}:{provider}'
+
+
+def check_throttles(request, view, throttle_classes):
+    """DRF以外のビュー用。許可されない場合は待ち秒数、許可される場合はNoneを返す"""
+    waits = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait() or 0)
+    if waits:
+        return max(waits)
+    return None
@@ -2,10 +2,9 @@
 認証関連のURL設定
 """
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
-
 from .views import (
     CustomTokenObtainPairView,
+    CustomTokenRefreshView,
     RegisterView,
     GoogleAuthView,
     TwitterAuthView,
@@ -13,13 +12,18 @@ from .views import (
     LogoutView,
     VerifyTokenView,
 )
+from .async_views import (
+    AsyncGoogleAuthView,
+    AsyncTwitterAuthView,
+    AsyncDiscordAuthView,
+)
 
 app_name = 'authentication'
 
 urlpatterns = [
     # JWT認証
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('register/', RegisterView.as_view(), name='register'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('verify/', VerifyTokenView.as_view(), name='verify'),
@@ -28,5 +32,10 @@ urlpatterns = [
     path('google/', GoogleAuthView.as_view(), name='google_auth'),
     path('twitter/', TwitterAuthView.as_view(), name='twitter_auth'),
     path('discord/', DiscordAuthView.as_view(), name='discord_auth'),
+    
+    # ソーシャル認証（非同期、ASGIサーバー用）
+    path('async/google/', AsyncGoogleAuthView.as_view(), name='async_google_auth'),
+    path('async/twitter/', AsyncTwitterAuthView.as_view(), name='async_twitter_auth'),
+    path('async/discord/', AsyncDiscordAuthView.as_view(), name='async_discord_auth'),
 ]
 
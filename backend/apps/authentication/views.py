@@ -5,15 +5,33 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import get_user_model
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from django.conf import settings
+from django.db import transaction
 
+from apps.monitoring.metrics import auth_login_total, auth_token_refresh_total
+from apps.users.activity import activity_recorder
+from apps.users.outbox import enqueue_welcome_email
+
+from .authentication import StatelessJWTAuthentication
+from .blacklist import token_blacklist
+from .google_keys import google_cert_store
+from .models import SocialIdentity
+from .providers import ProviderUnavailable, SocialAuthError, get_provider_client
+from .singleflight import get_result_user, verification_cache
+from .throttling import (
+    LoginEmailThrottle,
+    LoginIPThrottle,
+    RegisterIPThrottle,
+    SocialIPThrottle,
+    SocialProviderThrottle,
+)
 from .serializers import (
     CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
     RegisterSerializer,
     GoogleAuthSerializer,
     SocialAuthSerializer,
@@ -25,31 +43,55 @@ User = get_user_model()
 class CustomTokenObtainPairView(TokenObtainPairView):
     """カスタムトークン取得ビュー"""
     serializer_class = CustomTokenObtainPairSerializer
+    # パスワードのハッシュ計算の前に判定される
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
     
     def post(self, request, *args, **kwargs):
-        """ログインレスポンスをカスタマイズ"""
-        response = super().post(request, *args, **kwargs)
+        """ログインレスポンスをカスタマイズ
+
+        認証（パスワードハッシュ計算）は1回だけ行い、その結果から
+        トークンとユーザー情報を組み立てる。
+        """
+        serializer = self.get_serializer(data=request.data)
         
-        if response.status_code == 200:
-            # ユーザー情報を追加
-            serializer = self.get_serializer(data=request.data)
+        try:
             serializer.is_valid(raise_exception=True)
-            user = serializer.user
-            
-            # レスポンスを再構築
-            tokens = response.data
-            return Response({
-                'user': {
-                    'id': user.id,
-                    'email': user.email,
-                    'display_name': user.get_display_name(),
-                },
-                'tokens': {
-                    'access': tokens.get('access'),
-                    'refresh': tokens.get('refresh'),
-                }
-            }, status=status.HTTP_200_OK)
+        except TokenError as e:
+            auth_login_total.inc(provider='password', result='failure')
+            raise InvalidToken(e.args[0])
+        except Exception:
+            auth_login_total.inc(provider='password', result='failure')
+            raise
         
+        auth_login_total.inc(provider='password', result='success')
+        user = serializer.user
+        activity_recorder.record_login(user.pk)
+        tokens = serializer.validated_data
+        
+        return Response({
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'display_name': user.get_display_name(),
+            },
+            'tokens': {
+                'access': tokens.get('access'),
+                'refresh': tokens.get('refresh'),
+            }
+        }, status=status.HTTP_200_OK)
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    """トークン更新ビュー"""
+    serializer_class = CustomTokenRefreshSerializer
+    
+    def post(self, request, *args, **kwargs):
+        try:
+            response = super().post(request, *args, **kwargs)
+        except Exception:
+            auth_token_refresh_total.inc(result='failure')
+            raise
+        auth_token_refresh_total.inc(result='success')
         return response
 
 
@@ -58,14 +100,19 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = RegisterSerializer
+    throttle_classes = (RegisterIPThrottle,)
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        
+        # ユーザー作成とウェルカムメールの登録を同じトランザクションで行う
+        with transaction.atomic():
+            user = serializer.save()
+            enqueue_welcome_email(user.email, user.get_display_name())
         
         # トークンを生成
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         
         return Response({
             'user': {
@@ -80,66 +127,119 @@ class RegisterView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
-class GoogleAuthView(APIView):
-    """Google OAuth認証ビュー"""
+class SocialAuthMixin:
+    """ソーシャル認証ビューの共通処理
+
+    同じアクセストークンの検証は短時間キャッシュし、同時に届いた同一トークンの
+    検証は1回にまとめる（singleflight.verification_cache）。
+    """
     permission_classes = (AllowAny,)
-    serializer_class = GoogleAuthSerializer
+    serializer_class = SocialAuthSerializer
+    # プロバイダーへの問い合わせの前に判定される
+    throttle_classes = (SocialIPThrottle, SocialProviderThrottle)
+    provider = ''
+    provider_label = ''
+    # 想定外のエラーを400で返す場合のメッセージ接頭辞
+    unexpected_error_prefix = None
     
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
+        access_token = serializer.validated_data['access_token']
+        
+        resolved = {}
+        
+        def authenticate():
+            user, created = self.authenticate(access_token)
+            resolved['user'] = user
+            return {'user_id': user.pk, 'created': created}
         
         try:
-            # Googleトークンを検証
-            idinfo = id_token.verify_oauth2_token(
-                serializer.validated_data['access_token'],
-                requests.Request(),
-                settings.SOCIALACCOUNT_PROVIDERS['google']['APP']['client_id']
+            result = verification_cache.get_or_compute(
+                self.provider, access_token, authenticate
             )
+            # 他のリクエストの検証結果を共有した場合は主キーで取得
+            user = resolved.get('user') or get_result_user(result)
             
-            # ユーザー情報を取得
-            email = idinfo.get('email')
-            google_id = idinfo.get('sub')
-            first_name = idinfo.get('given_name', '')
-            last_name = idinfo.get('family_name', '')
-            
-            # ユーザーを取得または作成
-            user, created = User.objects.get_or_create(
-                email=email,
-                defaults={
-                    'google_id': google_id,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'is_active': True,
-                }
+        except ProviderUnavailable:
+            auth_login_total.inc(provider=self.provider, result='unavailable')
+            return Response(
+                {'error': f'{self.provider_label}に接続できません。しばらくしてから再度お試しください。'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
-            
-            # google_idが設定されていない場合は更新
-            if not user.google_id:
-                user.google_id = google_id
-                user.save()
-            
-            # トークンを生成
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'user': {
-                    'id': user.id,
-                    'email': user.email,
-                    'display_name': user.get_display_name(),
-                },
-                'tokens': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                },
-                'is_new_user': created,
-            }, status=status.HTTP_200_OK)
-            
-        except ValueError as e:
+        except SocialAuthError as e:
+            auth_login_total.inc(provider=self.provider, result='failure')
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            auth_login_total.inc(provider=self.provider, result='error')
+            if self.unexpected_error_prefix is None:
+                raise
             return Response(
-                {'error': 'トークンが無効です。'},
+                {'error': f'{self.unexpected_error_prefix}: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        auth_login_total.inc(provider=self.provider, result='success')
+        activity_recorder.record_login(user.pk)
+        
+        # トークンを生成
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
+        
+        return Response({
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'display_name': user.get_display_name(),
+            },
+            'tokens': {
+                'refresh': str(refresh),
+                'access': str(refresh.access_token),
+            },
+            'is_new_user': result['created'],
+        }, status=status.HTTP_200_OK)
+    
+    def authenticate(self, access_token):
+        """アクセストークンからユーザーを取得または作成して (user, created) を返す"""
+        raise NotImplementedError
+
+
+class GoogleAuthView(SocialAuthMixin, APIView):
+    """Google OAuth認証ビュー"""
+    serializer_class = GoogleAuthSerializer
+    provider = 'google'
+    provider_label = 'Google'
+    
+    def authenticate(self, access_token):
+        try:
+            # Googleトークンを検証（署名鍵はキャッシュ済みのものを使用）
+            idinfo = google_cert_store.verify(
+                access_token,
+                settings.SOCIALACCOUNT_PROVIDERS['google']['APP']['client_id']
+            )
+        except ValueError:
+            raise SocialAuthError('トークンが無効です。')
+        
+        # ユーザー情報を取得
+        email = idinfo.get('email')
+        google_id = idinfo.get('sub')
+        first_name = idinfo.get('given_name', '')
+        last_name = idinfo.get('family_name', '')
+        
+        # 連携済みユーザーを取得、初回は作成
+        return SocialIdentity.objects.get_or_create_user(
+            SocialIdentity.PROVIDER_GOOGLE,
+            google_id,
+            email,
+            defaults={
+                'google_id': google_id,
+                'first_name': first_name,
+                'last_name': last_name,
+                'is_active': True,
+            }
+        )
 
 
 class LogoutView(APIView):
@@ -150,7 +250,7 @@ class LogoutView(APIView):
         try:
             refresh_token = request.data.get("refresh_token")
             token = RefreshToken(refresh_token)
-            token.blacklist()
+            token_blacklist.blacklist(token)
             
             return Response(
                 {"message": "ログアウトしました。"},
@@ -165,6 +265,8 @@ class LogoutView(APIView):
 
 class VerifyTokenView(APIView):
     """トークン検証ビュー"""
+    # トークンのクレームのみで応答できるため、ユーザーのDB取得を行わない
+    authentication_classes = (StatelessJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
     
     def get(self, request):
@@ -179,156 +281,90 @@ class VerifyTokenView(APIView):
         })
 
 
-class TwitterAuthView(APIView):
+class TwitterAuthView(SocialAuthMixin, APIView):
     """Twitter OAuth2認証ビュー"""
-    permission_classes = (AllowAny,)
-    serializer_class = SocialAuthSerializer
+    provider = 'twitter'
+    provider_label = 'Twitter'
+    unexpected_error_prefix = 'Twitter認証エラー'
     
-    def post(self, request):
-        serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+    def authenticate(self, access_token):
+        # Twitter API v2からユーザー情報を取得
+        headers = {
+            'Authorization': f'Bearer {access_token}'
+        }
         
-        try:
-            import requests as http_requests
-            
-            access_token = serializer.validated_data['access_token']
-            
-            # Twitter API v2からユーザー情報を取得
-            headers = {
-                'Authorization': f'Bearer {access_token}'
+        response = get_provider_client('twitter').get(
+            '/2/users/me',
+            params={'user.fields': 'profile_image_url'},
+            headers=headers
+        )
+        
+        if response.status_code != 200:
+            raise SocialAuthError('Twitter認証に失敗しました。')
+        
+        twitter_user = response.json().get('data', {})
+        
+        # ユーザー情報を取得
+        twitter_id = twitter_user.get('id')
+        username = twitter_user.get('username')
+        name = twitter_user.get('name')
+        
+        if not twitter_id:
+            raise SocialAuthError('Twitterユーザー情報が取得できませんでした。')
+        
+        # Twitterはメールアドレスを提供しないことがあるため、
+        # twitter_idをベースにメールアドレスを生成
+        email = f'{twitter_id}@twitter.temp'
+        
+        # 連携済みユーザーを取得、初回は作成
+        return SocialIdentity.objects.get_or_create_user(
+            SocialIdentity.PROVIDER_TWITTER,
+            twitter_id,
+            email,
+            defaults={
+                'display_name': name or username,
+                'is_active': True,
             }
-            
-            response = http_requests.get(
-                'https://api.twitter.com/2/users/me?user.fields=profile_image_url',
-                headers=headers
-            )
-            
-            if response.status_code != 200:
-                return Response(
-                    {'error': 'Twitter認証に失敗しました。'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            twitter_user = response.json().get('data', {})
-            
-            # ユーザー情報を取得
-            twitter_id = twitter_user.get('id')
-            username = twitter_user.get('username')
-            name = twitter_user.get('name')
-            
-            if not twitter_id:
-                return Response(
-                    {'error': 'Twitterユーザー情報が取得できませんでした。'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Twitterはメールアドレスを提供しないことがあるため、
-            # twitter_idをベースにメールアドレスを生成
-            email = f'{twitter_id}@twitter.temp'
-            
-            # ユーザーを取得または作成
-            user, created = User.objects.get_or_create(
-                email=email,
-                defaults={
-                    'display_name': name or username,
-                    'is_active': True,
-                }
-            )
-            
-            # トークンを生成
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'user': {
-                    'id': user.id,
-                    'email': user.email,
-                    'display_name': user.get_display_name(),
-                },
-                'tokens': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                },
-                'is_new_user': created,
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            return Response(
-                {'error': f'Twitter認証エラー: {str(e)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        )
 
 
-class DiscordAuthView(APIView):
+class DiscordAuthView(SocialAuthMixin, APIView):
     """Discord OAuth認証ビュー"""
-    permission_classes = (AllowAny,)
-    serializer_class = SocialAuthSerializer
+    provider = 'discord'
+    provider_label = 'Discord'
+    unexpected_error_prefix = 'Discord認証エラー'
     
-    def post(self, request):
-        serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+    def authenticate(self, access_token):
+        # Discord APIからユーザー情報を取得
+        headers = {
+            'Authorization': f'Bearer {access_token}'
+        }
         
-        try:
-            import requests as http_requests
-            
-            access_token = serializer.validated_data['access_token']
-            
-            # Discord APIからユーザー情報を取得
-            headers = {
-                'Authorization': f'Bearer {access_token}'
+        response = get_provider_client('discord').get(
+            '/api/users/@me',
+            headers=headers
+        )
+        
+        if response.status_code != 200:
+            raise SocialAuthError('Discord認証に失敗しました。')
+        
+        discord_user = response.json()
+        
+        # ユーザー情報を取得
+        discord_id = discord_user.get('id')
+        email = discord_user.get('email')
+        username = discord_user.get('username')
+        
+        if not discord_id or not email:
+            raise SocialAuthError('メールアドレスが取得できませんでした。')
+        
+        # 連携済みユーザーを取得、初回は作成
+        return SocialIdentity.objects.get_or_create_user(
+            SocialIdentity.PROVIDER_DISCORD,
+            discord_id,
+            email,
+            defaults={
+                'display_name': username,
+                'is_active': True,
             }
-            
-            response = http_requests.get(
-                'https://discord.com/api/users/@me',
-                headers=headers
-            )
-            
-            if response.status_code != 200:
-                return Response(
-                    {'error': 'Discord認証に失敗しました。'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            discord_user = response.json()
-            
-            # ユーザー情報を取得
-            discord_id = discord_user.get('id')
-            email = discord_user.get('email')
-            username = discord_user.get('username')
-            
-            if not email:
-                return Response(
-                    {'error': 'メールアドレスが取得できませんでした。'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # ユーザーを取得または作成
-            user, created = User.objects.get_or_create(
-                email=email,
-                defaults={
-                    'display_name': username,
-                    'is_active': True,
-                }
-            )
-            
-            # トークンを生成
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'user': {
-                    'id': user.id,
-                    'email': user.email,
-                    'display_name': user.get_display_name(),
-                },
-                'tokens': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                },
-                'is_new_user': created,
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            return Response(
-                {'error': f'Discord認証エラー: {str(e)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
+        )
@@ -0,0 +1,61 @@
+"""
+接続プール対応のMySQLバックエンド
+
+DATABASESに'POOL'（MAX_SIZEなど）を指定した場合、物理接続をプロセス内のプールで共有し、
+Djangoが接続を閉じるときはプールに返却する。
+init_commandやセッション変数の設定は物理接続ごとに1回だけ行う。
+'POOL'を指定しない場合は標準のバックエンドと同じ（CONN_MAX_AGEによる持続接続）。
+"""
+from django.db.backends.mysql import base
+
+from apps.database.pool import get_pool
+
+# サーバーステータスの「トランザクション中」フラグ（SERVER_STATUS_IN_TRANS）
+SERVER_STATUS_IN_TRANS = 1
+
+
+def _ping(connection):
+    connection.ping(False)
+
+
+def _reset(connection):
+    """返却前にコミットされていないトランザクションを破棄"""
+    if getattr(connection, 'server_status', SERVER_STATUS_IN_TRANS) & SERVER_STATUS_IN_TRANS:
+        connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        return get_pool(self.alias, options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            return pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params), _ping)
+        except Exception as e:
+            if isinstance(e, self.Database.Error):
+                raise
+            # PoolTimeoutもDjangoのOperationalErrorとして扱われるようにする
+            raise self.Database.OperationalError(str(e)) from e
+
+    def init_connection_state(self):
+        # プールから再利用した接続はセッションの設定が済んでいる
+        if getattr(self.connection, '_pool_initialized', False):
+            return
+        super().init_connection_state()
+        if self.pool is not None:
+            self.connection._pool_initialized = True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # エラーが発生した接続は再利用しない
+        pool.release(self.connection, _reset, discard=self.errors_occurred)
@@ -0,0 +1,70 @@
+"""
+読み取りレプリカ用のミドルウェア
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from . import router
+
+
+class ReplicaPinningMiddleware:
+    """書き込みを行ったユーザーの後続リクエストを、一定時間プライマリから読み取る
+
+    書き込みを行ったリクエストの終了時に、ユーザーごとの書き込み時刻を共有キャッシュに記録する。
+    同じユーザーのリクエストはREPLICA_PIN_SECONDSの間プライマリに固定され、
+    レプリケーション遅延中でも自分の書き込みが見える（ブラウザ・ワーカーを問わない）。
+    ユーザーはJWT（Authorizationヘッダー）またはセッションから判定するため、
+    AuthenticationMiddlewareより後に配置する。
+    レプリカを使用しない場合は読み込まない。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', ()):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.jwt_authentication = JWTAuthentication()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = router.begin_request(self.get_user_id(request))
+        try:
+            return self.get_response(request)
+        finally:
+            router.end_request(token)
+
+    async def __acall__(self, request):
+        token = router.begin_request(self.get_user_id(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            router.end_request(token)
+
+    def get_user_id(self, request):
+        """リクエストのユーザーID（未認証の場合はNone）
+
+        ここでは判定のみ行い、認証そのものはビューの認証クラスで行う。
+        """
+        header = self.jwt_authentication.get_header(request)
+        if header is not None:
+            raw_token = self.jwt_authentication.get_raw_token(header)
+            if raw_token is not None:
+                try:
+                    validated_token = self.jwt_authentication.get_validated_token(raw_token)
+                except (InvalidToken, TokenError):
+                    return None
+                return validated_token.get(api_settings.USER_ID_CLAIM)
+
+        session = getattr(request, 'session', None)
+        if session is not None and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return session.get(SESSION_KEY)
+        return None
@@ -0,0 +1,216 @@
+"""
+DB接続プール
+
+スレッド間で共有する上限付きのプール。接続の取得時に一定時間以上使われていなかった
+接続はpingで生存確認し、最大寿命を過ぎた接続は破棄して作り直す。
+ping・接続・切断はロックの外で行い、DBとの往復の間も他のスレッドは取得・返却できる。
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.dispatch import Signal
+
+# プールが物理接続を確立した（引数はalias）。
+# Djangoのconnection_createdはプールから再利用した場合にも送られるため、接続数の計測にはこちらを使う
+pool_connection_created = Signal()
+
+
+class PoolTimeout(Exception):
+    """上限に達したプールから時間内に接続を取得できなかった"""
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'released_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class ConnectionPool:
+    """上限付きの接続プール"""
+
+    def __init__(self, max_size=10, timeout=10, max_lifetime=3600, ping_interval=10, alias=None):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._condition = threading.Condition()
+        self._idle = deque()
+        # 取得中の接続（id(connection) -> _PooledConnection）
+        self._in_use = {}
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use)
+
+    def acquire(self, connect, ping):
+        """接続を取得（空きがなければ作成、上限に達していれば返却を待つ）"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pooled, placeholder = self._reserve(deadline)
+            if pooled is None:
+                return self._connect(connect, placeholder)
+
+            # pingはDBとの往復を伴うため、ロックを外して行う（他のスレッドの取得・返却を待たせない）
+            if self._is_reusable(pooled, ping):
+                with self._condition:
+                    self._stats['reused'] += 1
+                return pooled.connection
+
+            with self._condition:
+                del self._in_use[id(pooled.connection)]
+                self._stats['discarded'] += 1
+                self._condition.notify()
+            self._close(pooled.connection)
+
+    def _reserve(self, deadline):
+        """アイドル接続を1つ取得中にする
+
+        (接続, None) を返す。アイドル接続がなく上限に達していない場合は、
+        新しい接続の枠を確保して (None, 枠) を返す。
+        """
+        with self._condition:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use[id(pooled.connection)] = pooled
+                    return pooled, None
+
+                if self.size < self.max_size:
+                    # 接続中は他のスレッドが取得・返却できるよう、枠だけ確保してロックを外す
+                    placeholder = object()
+                    self._in_use[id(placeholder)] = placeholder
+                    return None, placeholder
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'{self.timeout}秒以内にDB接続を取得できませんでした（上限 {self.max_size}）'
+                    )
+                self._stats['waits'] += 1
+                self._condition.wait(remaining)
+
+    def _connect(self, connect, placeholder):
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                del self._in_use[id(placeholder)]
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            del self._in_use[id(placeholder)]
+            self._in_use[id(connection)] = _PooledConnection(connection)
+            self._stats['created'] += 1
+        pool_connection_created.send(sender=self.__class__, alias=self.alias)
+        return connection
+
+    def release(self, connection, reset, discard=False):
+        """接続を返却（resetに失敗した接続・寿命を過ぎた接続は破棄する）"""
+        with self._condition:
+            pooled = self._in_use.pop(id(connection), None)
+
+        if pooled is not None and not discard:
+            try:
+                reset(connection)
+            except Exception:
+                discard = True
+
+        with self._condition:
+            discard = pooled is None or discard or \
+                time.monotonic() - pooled.created_at >= self.max_lifetime
+            if discard:
+                self._stats['discarded'] += 1
+            else:
+                pooled.released_at = time.monotonic()
+                self._idle.append(pooled)
+            self._condition.notify()
+        if discard:
+            self._close(connection)
+
+    def _is_reusable(self, pooled, ping):
+        now = time.monotonic()
+        if now - pooled.created_at >= self.max_lifetime:
+            return False
+        if now - pooled.released_at >= self.ping_interval:
+            try:
+                ping(pooled.connection)
+            except Exception:
+                return False
+        return True
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._condition:
+            idle = [pooled.connection for pooled in self._idle]
+            self._idle.clear()
+            self._stats['discarded'] += len(idle)
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                **self._stats,
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'max_size': self.max_size,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """エイリアスごとのプールを取得（プロセス内で共有）"""
+    pool = _pools.get(alias)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+                ping_interval=options.get('PING_INTERVAL', 10),
+                alias=alias,
+            )
+        return _pools[alias]
+
+
+def get_pool_stats():
+    """全プールの統計（エイリアス -> 統計）"""
+    return {alias: pool.stats() for alias, pool in list(_pools.items())}
+
+
+def _after_fork():
+    # 親プロセスの接続はソケットを共有しているため、子プロセスでは使用しない
+    global _pools, _pools_lock
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
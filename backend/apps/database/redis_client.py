@@ -0,0 +1,61 @@
+"""
+共有キャッシュ（Redis）のクライアント
+
+ハッシュ・パイプラインなど、DjangoのキャッシュAPIにない操作に使用する。
+クライアントはCACHESの設定（LOCATION・OPTIONS）から作成してプロセス内で共有し、
+読み書きとも先頭のサーバー（Djangoのキャッシュの書き込み先）に対して行う。
+共有キャッシュがRedisでない場合（開発環境・テストのプロセス内キャッシュなど）はNoneを返すため、
+呼び出し元はキャッシュAPIで代替する。
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+REDIS_CACHE_BACKEND = 'django.core.cache.backends.redis.RedisCache'
+
+_lock = threading.Lock()
+# キャッシュのエイリアス -> Redisクライアント（Redisでない場合はNone）
+_clients = {}
+
+
+def get_redis_client(alias=DEFAULT_CACHE_ALIAS):
+    """キャッシュのRedisクライアント（Redisでない場合はNone）"""
+    try:
+        return _clients[alias]
+    except KeyError:
+        pass
+
+    with _lock:
+        if alias not in _clients:
+            _clients[alias] = _create_client(settings.CACHES.get(alias, {}))
+        return _clients[alias]
+
+
+def _create_client(cache_settings):
+    if cache_settings.get('BACKEND') != REDIS_CACHE_BACKEND:
+        return None
+
+    import redis
+
+    location = cache_settings['LOCATION']
+    if isinstance(location, str):
+        location = location.split(',')
+    options = dict(cache_settings.get('OPTIONS', {}))
+    # 値のシリアライズはDjangoのキャッシュAPI用の設定のため使用しない
+    options.pop('serializer', None)
+    pool_class = import_string(options.pop('pool_class', 'redis.ConnectionPool'))
+    if isinstance(options.get('parser_class'), str):
+        options['parser_class'] = import_string(options['parser_class'])
+    pool = pool_class.from_url(location[0].strip(), **options)
+    return redis.Redis(connection_pool=pool)
+
+
+@receiver(setting_changed)
+def _reset_clients(setting, **kwargs):
+    if setting == 'CACHES':
+        with _lock:
+            _clients.clear()
@@ -0,0 +1,239 @@
+"""
+読み取りレプリカへのルーティング
+
+読み取りはDATABASE_REPLICASのいずれかに、書き込みはdefault（プライマリ）に振り分ける。
+次の場合は読み取りもプライマリで行う。
+- 同じリクエスト・Celeryタスク（pinning_scope）内で書き込みを行った後（自分の書き込みを読むため）
+- スコープ外（管理コマンドなど）でREPLICA_PIN_SECONDS以内に書き込みを行った後
+- 同じユーザーがREPLICA_PIN_SECONDS以内に書き込みを行っている場合
+  （ReplicaPinningMiddlewareが書き込みの時刻をユーザーごとに共有キャッシュへ記録する）
+- プライマリでトランザクション中の場合（select_for_updateなど）
+- 計測したレプリケーション遅延がREPLICA_MAX_LAGを超えている、または計測できない場合
+- 遅延が許容されないモデル（PRIMARY_ONLY_MODELS）の場合
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# 常にプライマリから読み取るモデル
+# （無効化済みトークンの判定が遅延により漏れないようにするなど）
+PRIMARY_ONLY_MODELS = frozenset({
+    'authentication.BlacklistedRefreshToken',
+    'users.EmailOutbox',
+})
+
+# スコープ外で書き込みを行った場合の固定の期限（time.monotonic()）
+# 期限を設けないとワーカーの存続中ずっとプライマリから読み続けることになる
+_pinned_until = contextvars.ContextVar('db_pinned_until', default=0.0)
+# リクエスト・タスクごとの状態（ReplicaPinningMiddleware・pinning_scopeが設定する）
+_request_state = contextvars.ContextVar('db_replica_request_state', default=None)
+
+
+class _RequestState:
+    """リクエスト中の書き込み・固定の状態
+
+    非同期ビューのORM呼び出し（別スレッド）での変更も反映されるよう、
+    コンテキスト変数には可変のオブジェクトを保持する。
+    """
+    __slots__ = ('user_id', 'wrote', 'pinned')
+
+    def __init__(self, user_id=None):
+        self.user_id = None
+        self.wrote = False
+        self.pinned = False
+        if user_id is not None:
+            self.set_user(user_id)
+
+    def set_user(self, user_id):
+        self.user_id = user_id
+        self.pinned = has_recent_write(user_id)
+
+
+def _last_write_key(user_id):
+    return f'db:last_write:{user_id}'
+
+
+def record_write(user_id):
+    """ユーザーが書き込みを行ったことを記録（REPLICA_PIN_SECONDSの間、読み取りをプライマリに固定）"""
+    pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    cache.set(_last_write_key(user_id), time.time(), pin_seconds)
+
+
+def has_recent_write(user_id):
+    return cache.get(_last_write_key(user_id)) is not None
+
+
+def begin_request(user_id=None):
+    """リクエスト・タスクの開始（end_requestに渡すトークンを返す）"""
+    return _request_state.set(_RequestState(user_id))
+
+
+def end_request(token):
+    """リクエスト・タスクの終了（書き込みを行った場合はユーザーの書き込み時刻を記録）"""
+    state = _request_state.get()
+    try:
+        if state is not None and state.wrote and state.user_id is not None:
+            record_write(state.user_id)
+    finally:
+        _request_state.reset(token)
+
+
+@contextmanager
+def pinning_scope(user_id=None):
+    """書き込み後のプライマリへの固定をブロック内に限定する
+
+    Celeryタスク（apps.database.signals）や管理コマンドの処理単位を囲んで使用する。
+    """
+    token = begin_request(user_id)
+    try:
+        yield
+    finally:
+        end_request(token)
+
+
+def in_scope():
+    return _request_state.get() is not None
+
+
+def set_request_user(user_id):
+    """リクエストのユーザーを設定（ログイン・登録でトークンを発行した場合など）"""
+    state = _request_state.get()
+    if state is not None and user_id is not None:
+        state.set_user(user_id)
+
+
+def pin_to_primary():
+    """以降の読み取りをプライマリで行う"""
+    state = _request_state.get()
+    if state is not None:
+        state.wrote = True
+    else:
+        pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        _pinned_until.set(time.monotonic() + pin_seconds)
+
+
+def is_pinned():
+    state = _request_state.get()
+    if state is not None:
+        return state.wrote or state.pinned
+    return time.monotonic() < _pinned_until.get()
+
+
+def reset_pin():
+    """スコープ外の固定を解除"""
+    return _pinned_until.set(0.0)
+
+
+class ReplicaLagMonitor:
+    """レプリカごとのレプリケーション遅延（秒）を一定間隔で計測する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # エイリアス -> (計測時刻, 遅延秒数またはNone)
+        self._measurements = {}
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+
+    @property
+    def max_lag(self):
+        return getattr(settings, 'REPLICA_MAX_LAG', 5)
+
+    def is_healthy(self, alias):
+        lag = self.get_lag(alias)
+        return lag is not None and lag <= self.max_lag
+
+    def get_lag(self, alias):
+        now = time.monotonic()
+        measurement = self._measurements.get(alias)
+        if measurement is not None and now - measurement[0] < self.check_interval:
+            return measurement[1]
+
+        with self._lock:
+            measurement = self._measurements.get(alias)
+            if measurement is not None and now - measurement[0] < self.check_interval:
+                return measurement[1]
+            lag = self.measure(alias)
+            self._measurements[alias] = (time.monotonic(), lag)
+            return lag
+
+    def measure(self, alias):
+        """遅延を計測（レプリケーションが停止している・計測に失敗した場合はNone）"""
+        connection = connections[alias]
+        if connection.vendor != 'mysql':
+            # SQLiteなどの代替環境では遅延なしとみなす
+            return 0
+
+        try:
+            with connection.cursor() as cursor:
+                try:
+                    cursor.execute('SHOW REPLICA STATUS')
+                except Exception:
+                    # MySQL 8.0.22より前
+                    cursor.execute('SHOW SLAVE STATUS')
+                row = cursor.fetchone()
+                if row is None:
+                    # レプリケーションが設定されていない（プライマリと同じデータとみなす）
+                    return 0
+                columns = [column[0] for column in cursor.description]
+        except Exception:
+            logger.exception('%s: レプリケーション遅延の計測に失敗しました', alias)
+            return None
+
+        status = dict(zip(columns, row))
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        if lag is None:
+            logger.warning('%s: レプリケーションが停止しています', alias)
+            return None
+        return int(lag)
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+class ReplicaRouter:
+    """読み取りをレプリカ、書き込みをプライマリに振り分けるルーター"""
+
+    @property
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', ())
+
+    def db_for_read(self, model, **hints):
+        replicas = self.replicas
+        if not replicas or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label in PRIMARY_ONLY_MODELS:
+            return DEFAULT_DB_ALIAS
+
+        healthy = [alias for alias in replicas if lag_monitor.is_healthy(alias)]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        # 書き込み後の読み取りは同じリクエスト内ではプライマリで行う
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはプライマリの複製のため、データベースをまたぐ関連も許可する
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # マイグレーションはプライマリのみ（レプリカにはレプリケーションで反映される）
+        if db in self.replicas:
+            return False
+        return None
@@ -0,0 +1,28 @@
+"""
+Celeryタスクごとのレプリカ固定のスコープ
+
+タスク内で書き込みを行うと以降の読み取りはプライマリで行うが、
+ワーカーは多数のタスクを処理するため、固定はタスクの終了時に解除する。
+config.celeryで読み込む。
+"""
+from celery.signals import task_postrun, task_prerun
+
+from . import router
+
+# タスクID -> router.begin_requestのトークン
+_task_tokens = {}
+
+
+@task_prerun.connect(dispatch_uid='database_task_prerun')
+def begin_task_scope(task_id=None, **kwargs):
+    # リクエスト中に同期実行されたタスク（CELERY_TASK_ALWAYS_EAGER）はリクエストの状態を使う
+    if router.in_scope():
+        return
+    _task_tokens[task_id] = router.begin_request()
+
+
+@task_postrun.connect(dispatch_uid='database_task_postrun')
+def end_task_scope(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        router.end_request(token)
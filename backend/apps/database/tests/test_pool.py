@@ -0,0 +1,260 @@
+"""
+DB接続プールのテスト
+
+SQLiteの接続をMySQLの代わりに使用し、pingの往復時間はsleepで再現する。
+"""
+import os
+import sqlite3
+import statistics
+import threading
+import time
+import unittest
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from apps.database.pool import ConnectionPool, PoolTimeout
+from apps.monitoring.metrics import db_connections_created_total
+from apps.monitoring.signals import record_connection_created
+
+
+def _connect():
+    return sqlite3.connect(':memory:', check_same_thread=False)
+
+
+def _reset(connection):
+    connection.rollback()
+
+
+def _slow_ping(delay):
+    def ping(connection):
+        time.sleep(delay)
+        connection.execute('SELECT 1')
+    return ping
+
+
+def _fill(pool, count):
+    connections = [pool.acquire(_connect, _slow_ping(0)) for _ in range(count)]
+    for connection in connections:
+        pool.release(connection, _reset)
+
+
+def _acquire_concurrently(pool, threads, ping):
+    """threads個のスレッドから同時に取得し、各スレッドの取得時間（秒）を返す"""
+    barrier = threading.Barrier(threads)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        started = time.perf_counter()
+        connection = pool.acquire(_connect, ping)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+        pool.release(connection, _reset)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """取得・返却・破棄"""
+
+    def test_reuses_released_connection(self):
+        pool = ConnectionPool(max_size=2, ping_interval=60)
+        connection = pool.acquire(_connect, _slow_ping(0))
+        pool.release(connection, _reset)
+        self.assertIs(pool.acquire(_connect, _slow_ping(0)), connection)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_failed_ping_discards_and_reconnects(self):
+        pool = ConnectionPool(max_size=1, ping_interval=0)
+        connection = pool.acquire(_connect, _slow_ping(0))
+        pool.release(connection, _reset)
+
+        def failing_ping(connection):
+            raise sqlite3.OperationalError('gone away')
+
+        replacement = pool.acquire(_connect, failing_ping)
+        self.assertIsNot(replacement, connection)
+        stats = pool.stats()
+        self.assertEqual(stats['discarded'], 1)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_timeout_when_exhausted(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.acquire(_connect, _slow_ping(0))
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(_connect, _slow_ping(0))
+
+    def test_ping_does_not_block_other_threads(self):
+        pool = ConnectionPool(max_size=8, ping_interval=0)
+        _fill(pool, 8)
+
+        latencies = _acquire_concurrently(pool, 8, _slow_ping(0.1))
+        # ロック内でpingしていた場合、最後のスレッドは8回分（0.8秒）待たされる
+        self.assertLess(max(latencies), 0.4)
+        self.assertEqual(pool.stats()['idle'], 8)
+
+
+
+class PoolConnectionMetricsTests(SimpleTestCase):
+    """db_connections_created_totalは物理接続のみ数える"""
+
+    def created_total(self, alias):
+        values = db_connections_created_total.snapshot()['values']
+        return dict((tuple(labels), value) for labels, value in values).get((alias,), 0)
+
+    def test_reused_connection_is_not_counted(self):
+        pool = ConnectionPool(max_size=2, ping_interval=60, alias='pool-metrics')
+        for _ in range(3):
+            pool.release(pool.acquire(_connect, _slow_ping(0)), _reset)
+        self.assertEqual(self.created_total('pool-metrics'), 1)
+
+    def test_connection_created_signal_is_ignored_for_pooled_connections(self):
+        pooled = mock.Mock(alias='pooled-wrapper')
+        record_connection_created(sender=None, connection=pooled)
+        self.assertEqual(self.created_total('pooled-wrapper'), 0)
+
+        unpooled = mock.Mock(alias='unpooled-wrapper', pool=None)
+        record_connection_created(sender=None, connection=unpooled)
+        self.assertEqual(self.created_total('unpooled-wrapper'), 1)
+
+def _report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f'\n{name}: n={len(latencies)} '
+        f'p50={statistics.median(latencies) * 1000:.2f}ms '
+        f'p99={p99 * 1000:.2f}ms max={latencies[-1] * 1000:.2f}ms'
+    )
+
+
+def _run_requests(threads, rounds, handle_request):
+    """threads個のスレッドでrounds回ずつリクエストを処理し、各リクエストの処理時間（秒）を返す"""
+    barrier = threading.Barrier(threads)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        for _ in range(rounds):
+            started = time.perf_counter()
+            handle_request()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies
+
+
+@unittest.skipUnless(os.environ.get('DB_POOL_BENCHMARK'), 'DB_POOL_BENCHMARK=1 で実行')
+class ConnectionPoolBenchmark(SimpleTestCase):
+    """リクエストあたりの処理時間の計測（接続・クエリの往復時間をsleepで再現）
+
+    DB_POOL_BENCHMARK=1 python manage.py test apps.database.tests.test_pool --settings=config.settings_test
+
+    MySQLへの新規接続はTCP接続・認証・init_commandの往復を伴うため、
+    同一ネットワーク内でも数ミリ秒かかる（DB_POOL_BENCHMARK_CONNECT_MSで変更）。
+    1リクエストは「接続を取得・クエリ1回・返却」として、プールを使う場合と
+    リクエストごとに接続・切断する場合（CONN_MAX_AGE=0）を比較する。
+    """
+    threads = 32
+    rounds = 20
+    connect_delay = float(os.environ.get('DB_POOL_BENCHMARK_CONNECT_MS', 5)) / 1000
+    query_delay = 0.001
+    ping_delay = 0.0005
+
+    def connect(self):
+        time.sleep(self.connect_delay)
+        return _connect()
+
+    def query(self, connection):
+        time.sleep(self.query_delay)
+        connection.execute('SELECT 1')
+
+    def test_request_latency(self):
+        pool = ConnectionPool(max_size=self.threads, ping_interval=10)
+
+        def pooled_request():
+            connection = pool.acquire(self.connect, _slow_ping(self.ping_delay))
+            self.query(connection)
+            pool.release(connection, _reset)
+
+        _run_requests(self.threads, 1, pooled_request)
+        _report(
+            f'pooled ({self.threads} threads)',
+            _run_requests(self.threads, self.rounds, pooled_request),
+        )
+
+        pool = ConnectionPool(max_size=self.threads, ping_interval=0)
+        _run_requests(self.threads, 1, pooled_request)
+        _report(
+            f'pooled, ping on every acquire ({self.threads} threads)',
+            _run_requests(self.threads, self.rounds, pooled_request),
+        )
+
+        def unpooled_request():
+            connection = self.connect()
+            self.query(connection)
+            connection.close()
+
+        _report(
+            f'new connection per request (connect {self.connect_delay * 1000:.1f}ms, '
+            f'{self.threads} threads)',
+            _run_requests(self.threads, self.rounds, unpooled_request),
+        )
+
+
+@unittest.skipUnless(
+    os.environ.get('DB_POOL_BENCHMARK') and connection.vendor == 'mysql',
+    'MySQLの設定（config.settings）で DB_POOL_BENCHMARK=1 を指定して実行',
+)
+class MySQLConnectionPoolBenchmark(SimpleTestCase):
+    """プール対応バックエンド（apps.database.backends.mysql）を通したリクエストあたりの処理時間
+
+    DB_POOL_BENCHMARK=1 python manage.py test apps.database.tests.test_pool.MySQLConnectionPoolBenchmark
+
+    CONN_MAX_AGE=0でリクエスト終了時に接続を閉じる（request_finished）場合と同じ流れで、
+    'POOL'の有無を比較する。
+    """
+    databases = {'default'}
+    threads = 16
+    rounds = 50
+
+    def handle_request(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        connection.close()
+
+    def measure(self, pool_options):
+        settings_dict = connection.settings_dict
+        original = settings_dict.get('POOL')
+        settings_dict['POOL'] = pool_options
+        try:
+            self.handle_request()
+            return _run_requests(self.threads, self.rounds, self.handle_request)
+        finally:
+            settings_dict['POOL'] = original
+            connection.close()
+
+    def test_request_latency(self):
+        _report(
+            f'MySQL pooled ({self.threads} threads)',
+            self.measure({'MAX_SIZE': self.threads, 'PING_INTERVAL': 10}),
+        )
+        _report(f'MySQL new connection per request ({self.threads} threads)', self.measure(None))
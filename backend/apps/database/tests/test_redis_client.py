@@ -0,0 +1,46 @@
+"""
+共有キャッシュのRedisクライアント（apps.database.redis_client）のテスト
+
+クライアントは接続を遅延して作成するため、Redisサーバーなしで設定の解釈を確認できる。
+"""
+import redis
+from django.test import SimpleTestCase, override_settings
+
+from apps.database.redis_client import get_redis_client
+
+REDIS_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://primary.example:6380/2,redis://replica.example:6380/2',
+        'OPTIONS': {
+            'socket_timeout': 2,
+            'parser_class': 'redis.connection.DefaultParser',
+        },
+    },
+}
+
+
+class RedisClientTests(SimpleTestCase):
+
+    def test_none_for_locmem_cache(self):
+        self.assertIsNone(get_redis_client())
+
+    @override_settings(CACHES=REDIS_CACHES)
+    def test_client_from_cache_settings(self):
+        client = get_redis_client()
+
+        self.assertIsInstance(client, redis.Redis)
+        kwargs = client.connection_pool.connection_kwargs
+        # 先頭のサーバー（Djangoのキャッシュの書き込み先）に接続する
+        self.assertEqual((kwargs['host'], kwargs['port'], kwargs['db']), ('primary.example', 6380, 2))
+        self.assertEqual(kwargs['socket_timeout'], 2)
+        self.assertIs(kwargs['parser_class'], redis.connection.DefaultParser)
+
+    @override_settings(CACHES=REDIS_CACHES)
+    def test_client_is_shared(self):
+        self.assertIs(get_redis_client(), get_redis_client())
+
+    def test_client_follows_settings_changes(self):
+        with override_settings(CACHES=REDIS_CACHES):
+            self.assertIsNotNone(get_redis_client())
+        self.assertIsNone(get_redis_client())
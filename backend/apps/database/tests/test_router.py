@@ -0,0 +1,207 @@
+"""
+読み取りレプリカのルーティングのテスト
+
+config.settings_testのdefaultとreplica1（2つのSQLiteデータベース）を使用する。
+replica1にはレプリケーションを行わないため、プライマリへの書き込みが反映されていない
+（遅延中の）レプリカとして振る舞い、読み取り先をデータの有無で判定できる。
+"""
+import unittest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.authentication.serializers import CustomTokenObtainPairSerializer
+from apps.authentication.singleflight import verification_cache
+from config.celery import app as celery_app
+from apps.database import router
+from apps.users.models import User
+
+
+@unittest.skipUnless('replica1' in settings.DATABASES, 'config.settings_test で実行')
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTestCase(TransactionTestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        router.reset_pin()
+
+    def tearDown(self):
+        router.reset_pin()
+        cache.clear()
+
+    def create_primary_user(self, email):
+        """プライマリにのみ存在するユーザー（レプリカに未反映）"""
+        user = User.objects.db_manager('default').create_user(email, 'password')
+        router.reset_pin()
+        return user
+
+    def exists(self, user):
+        return User.objects.filter(pk=user.pk).exists()
+
+
+class ReplicaRouterTests(ReplicaRouterTestCase):
+    """ルーターの読み取り先"""
+
+    def test_reads_go_to_replica(self):
+        user = self.create_primary_user('replica@example.com')
+        self.assertEqual(router.ReplicaRouter().db_for_read(User), 'replica1')
+        self.assertFalse(self.exists(user))
+
+    def test_write_pins_reads_in_same_request(self):
+        token = router.begin_request()
+        try:
+            user = User.objects.create_user('same-request@example.com', 'password')
+            self.assertTrue(self.exists(user))
+        finally:
+            router.end_request(token)
+
+    def test_recent_write_pins_same_user_in_later_request(self):
+        writer = self.create_primary_user('writer@example.com')
+        other = self.create_primary_user('other@example.com')
+
+        token = router.begin_request(writer.pk)
+        try:
+            User.objects.filter(pk=writer.pk).update(bio='updated')
+        finally:
+            router.end_request(token)
+
+        # 別のワーカーで処理される後続リクエストも、共有キャッシュの記録で固定される
+        token = router.begin_request(writer.pk)
+        try:
+            self.assertTrue(self.exists(writer))
+        finally:
+            router.end_request(token)
+
+        token = router.begin_request(other.pk)
+        try:
+            self.assertFalse(self.exists(other))
+        finally:
+            router.end_request(token)
+
+    def test_pin_ends_when_record_expires(self):
+        user = self.create_primary_user('expired@example.com')
+        router.record_write(user.pk)
+        cache.clear()
+
+        token = router.begin_request(user.pk)
+        try:
+            self.assertFalse(self.exists(user))
+        finally:
+            router.end_request(token)
+
+    def test_primary_only_models(self):
+        from apps.authentication.models import BlacklistedRefreshToken
+
+        self.assertEqual(router.ReplicaRouter().db_for_read(BlacklistedRefreshToken), 'default')
+
+
+@celery_app.task
+def create_user_and_read_back(email):
+    user = User.objects.create_user(email, 'password')
+    return User.objects.filter(pk=user.pk).exists()
+
+
+class ScopedPinningTests(ReplicaRouterTestCase):
+    """リクエスト外（Celeryタスク・管理コマンド）での固定"""
+
+    def test_write_in_scope_pins_until_scope_ends(self):
+        with router.pinning_scope():
+            user = User.objects.create_user('scope@example.com', 'password')
+            self.assertTrue(self.exists(user))
+        self.assertFalse(router.is_pinned())
+        self.assertFalse(self.exists(user))
+
+    def test_task_pin_is_reset_after_task(self):
+        result = create_user_and_read_back.apply(args=['task@example.com'])
+        # タスク内では自分の書き込みをプライマリから読む
+        self.assertTrue(result.get())
+        # 同じワーカーの後続の処理はレプリカから読む
+        self.assertFalse(router.is_pinned())
+        self.assertEqual(router.ReplicaRouter().db_for_read(User), 'replica1')
+
+    def test_task_in_request_uses_request_state(self):
+        token = router.begin_request()
+        try:
+            create_user_and_read_back.apply(args=['eager@example.com'])
+            self.assertTrue(router.is_pinned())
+        finally:
+            router.end_request(token)
+
+    def test_unscoped_write_pin_expires(self):
+        User.objects.create_user('unscoped@example.com', 'password')
+        self.assertTrue(router.is_pinned())
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            User.objects.create_user('expires@example.com', 'password')
+            self.assertFalse(router.is_pinned())
+
+
+class ReplicaPinningRequestTests(ReplicaRouterTestCase):
+    """ミドルウェア・ビューを通した読み取り先"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def authorize(self, user):
+        access = CustomTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_registered_user_can_use_api_immediately(self):
+        response = self.client.post(reverse('authentication:register'), {
+            'email': 'new@example.com',
+            'password': 'aP4ssw0rd!x',
+            'password_confirm': 'aP4ssw0rd!x',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        # 登録したユーザーの後続リクエストはプライマリで認証される
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {response.data["tokens"]["access"]}'
+        )
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'new@example.com')
+
+    def test_user_without_recent_write_reads_replica(self):
+        user = self.create_primary_user('lagging@example.com')
+        self.authorize(user)
+        # 認証時のユーザー取得がレプリカで行われ、未反映のため失敗する
+        self.assertEqual(self.client.get(reverse('users:profile')).status_code, 401)
+
+    def test_cache_populating_detail_read_uses_primary(self):
+        viewer = self.create_primary_user('viewer@example.com')
+        target = self.create_primary_user('target@example.com')
+        router.record_write(viewer.pk)
+        self.authorize(viewer)
+
+        response = self.client.get(reverse('users:detail', args=[target.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_batch_read_uses_primary(self):
+        viewer = self.create_primary_user('batch-viewer@example.com')
+        target = self.create_primary_user('batch-target@example.com')
+        router.record_write(viewer.pk)
+        self.authorize(viewer)
+
+        response = self.client.get(reverse('users:batch'), {'ids': str(target.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results']), [str(target.pk)])
+
+    def test_single_flight_follower_reads_primary(self):
+        user = self.create_primary_user('social@example.com')
+        # 他のワーカーが検証を済ませ、結果を共有している状態
+        cache.set(
+            verification_cache.make_key('google', 'shared-token'),
+            {'user_id': user.pk, 'created': True},
+        )
+
+        response = self.client.post(
+            reverse('authentication:google_auth'), {'access_token': 'shared-token'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['user']['id'], user.pk)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.monitoring'
+    verbose_name = 'モニタリング'
+
+    def ready(self):
+        # シグナルの登録
+        from . import signals  # noqa: F401
@@ -0,0 +1,335 @@
+"""
+Prometheus形式のメトリクス
+
+値の更新はプロセス内の辞書への加算のみで、ホットパスに置いても負荷は小さい。
+各プロセス（gunicornワーカー・Celeryワーカー）はバックグラウンドスレッドで
+一定間隔ごとにスナップショットを共有キャッシュに書き込み、/metricsでは全プロセス分を合算して出力する。
+プロセスが終了した場合、そのプロセスの値はスナップショットの有効期限後に消える（カウンターのリセットとして扱われる）。
+"""
+import bisect
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'values': values,
+        }
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """現在値（全プロセスの合計を出力）"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """ヒストグラム（値は [各バケットの件数..., 合計, 件数]）"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), list(value)] for key, value in self._values.items()]
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'buckets': list(self.buckets),
+            'values': values,
+        }
+
+
+class MetricsRegistry:
+    """メトリクスの登録と、プロセス間での集計"""
+    cache_prefix = 'metrics'
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._publisher_lock = threading.Lock()
+        self._publisher = None
+        self.process_id = self._make_process_id()
+        # preforkのサーバーでフォークされた場合、親プロセスの値を引き継がない
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @staticmethod
+    def _make_process_id():
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    @property
+    def publish_interval(self):
+        return getattr(settings, 'METRICS_PUBLISH_INTERVAL', 10)
+
+    @property
+    def index_key(self):
+        return f'{self.cache_prefix}:processes'
+
+    def _snapshot_key(self, process_id):
+        return f'{self.cache_prefix}:process:{process_id}'
+
+    def _after_fork(self):
+        self.process_id = self._make_process_id()
+        self._publisher_lock = threading.Lock()
+        self._publisher = None
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'メトリクス {metric.name} は登録済みです')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """スナップショットの直前に呼び出す関数を登録（ゲージの更新用）"""
+        self._collectors.append(collector)
+
+    def ensure_publisher(self):
+        """スナップショットを定期的に共有キャッシュへ書き込むスレッドを起動"""
+        if self._publisher is not None:
+            return
+        with self._publisher_lock:
+            if self._publisher is None:
+                self._publisher = threading.Thread(
+                    target=self._publish_loop, name='metrics-publisher', daemon=True
+                )
+                self._publisher.start()
+
+    def _publish_loop(self):
+        while True:
+            time.sleep(self.publish_interval)
+            try:
+                self.publish()
+            except Exception:
+                logger.exception('メトリクスの書き込みに失敗しました')
+
+    def snapshot(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception('メトリクスの収集に失敗しました')
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def publish(self):
+        """このプロセスのスナップショットを共有キャッシュに書き込む"""
+        ttl = self.publish_interval * 6
+        snapshot = self.snapshot()
+        cache.set(self._snapshot_key(self.process_id), snapshot, ttl)
+
+        # 他プロセスと同時に更新すると登録が消えることがあるが、次回の書き込みで再登録される
+        now = time.time()
+        index = cache.get(self.index_key) or {}
+        index = {key: seen for key, seen in index.items() if now - seen < ttl}
+        index[self.process_id] = now
+        cache.set(self.index_key, index, None)
+        return snapshot
+
+    def collect(self):
+        """全プロセスのスナップショットを合算"""
+        own = self.publish()
+        index = cache.get(self.index_key) or {}
+        keys = [
+            self._snapshot_key(process_id)
+            for process_id in index if process_id != self.process_id
+        ]
+        snapshots = [own] + list(cache.get_many(keys).values())
+
+        merged = {}
+        for snapshot in snapshots:
+            for name, data in snapshot.items():
+                if name not in self._metrics:
+                    continue
+                target = merged.setdefault(name, {**data, 'values': {}})
+                for labels, value in data['values']:
+                    key = tuple(labels)
+                    current = target['values'].get(key)
+                    if current is None:
+                        target['values'][key] = value
+                    elif isinstance(value, list):
+                        target['values'][key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target['values'][key] = current + value
+        return merged
+
+    def render(self):
+        """Prometheusのテキスト形式で出力"""
+        lines = []
+        for name, data in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {data["help"]}')
+            lines.append(f'# TYPE {name} {data["type"]}')
+            labelnames = data['labelnames']
+            for key, value in sorted(data['values'].items()):
+                labels = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, key)]
+                if data['type'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(data['buckets'], value):
+                        cumulative += count
+                        le = 'le="%s"' % bound
+                        lines.append(f'{name}_bucket{_labels(labels + [le])} {cumulative}')
+                    le = 'le="+Inf"'
+                    lines.append(f'{name}_bucket{_labels(labels + [le])} {value[-1]}')
+                    lines.append(f'{name}_sum{_labels(labels)} {value[-2]}')
+                    lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+                else:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds',
+    'ビューごとのリクエスト処理時間',
+    ('view', 'method', 'status'),
+)
+auth_login_total = registry.counter(
+    'auth_login_total',
+    'ログイン試行回数（providerはpassword/google/twitter/discord）',
+    ('provider', 'result'),
+)
+auth_token_refresh_total = registry.counter(
+    'auth_token_refresh_total',
+    'トークン更新回数',
+    ('result',),
+)
+auth_token_blacklisted_total = registry.counter(
+    'auth_token_blacklisted_total',
+    'ブラックリストに登録したリフレッシュトークン数',
+)
+auth_blacklist_checks_total = registry.counter(
+    'auth_blacklist_checks_total',
+    'ブラックリストの判定回数（resultはblacklisted/allowed）',
+    ('result',),
+)
+auth_throttled_total = registry.counter(
+    'auth_throttled_total',
+    'レート制限で拒否したリクエスト数',
+    ('scope',),
+)
+celery_task_runtime = registry.histogram(
+    'celery_task_runtime_seconds',
+    'Celeryタスクの実行時間',
+    ('task', 'state'),
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0),
+)
+celery_task_queue_lag = registry.histogram(
+    'celery_task_queue_lag_seconds',
+    'Celeryタスクの登録から実行開始までの時間',
+    ('task',),
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0),
+)
+db_connections_open = registry.gauge(
+    'db_connections_open',
+    '開いているDB接続数',
+    ('alias',),
+)
+db_connections_created_total = registry.counter(
+    'db_connections_created_total',
+    '新たに確立したDB接続数',
+    ('alias',),
+)
+db_pool_connections = registry.gauge(
+    'db_pool_connections',
+    'DB接続プールの接続数（stateはidle/in_use）',
+    ('alias', 'state'),
+)
+db_pool_events = registry.gauge(
+    'db_pool_events',
+    'DB接続プールの累計（eventはcreated/reused/discarded/waits/timeouts）',
+    ('alias', 'event'),
+)
+
+
+def _collect_db_pools():
+    from apps.database.pool import get_pool_stats
+
+    for alias, stats in get_pool_stats().items():
+        for state in ('idle', 'in_use'):
+            db_pool_connections.set(stats[state], alias=alias, state=state)
+        for event in ('created', 'reused', 'discarded', 'waits', 'timeouts'):
+            db_pool_events.set(stats[event], alias=alias, event=event)
+
+
+registry.add_collector(_collect_db_pools)
@@ -0,0 +1,163 @@
+"""
+リクエストごとの計測ミドルウェア
+
+MetricsMiddlewareは全リクエストの処理時間をメトリクス（apps.monitoring.metrics）に記録する。
+
+PerformanceMiddlewareは、PERF_SAMPLE_RATEの割合のリクエストについて、処理時間・DBクエリ数と時間・
+キャッシュのヒット/ミス・外部HTTP通信の時間を計測し、
+Server-Timingヘッダーと構造化ログ（JSON）で出力する。
+同じ形のクエリがPERF_N_PLUS_ONE_THRESHOLD回以上実行された場合はN+1として警告する。
+PERF_SAMPLE_RATEが0の場合はミドルウェア自体を読み込まない。
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import perf
+from .metrics import db_connections_open, http_request_duration, registry
+
+logger = logging.getLogger('apps.monitoring.perf')
+
+
+class MetricsMiddleware:
+    """ビューごとの処理時間と、処理後に開いているDB接続数を記録する"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        registry.ensure_publisher()
+        match = getattr(request, 'resolver_match', None)
+        # ラベルの種類が増えすぎないよう、パスではなくURL名を使用する
+        http_request_duration.observe(
+            elapsed,
+            view=match.view_name if match else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+        )
+        for connection in connections.all(initialized_only=True):
+            db_connections_open.set(
+                int(connection.connection is not None), alias=connection.alias
+            )
+
+
+class PerformanceMiddleware:
+    """サンプリングしたリクエストの処理時間の内訳を記録する"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', False)
+        self.n_plus_one_threshold = getattr(settings, 'PERF_N_PLUS_ONE_THRESHOLD', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_sampled():
+            return self.get_response(request)
+
+        profile = perf.RequestProfile()
+        with self.instrument(profile):
+            response = self.get_response(request)
+        self.finish(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+
+        profile = perf.RequestProfile()
+        with self.instrument(profile):
+            response = await self.get_response(request)
+        self.finish(request, response, profile)
+        return response
+
+    def is_sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def instrument(self, profile):
+        """DB・キャッシュの計測を有効化（終了時に元に戻す）"""
+        stack = ExitStack()
+        token = perf.activate(profile)
+        stack.callback(perf.deactivate, token)
+
+        # 他のスレッドの接続には接続時に設定される（apps.monitoring.perf）。
+        # 計測を有効にする前から接続済みの現在のスレッドの接続にはここで設定する
+        for connection in connections.all(initialized_only=True):
+            perf.install_db_wrapper(connection)
+
+        # cachesは現在のスレッド（コンテキスト）ごとに保持されるため、他のリクエストには影響しない
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            caches[alias] = perf.ProfiledCache(backend)
+            stack.callback(caches.__setitem__, alias, backend)
+
+        return stack
+
+    def finish(self, request, response, profile):
+        elapsed = profile.elapsed
+        repeated = profile.repeated_statements(self.n_plus_one_threshold)
+        match = getattr(request, 'resolver_match', None)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_queries': profile.db_count,
+            'db_ms': round(profile.db_time * 1000, 2),
+            'cache_hits': profile.cache_hits,
+            'cache_misses': profile.cache_misses,
+            'http_calls': profile.http_count,
+            'http_ms': round(profile.http_time * 1000, 2),
+            'n_plus_one': bool(repeated),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False), extra={'perf': record})
+
+        for sql, count in repeated:
+            logger.warning(
+                'N+1の疑い: %s %s で同じクエリが%d回実行されました: %s',
+                request.method, request.path, count, sql[:200],
+            )
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={elapsed * 1000:.1f}',
+                f'db;dur={profile.db_time * 1000:.1f};desc="{profile.db_count} queries"',
+                f'cache;desc="{profile.cache_hits} hits, {profile.cache_misses} misses"',
+                f'http;dur={profile.http_time * 1000:.1f};desc="{profile.http_count} calls"',
+            ])
@@ -0,0 +1,133 @@
+"""
+リクエストごとの処理時間の内訳
+
+サンプリング対象のリクエストでのみRequestProfileをコンテキストに設定する。
+record_*関数はプロファイルがない場合は何もしないため、ホットパスに置いても負荷はほぼない。
+
+DBクエリはすべての接続に設定したdb_wrapperで数える（PERF_SAMPLE_RATEが0より大きい場合、
+接続時にapps.monitoring.signalsが設定する）。ASGIではORMの呼び出しがsync_to_asyncで
+リクエストとは別のスレッド（別の接続）で実行されるが、コンテキスト変数はそのスレッドにも
+引き継がれるため、同じリクエストのプロファイルに記録される。
+"""
+import contextvars
+import time
+from collections import Counter
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """1リクエストの計測値"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.db_statements = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_count = 0
+        self.http_time = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """クエリの実行時間・回数を記録（db_wrapperから呼び出す）"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_count += 1
+            # パラメーター化されたSQLが同じものを同じ形のクエリとして数える
+            self.db_statements[sql] += 1
+
+    def repeated_statements(self, threshold):
+        """threshold回以上実行された同じ形のクエリ（N+1の疑い）"""
+        return [
+            (sql, count) for sql, count in self.db_statements.most_common()
+            if count >= threshold
+        ]
+
+
+def get_current():
+    return _current.get()
+
+
+def activate(profile):
+    return _current.set(profile)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapperに設定するラッパー（プロファイルがない場合はそのまま実行）"""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.db_wrapper(execute, sql, params, many, context)
+
+
+def install_db_wrapper(connection):
+    """接続にdb_wrapperを設定（設定済みの場合は何もしない）"""
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+def record_cache(hits, misses):
+    profile = _current.get()
+    if profile is not None:
+        profile.cache_hits += hits
+        profile.cache_misses += misses
+
+
+def record_http(elapsed):
+    profile = _current.get()
+    if profile is not None:
+        profile.http_count += 1
+        profile.http_time += elapsed
+
+
+_MISSING = object()
+
+
+class ProfiledCache:
+    """キャッシュのヒット・ミスを数えるプロキシ（サンプリング対象のリクエストでのみ使用）"""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def get(self, key, default=None, version=None):
+        value = self._backend.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._backend.get_many(keys, version=version)
+        record_cache(len(values), len(keys) - len(values))
+        return values
+
+    async def aget(self, key, default=None, version=None):
+        value = await self._backend.aget(key, _MISSING, version=version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    async def aget_many(self, keys, version=None):
+        keys = list(keys)
+        values = await self._backend.aget_many(keys, version=version)
+        record_cache(len(values), len(keys) - len(values))
+        return values
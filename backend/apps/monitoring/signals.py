@@ -0,0 +1,70 @@
+"""
+メトリクス・計測用のシグナル（Celeryタスク・DB接続）
+"""
+import time
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from apps.database.pool import pool_connection_created
+
+from . import perf
+from .metrics import (
+    celery_task_queue_lag,
+    celery_task_runtime,
+    db_connections_created_total,
+    registry,
+)
+
+PUBLISHED_AT_HEADER = 'published_at'
+
+# 実行中のタスクの開始時刻（task_id -> perf_counter）
+_started = {}
+
+
+@before_task_publish.connect
+def record_published_at(sender=None, headers=None, **kwargs):
+    """キューの待ち時間を計測するため、登録時刻をヘッダーに付与"""
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    registry.ensure_publisher()
+    _started[task_id] = time.perf_counter()
+
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is not None:
+        celery_task_queue_lag.observe(max(0.0, time.time() - published_at), task=task.name)
+
+
+@task_postrun.connect
+def record_task_runtime(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        celery_task_runtime.observe(
+            time.perf_counter() - started, task=task.name, state=state or 'UNKNOWN'
+        )
+
+
+@receiver(connection_created)
+def record_connection_created(sender, connection, **kwargs):
+    # プールを使う接続は、プールから再利用した場合にも送られるため数えない
+    if getattr(connection, 'pool', None) is not None:
+        return
+    db_connections_created_total.inc(alias=connection.alias)
+
+
+@receiver(connection_created)
+def install_perf_db_wrapper(sender, connection, **kwargs):
+    # リクエストと別のスレッドの接続でのクエリも数えられるよう、接続ごとに設定する
+    if getattr(settings, 'PERF_SAMPLE_RATE', 0.0) > 0:
+        perf.install_db_wrapper(connection)
+
+
+@receiver(pool_connection_created)
+def record_pool_connection_created(sender, alias, **kwargs):
+    db_connections_created_total.inc(alias=alias)
@@ -0,0 +1,106 @@
+"""
+リクエストの計測（PerformanceMiddleware）のテスト
+"""
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from apps.monitoring import perf
+from apps.monitoring.middleware import PerformanceMiddleware
+from apps.users.models import User
+
+
+def count_users():
+    return User.objects.count()
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0, PERF_SERVER_TIMING=True, PERF_N_PLUS_ONE_THRESHOLD=3)
+class PerformanceMiddlewareTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        # テスト用DBの接続は計測を有効にする前に作成済みのため、接続時と同じくラッパーを設定する
+        # （他のスレッドの接続は、このテスト中の接続時に設定される）
+        for connection in connections.all(initialized_only=True):
+            perf.install_db_wrapper(connection)
+        self.request = RequestFactory().get('/api/users/profile/')
+
+    def tearDown(self):
+        cache.clear()
+
+    def run_sync(self, view):
+        def get_response(request):
+            view()
+            return HttpResponse()
+
+        with self.assertLogs('apps.monitoring.perf', 'INFO') as logs:
+            response = PerformanceMiddleware(get_response)(self.request)
+        return response, logs
+
+    def run_async(self, view):
+        async def get_response(request):
+            await view()
+            return HttpResponse()
+
+        middleware = PerformanceMiddleware(get_response)
+        with self.assertLogs('apps.monitoring.perf', 'INFO') as logs:
+            response = async_to_sync(middleware)(self.request)
+        return response, logs
+
+    def get_record(self, logs):
+        return next(record.perf for record in logs.records if hasattr(record, 'perf'))
+
+    def test_disabled_without_sampling(self):
+        with override_settings(PERF_SAMPLE_RATE=0.0):
+            with self.assertRaises(MiddlewareNotUsed):
+                PerformanceMiddleware(lambda request: HttpResponse())
+
+    def test_sync_request(self):
+        def view():
+            count_users()
+            cache.get('missing')
+            cache.set('present', 1)
+            cache.get('present')
+
+        response, logs = self.run_sync(view)
+
+        record = self.get_record(logs)
+        self.assertEqual(record['db_queries'], 1)
+        self.assertEqual((record['cache_hits'], record['cache_misses']), (1, 1))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('"1 queries"', response['Server-Timing'])
+        self.assertEqual(json.loads(logs.records[0].getMessage())['db_queries'], 1)
+
+    def test_n_plus_one_warning(self):
+        def view():
+            for _ in range(3):
+                count_users()
+
+        _, logs = self.run_sync(view)
+
+        self.assertTrue(self.get_record(logs)['n_plus_one'])
+        self.assertTrue(any('N+1' in record.getMessage() for record in logs.records))
+
+    def test_async_request_counts_queries_in_other_threads(self):
+        async def view():
+            # ASGIと同様に、ORMはsync_to_asyncで別のスレッド（別の接続）で実行される
+            await sync_to_async(count_users, thread_sensitive=False)()
+            await sync_to_async(count_users)()
+
+        response, logs = self.run_async(view)
+
+        self.assertEqual(self.get_record(logs)['db_queries'], 2)
+        self.assertIn('"2 queries"', response['Server-Timing'])
+
+    def test_queries_outside_sampled_request_are_not_counted(self):
+        _, logs = self.run_sync(count_users)
+        profile = perf.RequestProfile()
+        # 計測後も接続にはラッパーが残るが、プロファイルがなければ記録しない
+        count_users()
+        self.assertEqual(profile.db_count, 0)
+        self.assertEqual(self.get_record(logs)['db_queries'], 1)
@@ -0,0 +1,28 @@
+"""
+メトリクスのビューのテスト
+"""
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+
+class MetricsViewTests(SimpleTestCase):
+    """/metricsのアクセス制御"""
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_denied_without_token_in_production(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_allowed_without_token_in_debug(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
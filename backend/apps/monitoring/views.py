@@ -0,0 +1,29 @@
+"""
+モニタリング用のビュー
+"""
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from .metrics import registry
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus形式のメトリクス
+
+    METRICS_TOKENを設定した場合はBearerトークンが必要。未設定の場合はDEBUG時のみ公開する。
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        authorization = request.headers.get('Authorization', '')
+        if not constant_time_compare(authorization, f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,114 @@
+"""
+ユーザーのアクティビティ（最終ログイン・最終アクセス日時）の記録
+
+ログインやリクエストのたびにUPDATEを発行すると、同じユーザーへのアクセスが集中した際に
+行ロックの競合が起きるため、日時はRedisのハッシュに溜めておき、Celeryの定期タスク
+（flush_user_activity）でまとめて1回の UPDATE ... CASE で書き込む。
+共有キャッシュがRedisでない場合（開発環境のプロセス内キャッシュなど）は、その場で更新する。
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from apps.database.redis_client import get_redis_client
+
+from .models import User
+
+FIELD_LAST_LOGIN = 'last_login'
+FIELD_LAST_SEEN = 'last_seen'
+ACTIVITY_FIELDS = (FIELD_LAST_LOGIN, FIELD_LAST_SEEN)
+
+# 同じユーザーの最終アクセス日時を記録する最小間隔（秒）
+LAST_SEEN_RESOLUTION = 60
+
+
+class ActivityRecorder:
+    """アクティビティ日時のバッファ"""
+    prefix = 'activity'
+
+    def __init__(self, last_seen_resolution=LAST_SEEN_RESOLUTION):
+        self.last_seen_resolution = last_seen_resolution
+        self._lock = threading.Lock()
+        # プロセス内で最後に最終アクセス日時を記録した時刻（user_id -> monotonic）
+        self._seen = {}
+
+    def _buffer_key(self, field):
+        return cache.make_key(f'{self.prefix}:{field}')
+
+    def record(self, field, user_id, when=None):
+        when = when or timezone.now()
+        key = self._buffer_key(field)
+        client = get_redis_client()
+        if client is None:
+            # バッファを共有できないため直接更新（update()のためupdated_atは変わらない）
+            User.objects.filter(pk=user_id).update(**{field: when})
+            return
+        client.hset(key, str(user_id), when.timestamp())
+
+    def record_login(self, user_id):
+        self.record(FIELD_LAST_LOGIN, user_id)
+
+    def record_seen(self, user_id):
+        """最終アクセス日時を記録（同じユーザーはプロセス内で一定間隔ごとに1回だけ）"""
+        now = time.monotonic()
+        last = self._seen.get(user_id)
+        if last is not None and now - last < self.last_seen_resolution:
+            return
+        with self._lock:
+            if len(self._seen) > 100000:
+                self._seen.clear()
+            self._seen[user_id] = now
+        self.record(FIELD_LAST_SEEN, user_id)
+
+    def _take(self, field):
+        """バッファの内容を取り出し用のキーに移す（移した後の記録は次回に回る）
+
+        (取り出し用のキー, {user_id: 日時}) を返す。前回の書き込みが途中で失敗している
+        場合は、その残りを先に処理する。
+        """
+        key = self._buffer_key(field)
+        client = get_redis_client()
+        if client is None:
+            return None, {}
+
+        flushing_key = f'{key}:flushing'
+        # RENAMEは不可分のため、移した後に記録された値は新しいハッシュに入る
+        if not client.exists(flushing_key):
+            if not client.exists(key):
+                return None, {}
+            client.rename(key, flushing_key)
+        entries = client.hgetall(flushing_key)
+        return flushing_key, {
+            int(user_id): datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+            for user_id, value in entries.items()
+        }
+
+    def flush(self, batch_size=500):
+        """溜めた日時をまとめて書き込み、フィールドごとの更新件数を返す"""
+        counts = {}
+        for field in ACTIVITY_FIELDS:
+            flushing_key, entries = self._take(field)
+            items = sorted(entries.items())
+            updated = 0
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                updated += User.objects.filter(
+                    pk__in=[user_id for user_id, _ in batch]
+                ).update(**{
+                    field: Case(
+                        *[When(pk=user_id, then=Value(when)) for user_id, when in batch],
+                        output_field=DateTimeField(),
+                    ),
+                })
+            # 書き込みが完了してから削除する（失敗した場合は次回に再試行される）
+            if flushing_key is not None:
+                get_redis_client().delete(flushing_key)
+            counts[field] = updated
+        return counts
+
+
+activity_recorder = ActivityRecorder()
@@ -17,9 +17,9 @@ class UserAdmin(BaseUserAdmin):
     
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
-        (_('個人情報'), {'fields': ('first_name', 'last_name', 'display_name', 'avatar', 'bio')}),
+        (_('個人情報'), {'fields': ('first_name', 'last_name', 'display_name', 'avatar', 'avatar_hash', 'bio')}),
         (_('権限'), {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
-        (_('重要な日付'), {'fields': ('last_login', 'created_at', 'updated_at')}),
+        (_('重要な日付'), {'fields': ('last_login', 'last_seen', 'created_at', 'updated_at')}),
         (_('Google OAuth'), {'fields': ('google_id',)}),
     )
     
@@ -30,5 +30,5 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     
-    readonly_fields = ('created_at', 'updated_at', 'last_login')
+    readonly_fields = ('avatar_hash', 'created_at', 'updated_at', 'last_login', 'last_seen')
 
@@ -6,3 +6,6 @@ class UsersConfig(AppConfig):
     name = 'apps.users'
     verbose_name = 'ユーザー'
 
+    def ready(self):
+        # シグナルの登録
+        from . import signals  # noqa: F401
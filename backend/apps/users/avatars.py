@@ -0,0 +1,104 @@
+"""
+アバター画像の処理
+
+アップロードされた画像はリクエスト中は保存のみ行い、Celeryタスクで1回だけデコードして
+固定サイズのWebP/JPEGを生成する。生成した画像は元画像の内容ハッシュごとに保存するため、
+同じ画像は再生成せずに共有される。メタデータ（EXIFなど）は出力に含めない。
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+DEFAULT_AVATAR_SIZES = (64, 128, 256)
+AVATAR_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+UPLOAD_DIR = 'avatars/uploads'
+
+
+def get_avatar_sizes():
+    return tuple(getattr(settings, 'AVATAR_SIZES', DEFAULT_AVATAR_SIZES))
+
+
+def variant_path(content_hash, size, extension):
+    return f'avatars/{content_hash[:2]}/{content_hash}/{size}.{extension}'
+
+
+def variant_urls(content_hash, request=None):
+    """サイズ・形式ごとのURL（{'64': {'webp': url, 'jpg': url}, ...}）"""
+    urls = {}
+    for size in get_avatar_sizes():
+        urls[str(size)] = {}
+        for extension, _, _ in AVATAR_FORMATS:
+            url = default_storage.url(variant_path(content_hash, size, extension))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[str(size)][extension] = url
+    return urls
+
+
+def save_upload(uploaded_file):
+    """アップロードをそのまま一時保存（チャンク単位で書き込まれる）"""
+    return default_storage.save(f'{UPLOAD_DIR}/{uuid.uuid4().hex}', uploaded_file)
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with default_storage.open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_rgb(image):
+    """透過部分を白で塗りつぶしてRGBに変換"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def process_upload(path):
+    """一時保存した画像から各サイズの画像を生成し、内容ハッシュを返す"""
+    content_hash = _hash_file(path)
+    sizes = get_avatar_sizes()
+
+    # 同じ画像が処理済みの場合は再生成しない
+    if all(
+        default_storage.exists(variant_path(content_hash, size, extension))
+        for size in sizes
+        for extension, _, _ in AVATAR_FORMATS
+    ):
+        return content_hash
+
+    with default_storage.open(path, 'rb') as f:
+        image = Image.open(f)
+        # JPEGは必要な解像度に近い縮小率でデコードする
+        image.draft('RGB', (max(sizes) * 2, max(sizes) * 2))
+        image = ImageOps.exif_transpose(image)
+        image = _to_rgb(image)
+
+    for size in sizes:
+        resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for extension, image_format, options in AVATAR_FORMATS:
+            target = variant_path(content_hash, size, extension)
+            if default_storage.exists(target):
+                continue
+            buffer = ContentFile(b'')
+            # exifなどを渡さないため、メタデータは保存されない
+            resized.save(buffer, format=image_format, **options)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+
+    return content_hash
+
+
+def default_variant_path(content_hash):
+    """avatarフィールドに設定する画像（最大サイズのJPEG）"""
+    return variant_path(content_hash, max(get_avatar_sizes()), 'jpg')
@@ -0,0 +1,144 @@
+"""
+ユーザー表現のリードスルーキャッシュ
+
+シリアライズ済みの表現をユーザーID・シリアライザーの種類ごとにキャッシュする。
+キーにはユーザーごとのバージョンを含め、保存・削除時にバージョンを進めて無効化する。
+古いバージョンのキーは参照されなくなるため、更新と競合した読み込みが
+古いデータを書き戻しても新しいバージョンでは使われない。
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class CacheStats:
+    """プロセス内のヒット率・レイテンシ統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.hit_time = 0.0
+            self.miss_time = 0.0
+
+    def record(self, hit, elapsed):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_time += elapsed
+            else:
+                self.misses += 1
+                self.miss_time += elapsed
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'avg_hit_ms': self.hit_time / self.hits * 1000 if self.hits else 0.0,
+                'avg_miss_ms': self.miss_time / self.misses * 1000 if self.misses else 0.0,
+            }
+
+
+class UserRepresentationCache:
+    """ユーザー表現のキャッシュ"""
+    prefix = 'users:repr'
+
+    def __init__(self, timeout=None):
+        self._timeout = timeout
+        self.stats = CacheStats()
+
+    @property
+    def timeout(self):
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+    def _version_key(self, user_id):
+        return f'{self.prefix}:version:{user_id}'
+
+    def get_version(self, user_id):
+        """ユーザーのキャッシュバージョン（存在しない場合は新しく発行）"""
+        key = self._version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            # 時刻ベースのため、消えたバージョンが再利用されることはない
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        return version
+
+    def get_or_render(self, user_id, variant, render):
+        """キャッシュ済みの表現を返す。なければrender()の結果を保存して返す"""
+        started = time.perf_counter()
+        key = f'{self.prefix}:{user_id}:{self.get_version(user_id)}:{variant}'
+
+        data = cache.get(key)
+        hit = data is not None
+        if not hit:
+            data = render()
+            cache.set(key, data, self.timeout)
+
+        self.stats.record(hit, time.perf_counter() - started)
+        return data
+
+    def get_many(self, user_ids, variant):
+        """複数ユーザーの表現をまとめて取得し、(ヒットした表現, 未ヒットのキー) を返す"""
+        started = time.perf_counter()
+        version_keys = {self._version_key(user_id): user_id for user_id in user_ids}
+        versions = cache.get_many(list(version_keys))
+
+        for version_key, user_id in version_keys.items():
+            if version_key not in versions:
+                versions[version_key] = self.get_version(user_id)
+
+        keys = {
+            user_id: f'{self.prefix}:{user_id}:{versions[version_key]}:{variant}'
+            for version_key, user_id in version_keys.items()
+        }
+        cached = cache.get_many(list(keys.values()))
+
+        found = {}
+        missing_keys = {}
+        for user_id, key in keys.items():
+            if key in cached:
+                found[user_id] = cached[key]
+            else:
+                missing_keys[user_id] = key
+
+        elapsed = (time.perf_counter() - started) / max(len(user_ids), 1)
+        for user_id in user_ids:
+            self.stats.record(user_id in found, elapsed)
+
+        return found, missing_keys
+
+    def set_many(self, entries):
+        """get_manyで返されたキーに表現を保存（{キー: 表現}）"""
+        if entries:
+            cache.set_many(entries, self.timeout)
+
+    def invalidate(self, user_id):
+        """ユーザーのキャッシュを無効化（バージョンを進める）"""
+        cache.set(self._version_key(user_id), time.time_ns(), timeout=None)
+
+    def invalidate_on_commit(self, user_id, using=None):
+        """書き込み中のトランザクションのコミット後にも無効化する
+
+        コミット前に無効化しただけでは、コミットまでの間の読み込みが更新前の行を
+        新しいバージョンでキャッシュしてしまう。コミット後にもう一度バージョンを進め、
+        その表現を参照されなくする。ロールバックされた場合はコミット後の無効化は行われない。
+        """
+        self.invalidate(user_id)
+        if transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(lambda: self.invalidate(user_id), using=using)
+
+
+user_cache = UserRepresentationCache()
@@ -0,0 +1,59 @@
+"""
+ユーザーエンドポイントの条件付きリクエスト（ETag / Last-Modified）
+
+ETagはupdated_at（一覧はページ内のID・max(updated_at)・件数）から生成するため、
+シリアライズせずに If-None-Match / If-Match を判定できる。
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _digest(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+
+def _timestamp(updated_at):
+    return int(updated_at.timestamp() * 1_000_000)
+
+
+def get_version(obj):
+    """(id, updated_at) を取得（.values()の行にも対応）"""
+    if isinstance(obj, dict):
+        return obj['id'], obj['updated_at']
+    return obj.pk, obj.updated_at
+
+
+def make_etag(pk, updated_at, variant=''):
+    """1ユーザー分の強いETag"""
+    return quote_etag(f'{pk}-{_timestamp(updated_at)}-{_digest(variant)}')
+
+
+def make_list_etag(users, variant=''):
+    """一覧ページの強いETag（ページ内のID・max(updated_at)・件数から生成）"""
+    versions = [get_version(user) for user in users]
+    latest = max((updated_at for _, updated_at in versions), default=None)
+    return quote_etag(_digest(
+        variant,
+        len(versions),
+        _timestamp(latest) if latest else 0,
+        ','.join(str(pk) for pk, _ in versions),
+    ))
+
+
+def check_preconditions(request, etag, updated_at=None):
+    """条件に一致する場合は304/412のレスポンスを返し、それ以外はNoneを返す"""
+    last_modified = int(updated_at.timestamp()) if updated_at else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, updated_at)
+    return response
+
+
+def set_validators(response, etag, updated_at=None):
+    """ETag・Last-Modifiedヘッダーを設定"""
+    response['ETag'] = etag
+    if updated_at:
+        response['Last-Modified'] = http_date(updated_at.timestamp())
+    return response
@@ -0,0 +1,116 @@
+"""
+ユーザーの一括エクスポート（NDJSON / CSV）
+
+主キー順のキーセットでchunk_size件ずつ取得し、1行ずつ出力するため、
+テーブルの件数によらずメモリ使用量は一定。
+出力するフィールドと表現はUserSerializerと同じ（apps.users.fastpathを使用）。
+"""
+import csv
+import json
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fastpath import get_values_plan
+from .models import User
+from .serializers import UserSerializer
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+EXPORT_FORMATS = (FORMAT_NDJSON, FORMAT_CSV)
+
+CONTENT_TYPES = {
+    FORMAT_NDJSON: 'application/x-ndjson',
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+}
+
+
+class _Echo:
+    """csv.writerの書き込み先（書き込まれた行をそのまま返す）"""
+
+    def write(self, value):
+        return value
+
+
+def get_export_plan(fields=None):
+    plan = get_values_plan(UserSerializer, fields)
+    if plan is None:
+        raise ValueError('エクスポートできないフィールドが含まれています。')
+    return plan
+
+
+def iter_rows(plan, queryset=None, chunk_size=1000, request=None):
+    """ユーザーの表現（dict）を主キー順に1件ずつ返す"""
+    if queryset is None:
+        queryset = User.objects.all()
+    columns = tuple(dict.fromkeys(('id',) + plan.columns))
+
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values(*columns)[:chunk_size]
+        )
+        if not rows:
+            break
+        for row in rows:
+            yield plan.render(row, request)
+        last_pk = rows[-1]['id']
+
+
+def _dump(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield (_dump(row) + '\n').encode()
+
+
+def iter_csv(rows, field_names):
+    writer = csv.writer(_Echo())
+    # Excelで開けるようにBOMを付ける
+    yield '\ufeff'.encode() + writer.writerow(field_names).encode()
+    for row in rows:
+        yield writer.writerow([
+            # ネストした値（avatar_variantsなど）はJSON文字列にする
+            _dump(row[name]) if isinstance(row[name], (dict, list)) else row[name]
+            for name in field_names
+        ]).encode()
+
+
+def iter_gzip(chunks, level=6, min_flush_size=64 * 1024):
+    """バイト列のイテレーターをgzip形式で逐次圧縮"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if data:
+            yield data
+        # 小さい行ごとに空のチャンクを返さないよう、一定量ごとにフラッシュする
+        if pending >= min_flush_size:
+            data = compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+            pending = 0
+    yield compressor.flush()
+
+
+def iter_export(export_format, queryset=None, fields=None, chunk_size=1000,
+                request=None, compress=False):
+    """エクスポート内容をバイト列のチャンクで返す"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'未対応の形式です: {export_format}')
+
+    plan = get_export_plan(fields)
+    rows = iter_rows(plan, queryset, chunk_size, request)
+    if export_format == FORMAT_CSV:
+        chunks = iter_csv(rows, plan.names)
+    else:
+        chunks = iter_ndjson(rows)
+
+    if compress:
+        chunks = iter_gzip(chunks)
+    return chunks
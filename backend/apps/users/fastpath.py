@@ -0,0 +1,111 @@
+"""
+ユーザー一覧・詳細の高速な読み取り用シリアライズ
+
+モデルインスタンスを生成せずに.values()の行を取得し、事前に組み立てた
+フィールドごとの変換関数で表現に変換する。
+出力はModelSerializerのto_representationと同じになる。
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _identity(value, request):
+    return value
+
+
+def _boolean(value, request):
+    return bool(value)
+
+
+def _make_file_converter(storage):
+    """FileField/ImageField（use_url=True）と同じURLを生成"""
+
+    def convert(value, request):
+        if not value:
+            return None
+        url = storage.url(value)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    return convert
+
+
+def _make_field_converter(field):
+    def convert(value, request):
+        return field.to_representation(value)
+
+    return convert
+
+
+class ValuesPlan:
+    """シリアライザーのフィールドから組み立てた変換計画"""
+
+    def __init__(self, names, columns, converters):
+        self.names = names
+        self.columns = columns
+        self.converters = converters
+
+    def render(self, row, request=None):
+        """.values()の1行を表現（dict）に変換"""
+        ret = {}
+        for name, column, convert in zip(self.names, self.columns, self.converters):
+            value = row[column]
+            # ModelSerializerと同様、Noneは変換せずにそのまま出力
+            ret[name] = None if value is None else convert(value, request)
+        return ret
+
+    def render_many(self, rows, request=None):
+        return [self.render(row, request) for row in rows]
+
+
+_plans = {}
+
+
+def get_values_plan(serializer_class, fields=None):
+    """変換計画を取得（シリアライザー・フィールドの組み合わせごとに1回だけ組み立てる）
+
+    モデルのカラムに対応しないフィールドがある場合はNoneを返す。
+    """
+    key = (serializer_class, fields)
+    if key in _plans:
+        return _plans[key]
+
+    serializer = serializer_class(context={'fields': fields})
+    model = serializer.Meta.model
+
+    names, columns, converters = [], [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            _plans[key] = None
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            _plans[key] = None
+            return None
+
+        if hasattr(field, 'make_values_converter'):
+            converter = field.make_values_converter()
+        elif isinstance(field, serializers.FileField):
+            if not getattr(field, 'use_url', True):
+                converter = _make_field_converter(field)
+            else:
+                converter = _make_file_converter(model_field.storage)
+        elif isinstance(field, serializers.BooleanField):
+            converter = _boolean
+        elif type(field) in (serializers.CharField, serializers.EmailField, serializers.IntegerField):
+            # DBから取得した値がそのまま表現になる
+            converter = _identity
+        else:
+            converter = _make_field_converter(field)
+
+        names.append(name)
+        columns.append(model_field.attname)
+        converters.append(converter)
+
+    plan = ValuesPlan(tuple(names), tuple(columns), tuple(converters))
+    _plans[key] = plan
+    return plan
@@ -0,0 +1,272 @@
+"""
+ユーザーの一括インポート
+
+入力（CSV / NDJSON）を1行ずつ読み込み、batch_size件ごとに次の順で処理する。
+1. メールアドレスを正規化し、入力内・DBの既存ユーザーとの重複を除外
+2. 平文のパスワードのみプロセスプールでハッシュ化（ハッシュ済みの値はそのまま使用し、
+   検証できない方式のハッシュは不正として除外）
+3. bulk_createで1回のINSERTにまとめて保存し、チャンクごとにコミット
+
+コミットごとに処理済みの行数をチェックポイントファイルに記録し、中断後は続きから再開する。
+"""
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import transaction
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+IMPORT_FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+
+_TRUE_VALUES = ('1', 'true', 'yes', 't', 'y')
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith(('.ndjson', '.jsonl')):
+        return FORMAT_NDJSON
+    return FORMAT_CSV
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, 'r', encoding='utf-8-sig', newline='')
+
+
+def iter_records(f, input_format):
+    """入力を1件ずつdictで返す"""
+    if input_format == FORMAT_NDJSON:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(f)
+
+
+PASSWORD_PLAIN = 'plain'
+PASSWORD_HASHED = 'hashed'
+PASSWORD_UNUSABLE = 'unusable'
+PASSWORD_UNSUPPORTED = 'unsupported'
+
+
+def _hasher_algorithms():
+    """Djangoが提供するハッシュ方式の名前（PASSWORD_HASHERSで無効なものも含む）"""
+    return {
+        value.algorithm
+        for value in vars(hashers).values()
+        if isinstance(value, type) and issubclass(value, hashers.BasePasswordHasher)
+        and value.algorithm
+    }
+
+
+def classify_password(password):
+    """パスワードの値の種類を判定する
+
+    - hashed: PASSWORD_HASHERSで検証できるハッシュ（そのまま保存）
+    - unusable: 使用不可のパスワード（!で始まる。そのまま保存）
+    - unsupported: ハッシュの形式だが、方式がPASSWORD_HASHERSにない、または方式に必要な
+      ライブラリ（bcryptなど）がインストールされていない（平文として扱わず不正とする）
+    - plain: 平文（ハッシュ化して保存）
+    """
+    if password.startswith(hashers.UNUSABLE_PASSWORD_PREFIX):
+        return PASSWORD_UNUSABLE
+    try:
+        hasher = identify_hasher(password)
+    except ValueError:
+        algorithm, separator, _ = password.partition('$')
+        if separator and algorithm in _hasher_algorithms():
+            return PASSWORD_UNSUPPORTED
+        return PASSWORD_PLAIN
+    if hasher.library:
+        try:
+            hasher._load_library()
+        except ValueError:
+            return PASSWORD_UNSUPPORTED
+    return PASSWORD_HASHED
+
+
+class UserImporter:
+    """CSV / NDJSONからユーザーを一括作成する
+
+    取り込む列: email（必須）, password, first_name, last_name, display_name, bio, is_active
+    """
+
+    def __init__(self, path, input_format=None, batch_size=1000, workers=None,
+                 checkpoint_path=None, dry_run=False):
+        self.path = path
+        self.input_format = input_format or detect_format(path)
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_path = checkpoint_path or f'{path}.checkpoint'
+        self.dry_run = dry_run
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, position):
+        # 書き込み途中で中断されても壊れないよう、置き換えで更新
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(position))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self, progress=None):
+        """インポートを実行して統計を返す（progressはバッチごとに統計を受け取る）"""
+        started = time.monotonic()
+        # ドライランでは進捗を記録・参照しない
+        skip = 0 if self.dry_run else self.read_checkpoint()
+        if skip:
+            logger.info('%s: %s行目から再開します', self.path, skip + 1)
+
+        stats = {
+            'read': 0,
+            'created': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'hashed': 0,
+            'resumed_from': skip,
+            'dry_run': self.dry_run,
+        }
+
+        # フォークするとDB接続のソケットを子プロセスと共有するため、spawnで起動する
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+        with pool, _open_text(self.path) as f:
+            position = 0
+            batch = []
+            for record in iter_records(f, self.input_format):
+                position += 1
+                if position <= skip:
+                    continue
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, pool, stats)
+                    self._finish_batch(position, stats, started, progress)
+                    batch = []
+            if batch:
+                self._import_batch(batch, pool, stats)
+                self._finish_batch(position, stats, started, progress)
+
+        if not self.dry_run and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        return self._with_throughput(stats, started)
+
+    def _finish_batch(self, position, stats, started, progress):
+        if not self.dry_run:
+            self.write_checkpoint(position)
+        if progress is not None:
+            progress(self._with_throughput(stats, started))
+
+    def _with_throughput(self, stats, started):
+        elapsed = time.monotonic() - started
+        return {
+            **stats,
+            'elapsed': elapsed,
+            'rows_per_second': stats['read'] / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def _import_batch(self, records, pool, stats):
+        stats['read'] += len(records)
+
+        # メールアドレスの正規化と入力内の重複除外
+        rows = {}
+        for record in records:
+            email = User.objects.normalize_email((record.get('email') or '').strip())
+            if '@' not in email:
+                stats['invalid'] += 1
+                continue
+            key = email.lower()
+            if key in rows:
+                stats['duplicates'] += 1
+                continue
+            rows[key] = (email, record)
+
+        # DBの既存ユーザーとの重複除外（以前のバッチで作成したユーザーも含む）
+        if rows:
+            existing = User.objects.filter(
+                email__in=[email for email, _ in rows.values()]
+            ).values_list('email', flat=True)
+            for email in existing:
+                if rows.pop(email.lower(), None) is not None:
+                    stats['duplicates'] += 1
+
+        # 平文のパスワードのみハッシュ化の対象（空の場合は使用不可のパスワード）。
+        # 方式が未対応のハッシュを平文としてハッシュ化すると、元のパスワードでログインできなくなるため不正とする
+        entries = []
+        plain = []
+        for email, record in rows.values():
+            password = record.get('password') or None
+            if password is not None:
+                kind = classify_password(password)
+                if kind == PASSWORD_UNSUPPORTED:
+                    stats['invalid'] += 1
+                    continue
+                if kind == PASSWORD_PLAIN:
+                    plain.append(len(entries))
+            entries.append((email, record, password))
+
+        if not entries:
+            return
+
+        if self.dry_run:
+            stats['created'] += len(entries)
+            return
+
+        passwords = [password for _, _, password in entries]
+        if plain:
+            chunksize = max(1, len(plain) // (self.workers * 4))
+            hashed = pool.map(make_password, [passwords[i] for i in plain], chunksize=chunksize)
+            for i, password in zip(plain, hashed):
+                passwords[i] = password
+            stats['hashed'] += len(plain)
+
+        users = []
+        for (email, record, _), password in zip(entries, passwords):
+            if password is None:
+                password = make_password(None)
+            is_active = record.get('is_active', True)
+            if isinstance(is_active, str):
+                is_active = is_active.strip().lower() in _TRUE_VALUES
+            users.append(User(
+                email=email,
+                password=password,
+                first_name=record.get('first_name') or '',
+                last_name=record.get('last_name') or '',
+                display_name=record.get('display_name') or '',
+                bio=record.get('bio') or '',
+                is_active=bool(is_active),
+            ))
+
+        emails = [user.email for user in users]
+        with transaction.atomic():
+            # ignore_conflictsでは挿入されなかった行が分からないため、前後の件数の差を作成数とする
+            # （REPEATABLE READでは同じスナップショットで数えるため、他のトランザクションの作成は含まれない）
+            before = User.objects.filter(email__in=emails).count()
+            # 同時に作成されたユーザーとの競合は無視する
+            User.objects.bulk_create(users, batch_size=self.batch_size, ignore_conflicts=True)
+            created = User.objects.filter(email__in=emails).count() - before
+        stats['created'] += created
+        stats['duplicates'] += len(users) - created
@@ -0,0 +1,73 @@
+"""
+ユーザーをNDJSON / CSVでエクスポートするコマンド
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users import export
+from apps.users.serializers import UserSerializer
+
+
+class Command(BaseCommand):
+    help = 'ユーザーをNDJSONまたはCSVでエクスポートします（UserSerializerと同じフィールド）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=export.EXPORT_FORMATS,
+            default=export.FORMAT_NDJSON,
+            help='出力形式',
+        )
+        parser.add_argument(
+            '--output',
+            '-o',
+            help='出力先のファイル（省略時は標準出力）',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='gzipで圧縮する',
+        )
+        parser.add_argument(
+            '--fields',
+            help='出力するフィールド（カンマ区切り）',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='1回に取得するユーザー数',
+        )
+
+    def handle(self, *args, **options):
+        fields = None
+        if options['fields']:
+            allowed = UserSerializer.Meta.fields
+            fields = tuple(name.strip() for name in options['fields'].split(',') if name.strip())
+            unknown = [name for name in fields if name not in allowed]
+            if unknown:
+                raise CommandError(f'指定できないフィールドです: {", ".join(unknown)}')
+            fields = tuple(name for name in allowed if name in fields)
+
+        chunks = export.iter_export(
+            options['format'],
+            fields=fields,
+            chunk_size=options['chunk_size'],
+            compress=options['gzip'],
+        )
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+
+        # 標準出力に書き出した場合は出力内容と混ざらないよう標準エラーに表示
+        self.stderr.write(self.style.SUCCESS(f'完了: {written}バイトを出力しました'))
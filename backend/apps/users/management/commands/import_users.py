@@ -0,0 +1,70 @@
+"""
+CSV / NDJSONからユーザーを一括作成するコマンド
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.importer import IMPORT_FORMATS, UserImporter
+
+
+class Command(BaseCommand):
+    help = 'CSVまたはNDJSON（.gz可）からユーザーを一括作成します（既存のメールアドレスはスキップ）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='入力ファイル')
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help='入力形式（省略時は拡張子から判定）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='1回に作成するユーザー数',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='パスワードをハッシュ化するプロセス数（省略時はCPU数）',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='進捗を記録するファイル（省略時は入力ファイル名.checkpoint）',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='作成せずに件数のみ表示',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size は1以上を指定してください')
+
+        importer = UserImporter(
+            options['path'],
+            input_format=options['format'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            checkpoint_path=options['checkpoint'],
+            dry_run=options['dry_run'],
+        )
+
+        def progress(stats):
+            self.stdout.write(
+                f'{stats["read"]}行処理しました '
+                f'(作成 {stats["created"]}, 重複 {stats["duplicates"]}, '
+                f'{stats["rows_per_second"]:.1f} rows/s)'
+            )
+
+        try:
+            stats = importer.run(progress=progress)
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+
+        prefix = '[dry run] ' if stats['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}完了: {stats["created"]}件作成、{stats["duplicates"]}件重複、'
+            f'{stats["invalid"]}件不正 '
+            f'({stats["read"]}行, {stats["elapsed"]:.1f}秒, {stats["rows_per_second"]:.1f} rows/s)'
+        ))
@@ -3,6 +3,7 @@
 """
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -43,11 +44,19 @@ class User(AbstractUser):
     # プロフィール情報
     display_name = models.CharField(_('表示名'), max_length=50, blank=True)
     avatar = models.ImageField(_('アバター'), upload_to='avatars/', null=True, blank=True)
+    # 処理済みアバターの内容ハッシュ（各サイズの画像の保存先、apps.users.avatars）
+    avatar_hash = models.CharField(_('アバターハッシュ'), max_length=64, blank=True)
     bio = models.TextField(_('自己紹介'), max_length=500, blank=True)
     
     # Google OAuth関連
     google_id = models.CharField(_('Google ID'), max_length=255, blank=True, null=True)
     
+    # JWT無効化用のバージョン（増やすと発行済みトークンが無効になる）
+    token_version = models.PositiveIntegerField(_('トークンバージョン'), default=0)
+    
+    # 最終アクセス日時（apps.users.activityでまとめて更新）
+    last_seen = models.DateTimeField(_('最終アクセス日時'), null=True, blank=True)
+    
     # タイムスタンプ
     created_at = models.DateTimeField(_('作成日時'), auto_now_add=True)
     updated_at = models.DateTimeField(_('更新日時'), auto_now=True)
@@ -61,6 +70,10 @@ class User(AbstractUser):
         verbose_name = _('ユーザー')
         verbose_name_plural = _('ユーザー')
         ordering = ['-created_at']
+        indexes = [
+            # キーセットページネーション用（created_at, id）
+            models.Index(fields=['created_at', 'id'], name='users_created_at_id_idx'),
+        ]
     
     def __str__(self):
         return self.email
@@ -71,3 +84,38 @@ class User(AbstractUser):
             return self.display_name
         return self.email.split('@')[0]
 
+
+class EmailOutbox(models.Model):
+    """送信待ちメール（ユーザー作成と同じトランザクションで登録し、Celeryでまとめて送信）"""
+    
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('送信待ち')),
+        (STATUS_SENDING, _('送信中')),
+        (STATUS_SENT, _('送信済み')),
+        (STATUS_FAILED, _('送信失敗')),
+    )
+    
+    to_email = models.EmailField(_('宛先'))
+    subject = models.CharField(_('件名'), max_length=255)
+    body = models.TextField(_('本文'))
+    status = models.CharField(_('状態'), max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(_('試行回数'), default=0)
+    next_attempt_at = models.DateTimeField(_('次回送信日時'), default=timezone.now)
+    claimed_at = models.DateTimeField(_('取得日時'), null=True, blank=True)
+    last_error = models.TextField(_('最後のエラー'), blank=True)
+    created_at = models.DateTimeField(_('作成日時'), auto_now_add=True)
+    sent_at = models.DateTimeField(_('送信日時'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('送信待ちメール')
+        verbose_name_plural = _('送信待ちメール')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='users_outbox_status_next_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.to_email}: {self.subject}'
@@ -0,0 +1,122 @@
+"""
+メール送信アウトボックス
+
+メールはユーザー作成と同じトランザクションでEmailOutboxに登録し、
+drain_email_outboxタスクがバッチで取得して1つのSMTP接続でまとめて送信する。
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# 再送間隔（試行回数ごとに倍増）
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+# 送信中のまま残った行（ワーカー停止など）を再取得するまでの時間
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def enqueue_email(to_email, subject, body):
+    """メールを送信待ちに登録（呼び出し元のトランザクションに含まれる）"""
+    return EmailOutbox.objects.create(to_email=to_email, subject=subject, body=body)
+
+
+def enqueue_welcome_email(user_email, user_name):
+    """ウェルカムメールを送信待ちに登録"""
+    return enqueue_email(
+        user_email,
+        'ようこそ！',
+        f'{user_name}さん、ご登録ありがとうございます。',
+    )
+
+
+def claim_batch(batch_size):
+    """送信対象の行を取得して送信中にする（複数ワーカーで重複しない）"""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now) |
+                Q(status=EmailOutbox.STATUS_SENDING, claimed_at__lt=now - CLAIM_TIMEOUT)
+            )
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if rows:
+            EmailOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+                status=EmailOutbox.STATUS_SENDING,
+                claimed_at=now,
+            )
+    return rows
+
+
+def drain(batch_size=100):
+    """送信待ちのメールを1つのSMTP接続でまとめて送信し、(送信数, 失敗数) を返す"""
+    rows = claim_batch(batch_size)
+    if not rows:
+        return 0, 0
+
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@example.com')
+    sent = []
+    handled = set()
+    failed = 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for row in rows:
+            message = EmailMessage(
+                row.subject,
+                row.body,
+                from_email,
+                [row.to_email],
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                logger.warning('メール送信に失敗しました (id=%s): %s', row.pk, e)
+                _schedule_retry(row, e)
+                failed += 1
+            else:
+                sent.append(row.pk)
+            handled.add(row.pk)
+    except Exception as e:
+        # 接続自体に失敗した場合は未送信の行をすべて再試行にする
+        logger.warning('SMTP接続に失敗しました: %s', e)
+        for row in rows:
+            if row.pk not in handled:
+                _schedule_retry(row, e)
+                failed += 1
+    finally:
+        connection.close()
+
+    if sent:
+        EmailOutbox.objects.filter(pk__in=sent).update(
+            status=EmailOutbox.STATUS_SENT,
+            sent_at=timezone.now(),
+            last_error='',
+        )
+
+    return len(sent), failed
+
+
+def _schedule_retry(row, error):
+    row.attempts += 1
+    row.last_error = str(error)
+    if row.attempts >= MAX_ATTEMPTS:
+        row.status = EmailOutbox.STATUS_FAILED
+    else:
+        delay = min(RETRY_BASE_DELAY * (2 ** (row.attempts - 1)), RETRY_MAX_DELAY)
+        row.status = EmailOutbox.STATUS_PENDING
+        row.next_attempt_at = timezone.now() + delay
+    row.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
@@ -0,0 +1,159 @@
+"""
+ユーザー関連のページネーション
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _get_position(obj):
+    """(created_at, id) を取得（.values()の行にも対応）"""
+    if isinstance(obj, dict):
+        return obj['created_at'], obj['id']
+    return obj.created_at, obj.pk
+
+
+class KeysetPagination(BasePagination):
+    """キーセット（カーソル）ページネーション
+
+    (created_at, id) の降順で並べ、直前のページの末尾の値を起点に取得するため、
+    COUNT(*)やOFFSETによるスキャンが発生しない。
+    ?include_total=1 を指定した場合のみ、おおよその総件数を返す。
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    total_query_param = 'include_total'
+    total_cache_timeout = 60
+    invalid_cursor_message = '無効なカーソルです。'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.total = None
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['r']
+
+        if cursor is not None:
+            created_at, pk = cursor['c'], cursor['i']
+            if reverse:
+                position = Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            else:
+                position = Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            queryset = queryset.filter(position)
+
+        ordering = ('created_at', 'pk') if reverse else ('-created_at', '-pk')
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # 前後のページの有無
+        if reverse:
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+
+        if request.query_params.get(self.total_query_param):
+            self.total = self.get_approximate_total(queryset.model)
+
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.total is not None:
+            response['approximate_count'] = self.total
+        response['results'] = data
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        created_at, pk = _get_position(instance)
+        payload = json.dumps({
+            'c': created_at.isoformat(),
+            'i': pk,
+            'r': reverse,
+        }, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(encoded + padding))
+            cursor['c'] = parse_datetime(cursor['c'])
+            cursor['i'] = int(cursor['i'])
+            cursor['r'] = bool(cursor['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if cursor['c'] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def get_approximate_total(self, model):
+        """おおよその総件数（MySQLはテーブル統計を使用し、COUNT(*)を避ける）"""
+        cache_key = f'pagination:approximate_total:{model._meta.db_table}'
+        total = cache.get(cache_key)
+        if total is not None:
+            return total
+
+        connection = connections[model.objects.db]
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                    [model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            total = int(row[0] or 0) if row else 0
+        else:
+            total = model.objects.count()
+
+        cache.set(cache_key, total, self.total_cache_timeout)
+        return total
@@ -0,0 +1,72 @@
+"""
+大量削除用のバッチ処理
+
+主キー順に一定件数ずつ削除し、チャンクごとにコミットする。
+進捗（最後に処理した主キー）をキャッシュに記録し、中断後は続きから再開する。
+"""
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BatchPurger:
+    """クエリセットに一致する行をチャンク単位で削除する"""
+    checkpoint_timeout = 60 * 60 * 24
+
+    def __init__(self, queryset, name, chunk_size=500, dry_run=False):
+        self.queryset = queryset
+        self.name = name
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+
+    @property
+    def checkpoint_key(self):
+        return f'purge:checkpoint:{self.name}'
+
+    def run(self):
+        """削除を実行して統計を返す"""
+        started = time.monotonic()
+        # ドライランでは進捗を記録・参照しない
+        last_pk = 0 if self.dry_run else cache.get(self.checkpoint_key, 0)
+        if last_pk:
+            logger.info('%s: 主キー %s から再開します', self.name, last_pk)
+
+        matched = 0
+        deleted = 0
+
+        while True:
+            pks = list(
+                self.queryset.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:self.chunk_size]
+            )
+            if not pks:
+                break
+
+            matched += len(pks)
+            if not self.dry_run:
+                with transaction.atomic():
+                    # 主キーの取得後に条件から外れた行（再びアクティブになったユーザーなど）は削除しない。
+                    # 関連オブジェクトのカスケード削除もチャンク単位に収まる
+                    _, counts = self.queryset.filter(pk__in=pks).delete()
+                deleted += counts.get(self.queryset.model._meta.label, 0)
+
+            last_pk = pks[-1]
+            if not self.dry_run:
+                cache.set(self.checkpoint_key, last_pk, self.checkpoint_timeout)
+
+        if not self.dry_run:
+            cache.delete(self.checkpoint_key)
+
+        elapsed = time.monotonic() - started
+        return {
+            'matched': matched,
+            'deleted': deleted,
+            'elapsed': elapsed,
+            'rows_per_second': matched / elapsed if elapsed > 0 else 0.0,
+            'dry_run': self.dry_run,
+        }
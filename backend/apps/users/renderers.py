@@ -0,0 +1,41 @@
+"""
+ユーザー関連のレンダラー
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjsonがない環境では標準のJSONRendererと同じ処理になる
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """orjsonを使用するJSONレンダラー
+
+    出力はJSONRendererのデフォルト設定（コンパクト・ensure_ascii=False）と同じバイト列になる。
+    日時などorjsonの形式が異なる型はDRFのJSONEncoderで変換する。
+    """
+
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        # orjsonがない場合・インデント指定や非デフォルト設定の場合はJSONRendererに任せる
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self._encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # JSONRendererと同様にU+2028/U+2029をエスケープ
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
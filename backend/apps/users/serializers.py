@@ -1,12 +1,54 @@
 """
 ユーザー関連のシリアライザー
 """
+from django.conf import settings
+from django.core.validators import validate_image_file_extension
+from django.db import transaction
 from rest_framework import serializers
+from . import avatars
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """contextの'fields'で出力するフィールドを絞り込む（未指定の場合はすべて）
+
+    不要なフィールドは生成前に取り除くため、アバターURLの組み立てなども行わない。
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class AvatarVariantsField(serializers.Field):
+    """処理済みアバター画像のサイズ・形式ごとのURL（avatar_hashから生成）"""
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'avatar_hash')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        if not value:
+            return None
+        return avatars.variant_urls(value, self.context.get('request'))
+    
+    def make_values_converter(self):
+        """高速シリアライズ（apps.users.fastpath）用の変換関数"""
+        
+        def convert(value, request):
+            return avatars.variant_urls(value, request) if value else None
+        
+        return convert
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """ユーザーシリアライザー"""
+    avatar_variants = AvatarVariantsField()
     
     class Meta:
         model = User
@@ -15,6 +57,7 @@ class UserSerializer(serializers.ModelSerializer):
             'email',
             'display_name',
             'avatar',
+            'avatar_variants',
             'bio',
             'is_active',
             'created_at',
@@ -23,8 +66,9 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'email', 'created_at', 'updated_at')
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """ユーザープロフィールシリアライザー（詳細情報）"""
+    avatar_variants = AvatarVariantsField()
     
     class Meta:
         model = User
@@ -35,6 +79,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'last_name',
             'display_name',
             'avatar',
+            'avatar_variants',
             'bio',
             'is_active',
             'created_at',
@@ -44,7 +89,17 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
-    """ユーザー更新シリアライザー"""
+    """ユーザー更新シリアライザー
+
+    アバター画像はリクエスト中にデコードせず一時保存のみ行い、
+    リサイズなどはCeleryタスク（process_avatar）で行う。nullを指定すると削除する。
+    レスポンスのavatarは処理が完了するまで更新前の画像のURLになる。
+    """
+    avatar = serializers.FileField(
+        required=False,
+        allow_null=True,
+        validators=[validate_image_file_extension],
+    )
     
     class Meta:
         model = User
@@ -55,4 +110,47 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             'avatar',
             'bio',
         )
+    
+    def validate_avatar(self, value):
+        max_size = getattr(settings, 'AVATAR_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+        if value is not None and value.size > max_size:
+            raise serializers.ValidationError(
+                f'画像のサイズは{max_size // (1024 * 1024)}MB以下にしてください。'
+            )
+        return value
+    
+    def update(self, instance, validated_data):
+        upload = None
+        if 'avatar' in validated_data:
+            upload = validated_data.pop('avatar')
+            if upload is None:
+                validated_data['avatar'] = None
+                validated_data['avatar_hash'] = ''
+        
+        instance = self.save_fields(instance, validated_data)
+        if upload is not None:
+            path = avatars.save_upload(upload)
+            # 更新がコミットされてからタスクを登録
+            from .tasks import process_avatar
+            transaction.on_commit(lambda: process_avatar.delay(instance.pk, path))
+        return instance
+    
+    def save_fields(self, instance, validated_data):
+        """変更したフィールドのみ保存する
+
+        全列を書き込むと、同時に更新されたlast_login・last_seen（apps.users.activity）や
+        アバター処理（process_avatar）の結果を古い値で上書きしてしまう。
+        """
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
 
+class UserBatchQuerySerializer(serializers.Serializer):
+    """ユーザー一括取得のクエリ"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=200,
+    )
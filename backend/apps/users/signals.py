@@ -0,0 +1,15 @@
+"""
+ユーザー関連のシグナル
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, using, **kwargs):
+    """ユーザーの保存・削除時にキャッシュを無効化"""
+    user_cache.invalidate_on_commit(instance.pk, using=using)
@@ -2,38 +2,46 @@
 ユーザー関連のCeleryタスク
 """
 from celery import shared_task
-from django.core.mail import send_mail
-from django.conf import settings
 
 
 @shared_task
 def send_welcome_email(user_email, user_name):
     """
     新規ユーザーにウェルカムメールを送信
+    
+    メールは送信待ちに登録し、drain_email_outboxでまとめて送信する。
     """
-    subject = 'ようこそ！'
-    message = f'{user_name}さん、ご登録ありがとうございます。'
-    from_email = settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@example.com'
+    from .outbox import enqueue_welcome_email
     
-    send_mail(
-        subject,
-        message,
-        from_email,
-        [user_email],
-        fail_silently=False,
-    )
+    enqueue_welcome_email(user_email, user_name)
+    
+    return f'Welcome email queued for {user_email}'
+
+
+@shared_task
+def drain_email_outbox(batch_size=100):
+    """
+    送信待ちのメールをバッチで取得し、1つのSMTP接続でまとめて送信（定期実行）
+    """
+    from .outbox import drain
+    
+    sent, failed = drain(batch_size=batch_size)
     
-    return f'Welcome email sent to {user_email}'
+    return f'Sent {sent} emails ({failed} failed)'
 
 
 @shared_task
-def cleanup_inactive_users():
+def cleanup_inactive_users(dry_run=False, chunk_size=500):
     """
     非アクティブユーザーのクリーンアップ（定期実行タスクの例）
+    
+    主キー順にchunk_size件ずつ削除・コミットするため、テーブル全体をロックせず
+    メモリ使用量も一定。中断された場合は次回の実行で続きから再開する。
     """
     from django.utils import timezone
     from datetime import timedelta
     from .models import User
+    from .purge import BatchPurger
     
     # 30日以上非アクティブなユーザーを取得
     thirty_days_ago = timezone.now() - timedelta(days=30)
@@ -42,8 +50,65 @@ def cleanup_inactive_users():
         created_at__lt=thirty_days_ago
     )
     
-    count = inactive_users.count()
-    inactive_users.delete()
+    stats = BatchPurger(
+        inactive_users,
+        'cleanup_inactive_users',
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+    ).run()
+    
+    if dry_run:
+        return f'[dry run] {stats["matched"]} inactive users would be deleted'
+    
+    return (
+        f'Deleted {stats["deleted"]} inactive users '
+        f'({stats["rows_per_second"]:.1f} rows/s)'
+    )
+
+
+@shared_task
+def process_avatar(user_id, upload_path):
+    """
+    アップロードされたアバター画像から各サイズの画像を生成してユーザーに設定
+    
+    生成した画像は内容ハッシュごとに保存されるため、同じ画像は再生成しない。
+    一時保存したアップロードは処理後に削除する。
+    """
+    from django.core.files.storage import default_storage
+    from PIL import Image, UnidentifiedImageError
+    from .avatars import default_variant_path, process_upload
+    from .models import User
+    
+    try:
+        try:
+            content_hash = process_upload(upload_path)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            return f'Invalid avatar for user {user_id}: {e}'
+        
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return f'User {user_id} not found'
+        
+        user.avatar.name = default_variant_path(content_hash)
+        user.avatar_hash = content_hash
+        # post_saveでユーザーキャッシュも無効化される
+        user.save(update_fields=['avatar', 'avatar_hash', 'updated_at'])
+    finally:
+        default_storage.delete(upload_path)
     
-    return f'Deleted {count} inactive users'
+    return f'Avatar processed for user {user_id} ({content_hash[:12]})'
 
+
+@shared_task
+def flush_user_activity(batch_size=500):
+    """
+    溜めた最終ログイン・最終アクセス日時をまとめてDBに書き込む（定期実行）
+    """
+    from .activity import activity_recorder
+    
+    counts = activity_recorder.flush(batch_size=batch_size)
+    
+    return (
+        f'Flushed last_login for {counts["last_login"]} users, '
+        f'last_seen for {counts["last_seen"]} users'
+    )
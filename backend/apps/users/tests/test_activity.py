@@ -0,0 +1,61 @@
+"""
+アクティビティ日時の記録（apps.users.activity）のテスト
+"""
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.users.activity import ActivityRecorder
+from apps.users.models import User
+
+
+class FakeRedis:
+    """ActivityRecorderが使用するハッシュ操作のみのRedis"""
+
+    def __init__(self):
+        self.data = {}
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = str(value)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def rename(self, key, new_key):
+        self.data[new_key] = self.data.pop(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class ActivityRecorderTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('activity@example.com', 'password')
+        self.recorder = ActivityRecorder()
+        self.when = datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc)
+
+    def test_updates_directly_without_redis(self):
+        self.recorder.record('last_login', self.user.pk, self.when)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, self.when)
+        self.assertEqual(self.recorder.flush(), {'last_login': 0, 'last_seen': 0})
+
+    def test_buffers_in_redis_until_flush(self):
+        client = FakeRedis()
+        with mock.patch('apps.users.activity.get_redis_client', return_value=client):
+            self.recorder.record('last_login', self.user.pk, self.when)
+            self.user.refresh_from_db()
+            self.assertIsNone(self.user.last_login)
+
+            self.assertEqual(self.recorder.flush(), {'last_login': 1, 'last_seen': 0})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, self.when)
+        # 書き込んだバッファは削除される
+        self.assertEqual(client.data, {})
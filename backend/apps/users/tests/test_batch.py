@@ -0,0 +1,70 @@
+"""
+ユーザー一括取得（/api/users/batch/）のテスト
+"""
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+
+
+class UserBatchViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user('viewer@example.com', 'password')
+        cls.users = [
+            User.objects.create_user(f'member{i}@example.com', 'password', bio=f'bio{i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, ids):
+        return self.client.get(reverse('users:batch'), {'ids': ids})
+
+    def test_returns_map_and_misses(self):
+        a, b, _ = self.users
+        response = self.get(f'{b.pk},999999,{a.pk},{b.pk}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results']), [str(b.pk), str(a.pk)])
+        self.assertEqual(response.data['results'][str(a.pk)]['bio'], 'bio0')
+        self.assertEqual(response.data['missing'], [999999])
+
+    def test_same_representation_as_detail(self):
+        user = self.users[0]
+        detail = self.client.get(reverse('users:detail', args=[user.pk]))
+        batch = self.get(str(user.pk))
+        self.assertEqual(batch.data['results'][str(user.pk)], detail.data)
+
+    def test_single_query_then_cache(self):
+        ids = ','.join(str(user.pk) for user in self.users)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get(ids).data['results']), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.get(ids).data['results']), 3)
+
+    def test_updated_user_is_not_served_from_cache(self):
+        user = self.users[0]
+        self.get(str(user.pk))
+        user.bio = 'updated'
+        user.save()
+
+        self.assertEqual(self.get(str(user.pk)).data['results'][str(user.pk)]['bio'], 'updated')
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get(str(self.users[0].pk)).status_code, 401)
+
+    def test_invalid_ids(self):
+        for ids in ('', 'abc', '0', ','.join(str(i) for i in range(1, 202))):
+            with self.subTest(ids=ids[:20]):
+                self.assertEqual(self.get(ids).status_code, 400)
@@ -0,0 +1,70 @@
+"""
+ユーザー表現キャッシュのテスト
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+
+from apps.users.cache import user_cache
+from apps.users.models import User
+
+
+class UserCacheInvalidationTests(TestCase):
+    """保存・削除時の無効化"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cache@example.com', 'password', bio='old')
+
+    def tearDown(self):
+        cache.clear()
+
+    def render(self, bio):
+        return user_cache.get_or_render(self.user.pk, 'variant', lambda: {'bio': bio})
+
+    def test_save_invalidates(self):
+        self.render('old')
+        self.user.bio = 'new'
+        self.user.save()
+        self.assertEqual(self.render('new'), {'bio': 'new'})
+
+    def test_delete_invalidates(self):
+        self.render('old')
+        pk = self.user.pk
+        self.user.delete()
+        self.assertIsNone(
+            user_cache.get_or_render(pk, 'variant', lambda: None)
+        )
+
+    def test_read_racing_uncommitted_write_is_not_reused(self):
+        self.render('old')
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.bio = 'new'
+                self.user.save()
+                # コミット前の読み込み（他の接続からは更新前の行が見える）
+                self.assertEqual(self.render('old'), {'bio': 'old'})
+        # コミット後は更新前の表現を返さない
+        self.assertEqual(self.render('new'), {'bio': 'new'})
+
+    def test_read_racing_uncommitted_write_is_not_reused_by_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.save()
+                found, missing = user_cache.get_many([self.user.pk], 'variant')
+                user_cache.set_many({missing[self.user.pk]: {'bio': 'old'}})
+        found, missing = user_cache.get_many([self.user.pk], 'variant')
+        self.assertEqual(found, {})
+        self.assertIn(self.user.pk, missing)
+
+    def test_rolled_back_write_is_not_invalidated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.user.bio = 'rolled back'
+                    self.user.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.render('old'), {'bio': 'old'})
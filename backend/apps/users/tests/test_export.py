@@ -0,0 +1,120 @@
+"""
+ユーザーの一括エクスポート（/api/users/export/・export_usersコマンド）のテスト
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users import export
+from apps.users.models import User
+from apps.users.serializers import UserSerializer
+
+
+class ExportTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin@example.com', 'password')
+        for index in range(4):
+            User.objects.create_user(
+                f'user{index}@example.com', 'password', bio=f'bio, "{index}"', avatar_hash='a' * 64
+            )
+
+
+class UserExportViewTests(ExportTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('users:export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_matches_detail_representation(self):
+        response, content = self.export()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(User.objects.order_by('pk').values_list('pk', flat=True)))
+        for row in rows:
+            detail = self.client.get(reverse('users:detail', args=[row['id']]))
+            self.assertEqual(row, json.loads(detail.content))
+
+    def test_csv(self):
+        response, content = self.export(type='csv', fields='id,email,bio,avatar_variants')
+
+        self.assertTrue(response['Content-Disposition'].endswith('.csv"'))
+        reader = csv.reader(io.StringIO(content.decode('utf-8-sig')))
+        header, *rows = list(reader)
+        self.assertEqual(header, ['id', 'email', 'avatar_variants', 'bio'])
+        self.assertEqual(len(rows), User.objects.count())
+        user = User.objects.get(email='user0@example.com')
+        row = next(row for row in rows if row[0] == str(user.pk))
+        self.assertEqual(row[3], 'bio, "0"')
+        self.assertIn('a' * 64, json.loads(row[2])['64']['webp'])
+
+    def test_gzip(self):
+        _, plain = self.export()
+        response, compressed = self.export(gzip='1')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    def test_invalid_type(self):
+        response = self.client.get(reverse('users:export'), {'type': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.get(email='user0@example.com'))
+        response = self.client.get(reverse('users:export'))
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportIteratorTests(ExportTestCase):
+
+    def test_walks_table_in_chunks(self):
+        plan = export.get_export_plan(('id',))
+        total = User.objects.count()
+
+        # chunk_size件ずつ取得し、最後に空の結果を確認する
+        with self.assertNumQueries((total + 1) // 2 + 1):
+            rows = list(export.iter_rows(plan, chunk_size=2))
+
+        self.assertEqual(rows, [{'id': pk} for pk in User.objects.order_by('pk').values_list('pk', flat=True)])
+
+    def test_fields_match_serializer(self):
+        self.assertEqual(tuple(export.get_export_plan().names), UserSerializer.Meta.fields)
+
+
+class ExportUsersCommandTests(ExportTestCase):
+
+    def test_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv.gz')
+            call_command(
+                'export_users', format='csv', gzip=True, output=path,
+                fields='email', chunk_size=2, stderr=io.StringIO(),
+            )
+            with gzip.open(path, 'rt', encoding='utf-8-sig') as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual(rows[0], ['email'])
+        self.assertEqual(
+            sorted(row[0] for row in rows[1:]),
+            sorted(User.objects.values_list('email', flat=True)),
+        )
+
+    def test_unknown_field(self):
+        with self.assertRaises(CommandError):
+            call_command('export_users', fields='password', stderr=io.StringIO())
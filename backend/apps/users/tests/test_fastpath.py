@@ -0,0 +1,232 @@
+"""
+ユーザー一覧・詳細の高速シリアライズ（ValuesPlan・FastJSONRenderer）のテスト
+
+出力がUserSerializer + JSONRendererとバイト単位で一致することを確認する。
+"""
+import datetime
+import decimal
+import os
+import time
+import unittest
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.users import renderers
+from apps.users.fastpath import get_values_plan
+from apps.users.models import User
+from apps.users.renderers import FastJSONRenderer
+from apps.users.serializers import UserProfileSerializer, UserSerializer
+
+
+def create_users():
+    """アバター・日時・U+2028などを含むユーザー"""
+    users = [
+        User.objects.create_user('plain@example.com', 'password'),
+        User.objects.create_user(
+            'avatar@example.com', 'password',
+            display_name='表示名\u2028改行', bio='line\u2029separator "quoted" </script>',
+            avatar='avatars/avatar.png', avatar_hash='a' * 64,
+        ),
+        User.objects.create_user('inactive@example.com', 'password', is_active=False),
+    ]
+    # マイクロ秒を含む・UTC以外の時刻
+    User.objects.filter(pk=users[0].pk).update(
+        created_at=datetime.datetime(2024, 2, 29, 23, 59, 59, 123456, tzinfo=datetime.timezone.utc),
+    )
+    User.objects.filter(pk=users[2].pk).update(
+        updated_at=datetime.datetime(2024, 1, 1, 9, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=9))),
+    )
+    return users
+
+
+class ValuesPlanTests(TestCase):
+    """ValuesPlanとシリアライザーの表現の一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users()
+
+    def setUp(self):
+        self.request = APIRequestFactory().get('/api/users/')
+
+    def assert_same_representation(self, serializer_class, fields=None):
+        plan = get_values_plan(serializer_class, fields)
+        rows = User.objects.order_by('pk').values(*plan.columns)
+        context = {'request': self.request, 'fields': fields}
+        for user, row in zip(User.objects.order_by('pk'), rows):
+            expected = serializer_class(user, context=context).data
+            self.assertEqual(plan.render(row, self.request), dict(expected))
+
+    def test_user_serializer(self):
+        self.assert_same_representation(UserSerializer)
+
+    def test_profile_serializer(self):
+        self.assert_same_representation(UserProfileSerializer)
+
+    def test_sparse_fields(self):
+        self.assert_same_representation(UserSerializer, ('id', 'avatar', 'avatar_variants'))
+
+    def test_urls_without_request(self):
+        plan = get_values_plan(UserSerializer)
+        user = self.users[1]
+        row = User.objects.values(*plan.columns).get(pk=user.pk)
+        self.assertEqual(plan.render(row), dict(UserSerializer(user).data))
+
+
+class FastJSONRendererTests(TestCase):
+    """FastJSONRendererとJSONRendererの出力の一致"""
+
+    data = OrderedDict([
+        ('text', 'non-ascii 日本語 \u2028 \u2029 "quoted" \\ </script>'),
+        ('naive', datetime.datetime(2024, 1, 1, 12, 0, 0, 123456)),
+        ('aware', datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)),
+        ('offset', datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=9)))),
+        ('date', datetime.date(2024, 1, 1)),
+        ('time', datetime.time(12, 30, 15, 500)),
+        ('duration', datetime.timedelta(hours=1, seconds=5)),
+        ('decimal', decimal.Decimal('1.10')),
+        ('uuid', uuid.UUID('12345678-1234-5678-1234-567812345678')),
+        ('nested', [{'id': 1, 'flag': True, 'none': None, 'float': 1.5}]),
+    ])
+
+    def assert_same_output(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assert_same_output(self.data)
+
+    def test_same_bytes_without_orjson(self):
+        original = renderers.orjson
+        renderers.orjson = None
+        try:
+            self.assert_same_output(self.data)
+        finally:
+            renderers.orjson = original
+
+    def test_none_renders_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_indent_is_delegated(self):
+        renderer_context = {'indent': 2}
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, renderer_context=renderer_context),
+            JSONRenderer().render(self.data, renderer_context=renderer_context),
+        )
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class FastReadViewTests(TestCase):
+    """一覧・詳細ビューのレスポンスとUserSerializer + JSONRendererの一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users()
+        cls.admin = User.objects.create_superuser('admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def tearDown(self):
+        cache.clear()
+
+    def expected_list(self, response, fields=None):
+        users = User.objects.order_by('-created_at', '-pk')
+        context = {'request': response.wsgi_request, 'fields': fields}
+        return JSONRenderer().render(OrderedDict([
+            ('next', None),
+            ('previous', None),
+            ('results', UserSerializer(users, many=True, context=context).data),
+        ]))
+
+    def expected_detail(self, response, user, fields=None):
+        context = {'request': response.wsgi_request, 'fields': fields}
+        return JSONRenderer().render(UserSerializer(user, context=context).data)
+
+    def test_list(self):
+        response = self.client.get(reverse('users:list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.expected_list(response))
+        self.assertIn(b'\\u2028', response.content)
+
+    def test_list_sparse_fields(self):
+        response = self.client.get(reverse('users:list'), {'fields': 'id,avatar_variants'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.content, self.expected_list(response, ('id', 'avatar_variants'))
+        )
+
+    def test_detail(self):
+        for user in self.users:
+            response = self.client.get(reverse('users:detail', args=[user.pk]))
+            self.assertEqual(response.status_code, 200)
+            user.refresh_from_db()
+            self.assertEqual(response.content, self.expected_detail(response, user))
+
+    def test_cached_detail(self):
+        user = self.users[1]
+        url = reverse('users:detail', args=[user.pk])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.content, self.expected_detail(response, user))
+
+
+@unittest.skipUnless(os.environ.get('USERS_FASTPATH_BENCHMARK'), 'USERS_FASTPATH_BENCHMARK=1 で実行')
+class FastPathBenchmark(TestCase):
+    """一覧1ページ分のシリアライズ・描画時間の計測
+
+    USERS_FASTPATH_BENCHMARK=1 python manage.py test apps.users.tests.test_fastpath --settings=config.settings_test
+    """
+    page_size = 100
+    rounds = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        User.objects.bulk_create([
+            User(
+                email=f'bench{i}@example.com', display_name=f'ユーザー{i}', bio='bio ' * 20,
+                avatar=f'avatars/{i}.png', avatar_hash=f'{i:064x}',
+                created_at=now, updated_at=now,
+            )
+            for i in range(cls.page_size)
+        ])
+
+    def measure(self, render):
+        timings = []
+        for _ in range(self.rounds):
+            start = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
+
+    def test_list_page(self):
+        request = APIRequestFactory().get('/api/users/list/')
+        queryset = User.objects.order_by('-created_at', '-pk')[:self.page_size]
+        plan = get_values_plan(UserSerializer)
+
+        def serializer_path():
+            data = UserSerializer(list(queryset), many=True, context={'request': request}).data
+            return JSONRenderer().render(data)
+
+        def fast_path():
+            rows = list(queryset.values(*plan.columns))
+            return FastJSONRenderer().render(plan.render_many(rows, request))
+
+        self.assertEqual(fast_path(), serializer_path())
+        baseline = self.measure(serializer_path)
+        fast = self.measure(fast_path)
+        print(
+            f'\nlist page ({self.page_size} users): '
+            f'UserSerializer + JSONRenderer p50={baseline * 1000:.2f}ms '
+            f'ValuesPlan + FastJSONRenderer p50={fast * 1000:.2f}ms '
+            f'({baseline / fast:.1f}x)'
+        )
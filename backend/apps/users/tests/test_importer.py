@@ -0,0 +1,116 @@
+"""
+ユーザーの一括インポートのテスト
+"""
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.hashers import (
+    BCryptSHA256PasswordHasher,
+    check_password,
+    make_password,
+)
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.users.importer import (
+    PASSWORD_HASHED,
+    PASSWORD_PLAIN,
+    PASSWORD_UNSUPPORTED,
+    PASSWORD_UNUSABLE,
+    UserImporter,
+    classify_password,
+)
+from apps.users.models import User
+
+BCRYPT_HASH = 'bcrypt_sha256$$2b$12$abcdefghijklmnopqrstuuQeYp5l7G0b9hJ4Hc3r9bXKQpZs2Xk7S'
+
+
+class ClassifyPasswordTests(SimpleTestCase):
+    """パスワードの値の判定"""
+
+    def test_configured_hash(self):
+        self.assertEqual(classify_password(make_password('secret')), PASSWORD_HASHED)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+    def test_unconfigured_algorithm_is_unsupported(self):
+        self.assertEqual(classify_password(BCRYPT_HASH), PASSWORD_UNSUPPORTED)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    ])
+    def test_algorithm_without_library_is_unsupported(self):
+        with mock.patch.object(BCryptSHA256PasswordHasher, '_load_library', side_effect=ValueError):
+            self.assertEqual(classify_password(BCRYPT_HASH), PASSWORD_UNSUPPORTED)
+
+    def test_unusable(self):
+        self.assertEqual(classify_password(make_password(None)), PASSWORD_UNUSABLE)
+
+    def test_plain_text_with_separator(self):
+        self.assertEqual(classify_password('pa$$word'), PASSWORD_PLAIN)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+class UserImporterTests(TestCase):
+    """インポートの統計と作成されるユーザー"""
+
+    def import_records(self, records, **kwargs):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.ndjson')
+            with open(path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+            return UserImporter(path, workers=1, **kwargs).run()
+
+    def test_unsupported_hash_is_counted_as_invalid(self):
+        hashed = make_password('secret')
+        stats = self.import_records([
+            {'email': 'hashed@example.com', 'password': hashed},
+            {'email': 'bcrypt@example.com', 'password': BCRYPT_HASH},
+            {'email': 'none@example.com'},
+        ])
+
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['invalid'], 1)
+        self.assertEqual(stats['hashed'], 0)
+        self.assertFalse(User.objects.filter(email='bcrypt@example.com').exists())
+        user = User.objects.get(email='hashed@example.com')
+        self.assertEqual(user.password, hashed)
+        self.assertTrue(check_password('secret', user.password))
+        self.assertFalse(User.objects.get(email='none@example.com').has_usable_password())
+
+    def test_dry_run_counts_unsupported_hash_as_invalid(self):
+        stats = self.import_records([
+            {'email': 'bcrypt@example.com', 'password': BCRYPT_HASH},
+        ], dry_run=True)
+        self.assertEqual(stats['created'], 0)
+        self.assertEqual(stats['invalid'], 1)
+        self.assertFalse(User.objects.exists())
+
+    def test_created_excludes_conflicting_rows(self):
+        importer = UserImporter('unused.ndjson', workers=1)
+        records = [
+            {'email': 'new@example.com', 'password': make_password('secret')},
+            {'email': 'taken@example.com', 'password': make_password('secret')},
+        ]
+        stats = {'read': 0, 'created': 0, 'duplicates': 0, 'invalid': 0, 'hashed': 0}
+
+        # 既存ユーザーの確認とINSERTの間に他の処理で作成された場合を再現する
+        original_filter = User.objects.filter
+        created_concurrently = []
+
+        def filter_then_create(*args, **kwargs):
+            queryset = original_filter(*args, **kwargs)
+            if not created_concurrently:
+                created_concurrently.append(
+                    User.objects.create_user('taken@example.com', 'other')
+                )
+            return queryset
+
+        with mock.patch.object(User.objects, 'filter', side_effect=filter_then_create, autospec=False):
+            importer._import_batch(records, pool=None, stats=stats)
+
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['duplicates'], 1)
+        self.assertEqual(User.objects.count(), 2)
@@ -0,0 +1,145 @@
+"""
+メール送信アウトボックス（apps.users.outbox）のテスト
+"""
+import smtplib
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users import outbox
+from apps.users.models import EmailOutbox, User
+from apps.users.tasks import drain_email_outbox
+
+
+class OutboxEnqueueTests(TestCase):
+    """登録と同じトランザクションでの送信待ち登録"""
+
+    def register(self, email):
+        return APIClient().post(reverse('authentication:register'), {
+            'email': email,
+            'password': 'aP4ssw0rd!x',
+            'password_confirm': 'aP4ssw0rd!x',
+        }, format='json')
+
+    def test_registration_enqueues_welcome_email(self):
+        response = self.register('welcome@example.com')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        row = EmailOutbox.objects.get()
+        self.assertEqual(row.to_email, 'welcome@example.com')
+        self.assertEqual(row.status, EmailOutbox.STATUS_PENDING)
+        # 登録時には送信せず、drain_email_outboxで送信する
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(drain_email_outbox(), 'Sent 1 emails (0 failed)')
+        self.assertEqual(mail.outbox[0].to, ['welcome@example.com'])
+        row.refresh_from_db()
+        self.assertEqual(row.status, EmailOutbox.STATUS_SENT)
+        self.assertIsNotNone(row.sent_at)
+
+    def test_rolled_back_registration_sends_nothing(self):
+        def enqueue_then_fail(*args):
+            outbox.enqueue_welcome_email(*args)
+            raise RuntimeError('registration failed')
+
+        with mock.patch('apps.authentication.views.enqueue_welcome_email', enqueue_then_fail):
+            with self.assertRaises(RuntimeError):
+                self.register('rollback@example.com')
+
+        self.assertFalse(User.objects.filter(email='rollback@example.com').exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertEqual(outbox.drain(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_rolled_back_enqueue_sends_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                outbox.enqueue_email('rollback@example.com', 'subject', 'body')
+                raise RuntimeError
+
+        self.assertEqual(outbox.drain(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class OutboxDrainTests(TestCase):
+    """送信・再試行"""
+
+    def setUp(self):
+        self.row = outbox.enqueue_email('retry@example.com', 'subject', 'body')
+
+    def failing_connection(self):
+        connection = mock.Mock()
+        connection.send_messages.side_effect = smtplib.SMTPException('rejected')
+        return mock.patch('apps.users.outbox.get_connection', return_value=connection)
+
+    def make_due(self):
+        EmailOutbox.objects.filter(pk=self.row.pk).update(next_attempt_at=timezone.now())
+
+    def test_failure_is_retried_with_backoff(self):
+        delays = []
+        with self.failing_connection(), self.assertLogs('apps.users.outbox', 'WARNING'):
+            for attempt in range(1, outbox.MAX_ATTEMPTS):
+                before = timezone.now()
+                self.assertEqual(outbox.drain(), (0, 1))
+                self.row.refresh_from_db()
+                self.assertEqual(self.row.status, EmailOutbox.STATUS_PENDING)
+                self.assertEqual(self.row.attempts, attempt)
+                self.assertEqual(self.row.last_error, 'rejected')
+                delays.append(self.row.next_attempt_at - before)
+                # 再送時刻までは取得されない
+                self.assertEqual(outbox.drain(), (0, 0))
+                self.make_due()
+
+        expected = [outbox.RETRY_BASE_DELAY * 2 ** i for i in range(len(delays))]
+        for delay, minimum in zip(delays, expected):
+            self.assertGreaterEqual(delay, minimum)
+            self.assertLess(delay, minimum + timedelta(seconds=5))
+
+    def test_gives_up_after_max_attempts(self):
+        EmailOutbox.objects.filter(pk=self.row.pk).update(attempts=outbox.MAX_ATTEMPTS - 1)
+
+        with self.failing_connection(), self.assertLogs('apps.users.outbox', 'WARNING'):
+            self.assertEqual(outbox.drain(), (0, 1))
+
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, EmailOutbox.STATUS_FAILED)
+        self.make_due()
+        self.assertEqual(outbox.drain(), (0, 0))
+
+    def test_connection_failure_retries_whole_batch(self):
+        other = outbox.enqueue_email('other@example.com', 'subject', 'body')
+        connection = mock.Mock()
+        connection.open.side_effect = OSError('connection refused')
+
+        with mock.patch('apps.users.outbox.get_connection', return_value=connection), \
+                self.assertLogs('apps.users.outbox', 'WARNING'):
+            self.assertEqual(outbox.drain(), (0, 2))
+
+        for row in (self.row, other):
+            row.refresh_from_db()
+            self.assertEqual(row.status, EmailOutbox.STATUS_PENDING)
+            self.assertEqual(row.attempts, 1)
+
+    def test_stale_claim_is_sent_again(self):
+        # 送信中にワーカーが停止した行
+        EmailOutbox.objects.filter(pk=self.row.pk).update(
+            status=EmailOutbox.STATUS_SENDING,
+            claimed_at=timezone.now() - outbox.CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['retry@example.com'])
+
+    def test_recent_claim_is_not_sent_twice(self):
+        EmailOutbox.objects.filter(pk=self.row.pk).update(
+            status=EmailOutbox.STATUS_SENDING,
+            claimed_at=timezone.now(),
+        )
+
+        self.assertEqual(outbox.drain(), (0, 0))
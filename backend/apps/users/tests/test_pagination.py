@@ -0,0 +1,93 @@
+"""
+ユーザー一覧のキーセットページネーションのテスト
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin@example.com', 'password')
+        now = timezone.now()
+        # 作成日時が同じユーザーを含める（idで順序が決まる）
+        for index in range(6):
+            user = User.objects.create_user(f'user{index}@example.com', 'password')
+            created_at = now - timedelta(days=1) if index % 2 else now - timedelta(days=2)
+            User.objects.filter(pk=user.pk).update(created_at=created_at)
+        User.objects.filter(pk=cls.admin.pk).update(created_at=now)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def tearDown(self):
+        cache.clear()
+
+    def expected_ids(self):
+        return list(User.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def get(self, url=None, **params):
+        response = self.client.get(url or reverse('users:list'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def ids(self, data):
+        return [user['id'] for user in data['results']]
+
+    def test_walks_all_pages_in_order_across_ties(self):
+        data = self.get(page_size=2)
+        self.assertIsNone(data['previous'])
+        seen = self.ids(data)
+        while data['next']:
+            data = self.get(data['next'])
+            seen.extend(self.ids(data))
+
+        self.assertEqual(seen, self.expected_ids())
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.get(page_size=3)
+        second = self.get(first['next'])
+        self.assertEqual(self.ids(second), self.expected_ids()[3:6])
+
+        previous = self.get(second['previous'])
+        self.assertEqual(self.ids(previous), self.ids(first))
+        self.assertIsNone(previous['previous'])
+        self.assertEqual(self.ids(self.get(previous['next'])), self.ids(second))
+
+    def test_rows_inserted_before_cursor_do_not_shift_pages(self):
+        first = self.get(page_size=2)
+        # OFFSETと異なり、先頭側への追加で次のページの内容がずれない
+        User.objects.create_user('newest@example.com', 'password')
+        second = self.get(first['next'])
+        self.assertEqual(self.ids(second), self.expected_ids()[3:5])
+
+    def test_no_count_query_by_default(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(page_size=2)
+        self.assertNotIn('approximate_count', data)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries))
+
+    def test_approximate_total(self):
+        data = self.get(page_size=2, include_total=1)
+        self.assertEqual(data['approximate_count'], User.objects.count())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('users:list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_admin(self):
+        user = User.objects.get(email='user0@example.com')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(reverse('users:list')).status_code, 403)
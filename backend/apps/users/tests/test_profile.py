@@ -0,0 +1,77 @@
+"""
+プロフィール更新の条件付きリクエストのテスト
+"""
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+
+
+class ProfileUpdatePreconditionTests(TestCase):
+    """If-Matchによる更新の競合防止"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('profile@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('users:profile')
+
+    def test_update_returns_validators_for_next_update(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.patch(self.url, {'bio': 'first'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+        # force_authenticateのユーザーはリクエスト間で共有されるため、DBの値に合わせる
+        self.user.refresh_from_db()
+
+        # 更新のレスポンスのETagは取得時のETagと同じで、そのまま次の更新に使える
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+        response = self.client.patch(self.url, {'bio': 'second'}, HTTP_IF_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'bio': 'updated elsewhere'})
+
+        response = self.client.patch(self.url, {'bio': 'lost update'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, 'updated elsewhere')
+
+    def test_update_saves_only_submitted_fields(self):
+        # 更新中に別の処理で書き込まれた列を古い値で上書きしない
+        User.objects.filter(pk=self.user.pk).update(display_name='written concurrently')
+
+        response = self.client.patch(self.url, {'bio': 'new bio'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.display_name, 'written concurrently')
+        self.assertEqual(self.user.bio, 'new bio')
+
+
+class ProfileUpdateResponseTests(TestCase):
+    """更新のレスポンス"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            'avatar@example.com', 'password', avatar='avatars/current.png'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('users:profile')
+
+    def test_response_includes_current_avatar(self):
+        response = self.client.patch(self.url, {'bio': 'new bio'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['avatar'], 'http://testserver/media/avatars/current.png')
+
+    def test_removed_avatar_is_null(self):
+        response = self.client.patch(self.url, {'avatar': None}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['avatar'])
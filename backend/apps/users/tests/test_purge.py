@@ -0,0 +1,112 @@
+"""
+非アクティブユーザーの削除（cleanup_inactive_users・BatchPurger）のテスト
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.users.models import User
+from apps.users.purge import BatchPurger
+from apps.users.tasks import cleanup_inactive_users
+
+
+class PurgeTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_user(self, email, days_ago, is_active=False):
+        user = User.objects.create_user(email, 'password', is_active=is_active)
+        # created_atはauto_now_addのため、作成後に書き換える
+        User.objects.filter(pk=user.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return user
+
+    def remaining(self):
+        return set(User.objects.values_list('email', flat=True))
+
+
+class CleanupInactiveUsersTests(PurgeTestCase):
+    """削除対象の判定"""
+
+    def test_deletes_only_inactive_users_past_retention(self):
+        self.create_user('expired@example.com', days_ago=31)
+        self.create_user('recent@example.com', days_ago=29)
+        self.create_user('active@example.com', days_ago=365, is_active=True)
+
+        result = cleanup_inactive_users(chunk_size=1)
+
+        self.assertTrue(result.startswith('Deleted 1 inactive users'), result)
+        self.assertEqual(self.remaining(), {'recent@example.com', 'active@example.com'})
+
+    def test_dry_run_deletes_nothing(self):
+        self.create_user('expired@example.com', days_ago=31)
+
+        result = cleanup_inactive_users(dry_run=True)
+
+        self.assertEqual(result, '[dry run] 1 inactive users would be deleted')
+        self.assertEqual(self.remaining(), {'expired@example.com'})
+        self.assertIsNone(cache.get('purge:checkpoint:cleanup_inactive_users'))
+
+    def test_second_run_is_noop(self):
+        for i in range(5):
+            self.create_user(f'expired{i}@example.com', days_ago=40)
+        self.create_user('active@example.com', days_ago=40, is_active=True)
+
+        self.assertTrue(cleanup_inactive_users(chunk_size=2).startswith('Deleted 5 '))
+        self.assertTrue(cleanup_inactive_users(chunk_size=2).startswith('Deleted 0 '))
+        self.assertEqual(self.remaining(), {'active@example.com'})
+
+
+class BatchPurgerTests(PurgeTestCase):
+    """チャンク単位の削除・再開"""
+
+    def purger(self, **kwargs):
+        return BatchPurger(User.objects.filter(is_active=False), 'test', **kwargs)
+
+    def test_deletes_in_chunks(self):
+        for i in range(5):
+            self.create_user(f'chunk{i}@example.com', days_ago=40)
+
+        stats = self.purger(chunk_size=2).run()
+
+        self.assertEqual(stats['matched'], 5)
+        self.assertEqual(stats['deleted'], 5)
+        self.assertFalse(User.objects.exists())
+        # 完了後は進捗を削除する
+        self.assertIsNone(cache.get(self.purger().checkpoint_key))
+
+    def test_resumes_from_checkpoint(self):
+        users = [self.create_user(f'resume{i}@example.com', days_ago=40) for i in range(4)]
+        # 前回の実行が2件目まで処理して中断した状態
+        cache.set(self.purger().checkpoint_key, users[1].pk)
+
+        stats = self.purger(chunk_size=10).run()
+
+        self.assertEqual(stats['deleted'], 2)
+        self.assertEqual(self.remaining(), {'resume0@example.com', 'resume1@example.com'})
+
+    def test_row_leaving_filter_after_selection_is_kept(self):
+        user = self.create_user('reactivated@example.com', days_ago=40)
+        atomic = transaction.atomic
+
+        @contextmanager
+        def reactivate_then_atomic(*args, **kwargs):
+            # 主キーの取得後・削除前にユーザーが再びアクティブになる
+            User.objects.filter(pk=user.pk).update(is_active=True)
+            with atomic(*args, **kwargs):
+                yield
+
+        with mock.patch('apps.users.purge.transaction.atomic', reactivate_then_atomic):
+            stats = self.purger().run()
+
+        self.assertEqual(stats['matched'], 1)
+        self.assertEqual(stats['deleted'], 0)
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
@@ -0,0 +1,117 @@
+"""
+?fields= / ?omit= による絞り込みのテスト
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+
+
+class BatchSparseFieldsTests(TestCase):
+    """UserBatchViewの絞り込み（.only()で取得するカラム）"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            'batch@example.com', 'password', avatar_hash='b' * 64, bio='bio'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('users:batch')
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_result(self, **params):
+        response = self.client.get(self.url, {'ids': str(self.user.pk), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][str(self.user.pk)]
+
+    def test_fields_with_avatar_variants(self):
+        result = self.get_result(fields='id,avatar_variants')
+        self.assertEqual(set(result), {'id', 'avatar_variants'})
+        self.assertIn('b' * 64, result['avatar_variants']['64']['webp'])
+
+    def test_omit(self):
+        result = self.get_result(omit='bio')
+        self.assertNotIn('bio', result)
+        self.assertIn('avatar_variants', result)
+        self.assertEqual(result['email'], 'batch@example.com')
+
+    def test_omit_avatar_variants(self):
+        result = self.get_result(omit='avatar_variants,avatar')
+        self.assertEqual(result['bio'], 'bio')
+        self.assertNotIn('avatar_variants', result)
+
+    def test_only_requested_columns_are_loaded(self):
+        with self.assertNumQueries(1):
+            self.get_result(fields='id,avatar_variants')
+
+    def test_unknown_field(self):
+        response = self.client.get(self.url, {'ids': str(self.user.pk), 'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsViewTests(TestCase):
+    """詳細・一覧・プロフィールの絞り込み"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            'sparse@example.com', 'password', display_name='Sparse', bio='long bio'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def user_queries(self, queries):
+        return [query['sql'] for query in queries if 'users_user' in query['sql']]
+
+    def test_detail_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('users:detail', self.user.pk, fields='id,display_name')
+
+        self.assertEqual(data, {'id': self.user.pk, 'display_name': 'Sparse'})
+        # 出力しないカラムは取得しない
+        self.assertNotIn('bio', self.user_queries(queries)[0])
+
+    def test_detail_sparse_and_full_are_cached_separately(self):
+        self.get('users:detail', self.user.pk, fields='id')
+        data = self.get('users:detail', self.user.pk)
+        self.assertEqual(data['bio'], 'long bio')
+        self.assertEqual(self.get('users:detail', self.user.pk, fields='id'), {'id': self.user.pk})
+
+    def test_list_fields_and_omit(self):
+        data = self.get('users:list', fields='id,email,bio', omit='bio')
+        self.assertEqual(data['results'], [{'id': self.user.pk, 'email': 'sparse@example.com'}])
+
+    def test_profile_fields(self):
+        data = self.get('users:profile', fields='first_name,bio')
+        self.assertEqual(set(data), {'first_name', 'bio'})
+
+    def test_field_outside_allow_list(self):
+        # UserProfileSerializerにのみあるフィールドは詳細では指定できない
+        response = self.client.get(
+            reverse('users:detail', args=[self.user.pk]), {'omit': 'first_name'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('omit', response.data)
+
+    def test_update_ignores_fields(self):
+        response = self.client.patch(
+            f'{reverse("users:profile")}?fields=id', {'bio': 'updated'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bio'], 'updated')
+        self.assertIn('display_name', response.data)
@@ -6,6 +6,9 @@ from .views import (
     UserProfileView,
     UserListView,
     UserDetailView,
+    UserBatchView,
+    UserExportView,
+    UserCacheStatsView,
 )
 
 app_name = 'users'
@@ -14,5 +17,8 @@ urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='profile'),
     path('list/', UserListView.as_view(), name='list'),
     path('<int:pk>/', UserDetailView.as_view(), name='detail'),
+    path('batch/', UserBatchView.as_view(), name='batch'),
+    path('export/', UserExportView.as_view(), name='export'),
+    path('cache-stats/', UserCacheStatsView.as_view(), name='cache_stats'),
 ]
 
@@ -1,41 +1,413 @@
 """
 ユーザー関連のビュー
 """
-from rest_framework import generics, permissions, status
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import generics, permissions, serializers, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from .cache import user_cache
+from . import export
+from .conditional import (
+    check_preconditions,
+    get_version,
+    make_etag,
+    make_list_etag,
+    set_validators,
+)
+from .fastpath import get_values_plan
 from .models import User
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
 from .serializers import (
     UserSerializer,
     UserProfileSerializer,
     UserUpdateSerializer,
+    UserBatchQuerySerializer,
 )
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class _NotModified(Exception):
+    """キャッシュ生成中に条件付きリクエストが成立した"""
+    
+    def __init__(self, response):
+        self.response = response
+
+
+class SparseFieldsetViewMixin:
+    """?fields= / ?omit= による出力フィールドの絞り込み（GETのみ）
+
+    指定できるフィールドはビューごとの許可リストで検証し、
+    取得するカラムも.only()で必要なものに絞る。
+    """
+    # Noneの場合はシリアライザーのMeta.fieldsをすべて許可
+    sparse_fields_allowed = None
+    # 常に取得するカラム（ETag・ページネーションで使用）
+    sparse_fields_required = ('id', 'created_at', 'updated_at')
+    
+    def get_sparse_serializer_class(self):
+        return self.serializer_class
+    
+    def get_sparse_fields_allowed(self):
+        if self.sparse_fields_allowed is not None:
+            return tuple(self.sparse_fields_allowed)
+        return tuple(self.get_sparse_serializer_class().Meta.fields)
+    
+    def get_requested_fields(self):
+        """出力するフィールド（絞り込みなしの場合はNone）"""
+        if hasattr(self, '_requested_fields'):
+            return self._requested_fields
+        
+        self._requested_fields = None
+        params = self.request.query_params
+        if self.request.method not in ('GET', 'HEAD') or \
+                ('fields' not in params and 'omit' not in params):
+            return None
+        
+        allowed = self.get_sparse_fields_allowed()
+        fields = self._parse_fields('fields', allowed) if 'fields' in params else allowed
+        omit = self._parse_fields('omit', allowed) if 'omit' in params else ()
+        
+        self._requested_fields = tuple(
+            name for name in allowed if name in fields and name not in omit
+        )
+        return self._requested_fields
+    
+    def _parse_fields(self, param, allowed):
+        names = [name.strip() for name in self.request.query_params[param].split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValidationError({
+                param: f'指定できないフィールドです: {", ".join(unknown)}'
+            })
+        return names
+    
+    def get_sparse_context(self):
+        return {'fields': self.get_requested_fields()}
+    
+    def get_sparse_queryset(self, queryset):
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        columns = self.sparse_fields_required + self.get_sparse_columns(fields)
+        return queryset.only(*dict.fromkeys(columns))
+    
+    def get_sparse_columns(self, fields):
+        """出力するフィールドの取得に必要なモデルのフィールド名
+        
+        シリアライザーのフィールド名とモデルのフィールド名は一致しない場合があるため
+        （avatar_variantsのsourceはavatar_hash）、sourceから求める。
+        モデルのフィールドに対応しないもの（SerializerMethodFieldなど）は除く。
+        """
+        serializer_fields = self.get_sparse_serializer_class()().fields
+        model = self.get_sparse_serializer_class().Meta.model
+        columns = []
+        for name in fields:
+            field = serializer_fields[name]
+            if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+                continue
+            column = field.source.split('.')[0]
+            try:
+                model._meta.get_field(column)
+            except FieldDoesNotExist:
+                continue
+            columns.append(column)
+        return tuple(columns)
+    
+    def get_fields_variant(self):
+        fields = self.get_requested_fields()
+        if fields is None:
+            return ''
+        return f':fields={",".join(fields)}'
+
+
+class FastReadMixin:
+    """読み取り専用の高速シリアライズ（GETのみ）
+
+    .values()で行を取得し、事前に組み立てた変換計画で表現に変換する。
+    出力はserializer_classと同じで、FastJSONRendererで描画する。
+    """
+    renderer_classes = [FastJSONRenderer]
+    # 常に取得するカラム（ETag・ページネーションで使用）
+    values_required_columns = ('id', 'created_at', 'updated_at')
+    
+    def get_values_plan(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        return get_values_plan(self.serializer_class, self.get_requested_fields())
+    
+    def get_values_queryset(self, queryset):
+        plan = self.get_values_plan()
+        if plan is None:
+            return queryset
+        return queryset.values(*dict.fromkeys(self.values_required_columns + plan.columns))
+    
+    def serialize_instance(self, instance):
+        if isinstance(instance, dict):
+            return self.get_values_plan().render(instance, self.request)
+        return super().serialize_instance(instance)
+    
+    def serialize_page(self, page):
+        if page and isinstance(page[0], dict):
+            return self.get_values_plan().render_many(page, self.request)
+        return self.get_serializer(page, many=True).data
+
+
+class CachedRetrieveMixin:
+    """取得結果（シリアライズ済みの表現）をuser_cacheから返す
+
+    ETag・Last-Modifiedはupdated_atから生成し、If-None-Matchが一致する場合は
+    シリアライズせずに304を返す。
+    キャッシュに保存する表現は、レプリカの遅延で古い行を保存しないようプライマリ
+    （DEFAULT_DB_ALIAS）から読む（UserBatchViewも同様）。
+    """
+    
+    def get_cache_user_id(self):
+        raise NotImplementedError
+    
+    def get_cache_variant(self):
+        # アバターURLは絶対URLになるため、スキーム・ホストもキーに含める
+        serializer_class = self.get_serializer_class()
+        return (
+            f'{serializer_class.__name__}:{self.request.scheme}://{self.request.get_host()}'
+            f'{self.get_fields_variant()}'
+        )
+    
+    def serialize_instance(self, instance):
+        return dict(self.get_serializer(instance).data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        user_id = self.get_cache_user_id()
+        variant = self.get_cache_variant()
+        
+        def render():
+            instance = self.get_object()
+            pk, updated_at = get_version(instance)
+            # シリアライズ前に条件付きリクエストを判定
+            response = check_preconditions(
+                request,
+                make_etag(pk, updated_at, variant),
+                updated_at,
+            )
+            if response is not None:
+                raise _NotModified(response)
+            return {
+                'updated_at': updated_at,
+                'data': self.serialize_instance(instance),
+            }
+        
+        try:
+            entry = user_cache.get_or_render(user_id, variant, render)
+        except _NotModified as e:
+            return e.response
+        
+        etag = make_etag(user_id, entry['updated_at'], variant)
+        response = check_preconditions(request, etag, entry['updated_at'])
+        if response is not None:
+            return response
+        
+        return set_validators(Response(entry['data']), etag, entry['updated_at'])
+
+
+class UserProfileView(SparseFieldsetViewMixin, CachedRetrieveMixin, generics.RetrieveUpdateAPIView):
     """ユーザープロフィール取得・更新"""
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        return User.objects.using(DEFAULT_DB_ALIAS).get(pk=self.request.user.pk)
+    
+    def get_cache_user_id(self):
+        return self.request.user.pk
+    
+    def get_cache_variant(self):
+        # 更新時のIf-Matchも取得時と同じETagで判定できるよう、取得用シリアライザーを基準にする
+        return (
+            f'{UserProfileSerializer.__name__}:{self.request.scheme}://{self.request.get_host()}'
+            f'{self.get_fields_variant()}'
+        )
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return UserUpdateSerializer
         return UserProfileSerializer
+    
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), **self.get_sparse_context()}
+    
+    def update(self, request, *args, **kwargs):
+        """If-Matchが指定された場合、更新前のETagと一致しなければ412を返す（更新の競合防止）
 
+        判定から保存までの間に他の更新が入らないよう、行をロックしてから判定する。
+        レスポンスには更新後のETag・Last-Modifiedを付け、次の更新のIf-Matchに使えるようにする。
+        """
+        partial = kwargs.pop('partial', False)
+        variant = self.get_cache_variant()
+        with transaction.atomic():
+            instance = User.objects.select_for_update().get(pk=request.user.pk)
+            response = check_preconditions(
+                request,
+                make_etag(instance.pk, instance.updated_at, variant),
+                instance.updated_at,
+            )
+            if response is not None:
+                return response
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        
+        return set_validators(
+            Response(serializer.data),
+            make_etag(instance.pk, instance.updated_at, variant),
+            instance.updated_at,
+        )
 
-class UserListView(generics.ListAPIView):
+
+class UserListView(FastReadMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     """ユーザー一覧（管理者のみ）"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
+    
+    def get_queryset(self):
+        return self.get_values_queryset(self.get_sparse_queryset(super().get_queryset()))
+    
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), **self.get_sparse_context()}
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        
+        # シリアライズ前にページ内容から条件付きリクエストを判定
+        variant = f'{request.scheme}://{request.get_host()}{request.get_full_path()}'
+        if self.paginator.total is not None:
+            variant = f'{variant}:{self.paginator.total}'
+        etag = make_list_etag(page, variant)
+        updated_at = max((get_version(user)[1] for user in page), default=None)
+        response = check_preconditions(request, etag, updated_at)
+        if response is not None:
+            return response
+        
+        response = self.get_paginated_response(self.serialize_page(page))
+        return set_validators(response, etag, updated_at)
 
 
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(FastReadMixin, SparseFieldsetViewMixin, CachedRetrieveMixin, generics.RetrieveAPIView):
     """ユーザー詳細"""
-    queryset = User.objects.all()
+    queryset = User.objects.using(DEFAULT_DB_ALIAS)
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return self.get_values_queryset(self.get_sparse_queryset(super().get_queryset()))
+    
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), **self.get_sparse_context()}
+    
+    def get_cache_user_id(self):
+        return self.kwargs['pk']
+
+
+class UserBatchView(SparseFieldsetViewMixin, APIView):
+    """ユーザー一括取得（?ids=1,2,3）
+
+    UserDetailViewと同じ権限・表現で、キャッシュにないユーザーのみ1回のクエリで取得する。
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserSerializer
+    
+    def get(self, request):
+        query = UserBatchQuerySerializer(data={
+            'ids': [value for value in request.query_params.get('ids', '').split(',') if value],
+        })
+        query.is_valid(raise_exception=True)
+        user_ids = list(dict.fromkeys(query.validated_data['ids']))
+        
+        # UserDetailViewとキャッシュを共有する
+        variant = (
+            f'{UserSerializer.__name__}:{request.scheme}://{request.get_host()}'
+            f'{self.get_fields_variant()}'
+        )
+        found, missing_keys = user_cache.get_many(user_ids, variant)
+        
+        entries = {}
+        if missing_keys:
+            users = self.get_sparse_queryset(
+                User.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=list(missing_keys))
+            )
+            context = {
+                'request': request,
+                'view': self,
+                'format': self.format_kwarg,
+                **self.get_sparse_context(),
+            }
+            for user in users:
+                entry = {
+                    'updated_at': user.updated_at,
+                    'data': dict(UserSerializer(user, context=context).data),
+                }
+                found[user.pk] = entry
+                entries[missing_keys[user.pk]] = entry
+            user_cache.set_many(entries)
+        
+        return Response({
+            'results': {
+                str(user_id): found[user_id]['data']
+                for user_id in user_ids if user_id in found
+            },
+            'missing': [user_id for user_id in user_ids if user_id not in found],
+        })
+
+
+class UserExportView(SparseFieldsetViewMixin, APIView):
+    """ユーザーの一括エクスポート（管理者のみ）
+
+    ?type=ndjson|csv（デフォルトはndjson）、?gzip=1 でgzip圧縮、?fields= / ?omit= で絞り込み。
+    全件をキーセットで少しずつ取得しながらストリーミングで返す。
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = UserSerializer
+    chunk_size = 1000
+    
+    def get(self, request):
+        export_format = request.query_params.get('type', export.FORMAT_NDJSON)
+        if export_format not in export.EXPORT_FORMATS:
+            raise ValidationError({
+                'type': f'指定できる形式: {", ".join(export.EXPORT_FORMATS)}'
+            })
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        
+        chunks = export.iter_export(
+            export_format,
+            fields=self.get_requested_fields(),
+            chunk_size=self.chunk_size,
+            request=request,
+            compress=compress,
+        )
+        
+        filename = f'users-{timezone.now():%Y%m%d%H%M%S}.{export_format}'
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        else:
+            content_type = export.CONTENT_TYPES[export_format]
+        
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # プロキシでのバッファリングを無効化
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class UserCacheStatsView(APIView):
+    """ユーザーキャッシュの統計（管理者のみ、プロセス単位）"""
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        return Response(user_cache.stats.as_dict())
 
@@ -4,7 +4,7 @@ Django settings for test_nextjs project.
 import os
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # PyMySQLをMySQLdbとして使用（Windows互換性のため）
 import pymysql
@@ -37,7 +37,8 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'corsheaders',
     'allauth',
-    'allauth.account',
+    # 非同期対応のAccountMiddlewareをallauthのミドルウェアとして扱う設定
+    'apps.authentication.apps.AccountConfig',
     'allauth.socialaccount',
     'allauth.socialaccount.providers.google',
     'allauth.socialaccount.providers.twitter_oauth2',
@@ -50,18 +51,27 @@ INSTALLED_APPS = [
     # Local apps
     'apps.users',
     'apps.authentication',
+    'apps.monitoring',
 ]
 
 MIDDLEWARE = [
+    # 処理時間の計測（PERF_SAMPLE_RATEが0の場合は無効）
+    'apps.monitoring.middleware.PerformanceMiddleware',
+    # ビューごとの処理時間などのメトリクス（/metrics）
+    'apps.monitoring.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # 書き込みを行ったユーザーの読み取りを一定時間プライマリに固定（読み取りレプリカ使用時。
+    # ユーザーをセッションからも判定するためAuthenticationMiddlewareの後に置く）
+    'apps.database.middleware.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'allauth.account.middleware.AccountMiddleware',
+    # allauthのAccountMiddlewareの非同期対応版（非同期ビューを直列化しない）
+    'apps.authentication.middleware.AccountMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -85,9 +95,13 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
+# DB_POOL_SIZEを指定するとプロセス内の接続プール（apps.database.pool）を使用する。
+# プール使用時はリクエストごとに接続をプールへ返却するため、CONN_MAX_AGEは0にする。
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'apps.database.backends.mysql',
         'NAME': config('DB_NAME', default='test_nextjs_db'),
         'USER': config('DB_USER', default='test_user'),
         'PASSWORD': config('DB_PASSWORD', default='test_password'),
@@ -97,9 +111,44 @@ DATABASES = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # 持続接続（秒）。再利用前に接続の生存を確認する
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+if DB_POOL_SIZE:
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': DB_POOL_SIZE,
+        # 上限に達した場合に返却を待つ時間（秒）
+        'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        # 物理接続の最大寿命（秒）。MySQLのwait_timeoutより短くする
+        'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=3600, cast=int),
+        # この時間以上使われていなかった接続は取得時にpingで確認する（秒）
+        'PING_INTERVAL': 10,
+    }
+
+# 読み取りレプリカ（apps.database.router）
+# DB_REPLICA_HOSTSにカンマ区切りでホストを指定すると、defaultと同じ設定でreplica1, replica2...を追加する
+DATABASE_REPLICAS = []
+for index, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        # テストではdefaultを参照する
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['apps.database.router.ReplicaRouter']
+# レプリケーション遅延の許容値（秒）。超えた場合はプライマリから読み取る
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=int)
+# レプリケーション遅延を計測する間隔（秒）
+REPLICA_LAG_CHECK_INTERVAL = 5
+# 書き込み後、同じユーザーの後続のリクエストをプライマリに固定する時間（秒。共有キャッシュに記録）
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -139,7 +188,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.ActivityJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -150,6 +199,17 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
+    # ログイン・登録・ソーシャル認証のレート制限（apps.authentication.throttling）
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('THROTTLE_LOGIN_IP', default='20/min'),
+        'login_email': config('THROTTLE_LOGIN_EMAIL', default='5/min'),
+        'register_ip': config('THROTTLE_REGISTER_IP', default='10/hour'),
+        'social_ip': config('THROTTLE_SOCIAL_IP', default='30/min'),
+        'social_provider': config('THROTTLE_SOCIAL_PROVIDER', default='1200/min'),
+    },
+    # 前段のリバースプロキシの数。レート制限のIPアドレスはX-Forwarded-Forの右からこの数番目を使用し、
+    # 0の場合はREMOTE_ADDRを使用する（未設定のNoneではクライアントが送ったヘッダーをそのまま信頼してしまう）
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 # JWT Settings
@@ -158,7 +218,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # 最終ログイン日時はapps.users.activityでまとめて更新する（ログインごとのUPDATEを避ける）
+    'UPDATE_LAST_LOGIN': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -220,6 +281,52 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
+# Cache
+# REDIS_CACHE_URLが設定されている場合はRedisを共有キャッシュとして使用（ワーカー間で共有）
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# ユーザー表現キャッシュの有効期間（秒）
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# アバター画像（apps.users.avatars）
+AVATAR_SIZES = (64, 128, 256)
+AVATAR_MAX_UPLOAD_SIZE = config('AVATAR_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)
+
+# Google IDトークン検証用の証明書URL（テスト時はローカルのスタブサーバーを指定可能）
+GOOGLE_OAUTH2_CERTS_URL = config(
+    'GOOGLE_OAUTH2_CERTS_URL',
+    default='https://www.googleapis.com/oauth2/v1/certs'
+)
+
+# ソーシャル認証プロバイダーへのHTTP通信設定（apps.authentication.providers）
+SOCIAL_PROVIDER_HTTP = {
+    'CONNECT_TIMEOUT': config('SOCIAL_PROVIDER_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'READ_TIMEOUT': config('SOCIAL_PROVIDER_READ_TIMEOUT', default=5, cast=float),
+    'MAX_RETRIES': 2,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+}
+
+# ソーシャル認証トークンの検証結果をキャッシュする秒数（同一トークンの連続送信をまとめる）
+SOCIAL_AUTH_VERIFICATION_TTL = config('SOCIAL_AUTH_VERIFICATION_TTL', default=30, cast=int)
+
+# リフレッシュトークンブラックリストのブルームフィルター容量（想定する有効な無効化済みトークン数）
+TOKEN_BLACKLIST_BLOOM_CAPACITY = config('TOKEN_BLACKLIST_BLOOM_CAPACITY', default=100000, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = 'django-db'
@@ -230,6 +337,53 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# 定期実行タスク（DatabaseSchedulerにより起動時にDBへ同期される）
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-blacklisted-tokens': {
+        'task': 'apps.authentication.tasks.purge_expired_blacklisted_tokens',
+        'schedule': timedelta(hours=1),
+    },
+    'drain-email-outbox': {
+        'task': 'apps.users.tasks.drain_email_outbox',
+        'schedule': timedelta(seconds=30),
+    },
+    'flush-user-activity': {
+        'task': 'apps.users.tasks.flush_user_activity',
+        'schedule': timedelta(seconds=30),
+    },
+}
+
+# リクエストごとの計測（apps.monitoring.middleware）
+# 計測するリクエストの割合（0で無効、1で全リクエスト）
+PERF_SAMPLE_RATE = config('PERF_SAMPLE_RATE', default=0.0, cast=float)
+# Server-Timingヘッダーを出力するか（内部情報を含むため本番では通常無効）
+PERF_SERVER_TIMING = config('PERF_SERVER_TIMING', default=DEBUG, cast=bool)
+# 同じ形のクエリがこの回数以上実行された場合にN+1として警告
+PERF_N_PLUS_ONE_THRESHOLD = config('PERF_N_PLUS_ONE_THRESHOLD', default=10, cast=int)
+
+# メトリクス（apps.monitoring.metrics）
+# 各プロセスが共有キャッシュに値を書き込む間隔（秒）
+METRICS_PUBLISH_INTERVAL = config('METRICS_PUBLISH_INTERVAL', default=10, cast=int)
+# /metricsの取得に必要なBearerトークン（未設定の場合はDEBUG時のみ公開し、それ以外は403）
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'apps.monitoring.perf': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Security Settings (Production)
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
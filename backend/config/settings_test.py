@@ -0,0 +1,38 @@
+"""
+テスト用の設定（MySQL・Redisを用意せずにテストを実行する場合）
+
+python manage.py test --settings=config.settings_test
+
+defaultとreplica1の2つのSQLiteデータベースを使用する。replica1はレプリケーションを行わない
+別のデータベースのため、ルーターのテスト（apps.database.tests）ではプライマリへの書き込みが
+見えない「遅延中のレプリカ」として扱う。それ以外のテストではレプリカを使用しない。
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_default.sqlite3',
+    },
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_replica1.sqlite3',
+    },
+}
+# ルーターのテストでのみoverride_settingsでreplica1を指定する
+DATABASE_REPLICAS = []
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_BROKER_URL = 'memory://'
+
+# メトリクスの書き込みスレッドを起動しない間隔にする
+METRICS_PUBLISH_INTERVAL = 3600
+
+MEDIA_ROOT = BASE_DIR / 'test_media'
@@ -6,6 +6,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.monitoring.views import metrics_view
+
 urlpatterns = [
     # Admin
     path('admin/', admin.site.urls),
@@ -14,6 +16,9 @@ urlpatterns = [
     path('api/auth/', include('apps.authentication.urls')),
     path('api/users/', include('apps.users.urls')),
     
+    # メトリクス（Prometheus）
+    path('metrics', metrics_view, name='metrics'),
+    
     # Django Allauth
     path('accounts/', include('allauth.urls')),
 ]